@@ -0,0 +1,271 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from .models import ProxyTrade, PROFIT_SLIPPAGE, MIN_NUMERIC_VALUE
+from .utility import calculate_max_drawdowns
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of resamples generated together, each chunk has its own random stream
+RESAMPLE_CHUNK_SIZE: int = 256
+HOURS_PER_YEAR: int = 365 * 24
+
+
+@dataclass
+class ResampleDistribution:
+    """pnl, sharpe ratio and max drawdown of each resample"""
+
+    pnl: np.ndarray
+    sharpe_ratio: np.ndarray
+    max_drawdown: np.ndarray
+
+    def confidence_interval(
+        self, metric: str, confidence_level: float = 0.95
+    ) -> tuple[float, float]:
+        """Percentile confidence interval of a metric
+
+        Args:
+            metric (str): "pnl", "sharpe_ratio" or "max_drawdown"
+            confidence_level (float, optional): confidence level. Defaults to 0.95.
+
+        Returns:
+            tuple[float, float]: lower and upper bound
+        """
+        tail: float = (1 - confidence_level) / 2 * 100
+        lower, upper = np.percentile(getattr(self, metric), [tail, 100 - tail])
+        return float(lower), float(upper)
+
+
+def _calculate_sharpe_ratios(profit: np.ndarray, periods_per_year: float) -> np.ndarray:
+    """Vectorized sharpe ratio of each row: mean / std * sqrt(periods per year)
+
+    Args:
+        profit (np.ndarray): profit of each period, one resample per row
+        periods_per_year (float): number of periods in a year
+
+    Returns:
+        np.ndarray: sharpe ratio, MIN_NUMERIC_VALUE if the row has no variation
+    """
+    std_profit: np.ndarray = profit.std(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            std_profit > 0,
+            profit.mean(axis=1) / std_profit * np.sqrt(periods_per_year),
+            MIN_NUMERIC_VALUE,
+        )
+
+
+def _block_bootstrap_chunk(
+    mtm: np.ndarray,
+    block_size: int,
+    resample_count: int,
+    periods_per_year: float,
+    seed_sequence: np.random.SeedSequence,
+) -> ResampleDistribution:
+    """Circular block bootstrap of the mtm series
+
+    Args:
+        mtm (np.ndarray): mtm of each bar
+        block_size (int): number of consecutive bars of a block
+        resample_count (int): number of resamples
+        periods_per_year (float): number of bars in a year
+        seed_sequence (np.random.SeedSequence): seed of the chunk
+
+    Returns:
+        ResampleDistribution: distribution of the chunk
+    """
+    rng: np.random.Generator = np.random.default_rng(seed_sequence)
+    bar_count: int = len(mtm)
+    block_count: int = -(-bar_count // block_size)
+    block_start: np.ndarray = rng.integers(0, bar_count, (resample_count, block_count))
+    index: np.ndarray = (block_start[:, :, None] + np.arange(block_size)).reshape(
+        resample_count, -1
+    )[:, :bar_count] % bar_count
+    resampled: np.ndarray = mtm[index]
+    profit: np.ndarray = resampled - PROFIT_SLIPPAGE
+    return ResampleDistribution(
+        pnl=resampled.sum(axis=1),
+        sharpe_ratio=_calculate_sharpe_ratios(profit, periods_per_year),
+        max_drawdown=calculate_max_drawdowns(np.cumsum(resampled, axis=1)),
+    )
+
+
+def _trade_shuffle_chunk(
+    trade_pnl: np.ndarray,
+    with_replacement: bool,
+    resample_count: int,
+    periods_per_year: float,
+    seed_sequence: np.random.SeedSequence,
+) -> ResampleDistribution:
+    """Shuffle or resample the order of the trades
+
+    Args:
+        trade_pnl (np.ndarray): normalized pnl of each trade
+        with_replacement (bool): draw trades with replacement instead of permuting them
+        resample_count (int): number of resamples
+        periods_per_year (float): number of trades in a year
+        seed_sequence (np.random.SeedSequence): seed of the chunk
+
+    Returns:
+        ResampleDistribution: distribution of the chunk
+    """
+    rng: np.random.Generator = np.random.default_rng(seed_sequence)
+    trade_count: int = len(trade_pnl)
+    if with_replacement:
+        index: np.ndarray = rng.integers(0, trade_count, (resample_count, trade_count))
+    else:
+        index: np.ndarray = rng.permuted(
+            np.broadcast_to(np.arange(trade_count), (resample_count, trade_count)),
+            axis=1,
+        )
+    resampled: np.ndarray = trade_pnl[index]
+    return ResampleDistribution(
+        pnl=resampled.sum(axis=1),
+        sharpe_ratio=_calculate_sharpe_ratios(resampled, periods_per_year),
+        max_drawdown=calculate_max_drawdowns(np.cumsum(resampled, axis=1)),
+    )
+
+
+def _run_chunks(
+    chunk_function,
+    data: np.ndarray,
+    option,
+    resample_count: int,
+    periods_per_year: float,
+    seed: int,
+    n_jobs: int,
+) -> ResampleDistribution:
+    """Run the resamples in chunks, serially or in a process pool
+    Each chunk draws from its own stream spawned from the seed,
+    so the result does not depend on n_jobs
+
+    Args:
+        chunk_function (Callable): chunk worker
+        data (np.ndarray): series to resample
+        option (Any): block size or with_replacement of the worker
+        resample_count (int): number of resamples
+        periods_per_year (float): number of periods in a year
+        seed (int): random seed, None for fresh entropy
+        n_jobs (int): number of processes, 1 to run in this process
+
+    Returns:
+        ResampleDistribution: distribution of all resamples
+    """
+    chunk_sizes: list[int] = [
+        min(RESAMPLE_CHUNK_SIZE, resample_count - start)
+        for start in range(0, resample_count, RESAMPLE_CHUNK_SIZE)
+    ]
+    seed_sequences: list[np.random.SeedSequence] = np.random.SeedSequence(seed).spawn(
+        len(chunk_sizes)
+    )
+    arguments = [
+        (data, option, chunk_size, periods_per_year, seed_sequence)
+        for chunk_size, seed_sequence in zip(chunk_sizes, seed_sequences)
+    ]
+    if n_jobs == 1:
+        chunks: list[ResampleDistribution] = [
+            chunk_function(*argument) for argument in arguments
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunks: list[ResampleDistribution] = list(
+                executor.map(chunk_function, *zip(*arguments))
+            )
+    return ResampleDistribution(
+        pnl=np.concatenate([c.pnl for c in chunks]),
+        sharpe_ratio=np.concatenate([c.sharpe_ratio for c in chunks]),
+        max_drawdown=np.concatenate([c.max_drawdown for c in chunks]),
+    )
+
+
+def block_bootstrap_mtm(
+    timestamp_ms: np.ndarray,
+    mtm: np.ndarray,
+    resample_count: int = 1000,
+    block_size: int = 24,
+    seed: int = None,
+    n_jobs: int = 1,
+) -> ResampleDistribution:
+    """Distribution of pnl, sharpe ratio and max drawdown by circular block bootstrap
+    of the mtm series, blocks keep the autocorrelation of consecutive bars.
+    The sharpe ratio is annualized the same way as
+    TradeBookKeeperAgent.calculate_sharpe_ratio
+
+    Args:
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        mtm (np.ndarray): mtm of each bar
+        resample_count (int, optional): number of resamples. Defaults to 1000.
+        block_size (int, optional): number of consecutive bars of a block. Defaults to
+            24.
+        seed (int, optional): random seed. Defaults to None.
+        n_jobs (int, optional): number of processes. Defaults to 1.
+
+    Raises:
+        ValueError: block_size is not > 0
+
+    Returns:
+        ResampleDistribution: distribution of the resamples
+    """
+    if block_size <= 0:
+        raise ValueError(f"block size should be > 0: {block_size}")
+    time_period_hours: float = (timestamp_ms[-1] - timestamp_ms[0]) / 1000 / 3600
+    # mean / std * sqrt(periods per year) = sum / hours / std * sqrt(hours per year)
+    periods_per_year: float = (len(mtm) / time_period_hours) ** 2 * HOURS_PER_YEAR
+    return _run_chunks(
+        chunk_function=_block_bootstrap_chunk,
+        data=np.asarray(mtm, dtype=float),
+        option=min(block_size, len(mtm)),
+        resample_count=resample_count,
+        periods_per_year=periods_per_year,
+        seed=seed,
+        n_jobs=n_jobs,
+    )
+
+
+def shuffle_trade_order(
+    trades: list[ProxyTrade],
+    resample_count: int = 1000,
+    with_replacement: bool = False,
+    seed: int = None,
+    n_jobs: int = 1,
+) -> ResampleDistribution:
+    """Distribution of pnl, sharpe ratio and max drawdown of the closed trades in
+    random order
+    Permuting the trades only changes the max drawdown,
+    drawing them with replacement also changes pnl and sharpe ratio.
+    The sharpe ratio is per trade, annualized by the number of trades per year
+
+    Args:
+        trades (list[ProxyTrade]): closed trades
+        resample_count (int, optional): number of resamples. Defaults to 1000.
+        with_replacement (bool, optional): draw trades with replacement. Defaults to
+            False.
+        seed (int, optional): random seed. Defaults to None.
+        n_jobs (int, optional): number of processes. Defaults to 1.
+
+    Raises:
+        ValueError: no closed trade
+
+    Returns:
+        ResampleDistribution: distribution of the resamples
+    """
+    trades = sorted(trades, key=lambda t: t.exit_datetime)
+    if len(trades) == 0:
+        raise ValueError("no closed trade to resample")
+    trade_pnl: np.ndarray = np.array([t.pnl_normalized for t in trades])
+    period_years: float = (
+        (trades[-1].exit_datetime - trades[0].entry_datetime).total_seconds()
+        / 3600
+        / HOURS_PER_YEAR
+    )
+    return _run_chunks(
+        chunk_function=_trade_shuffle_chunk,
+        data=trade_pnl,
+        option=with_replacement,
+        resample_count=resample_count,
+        periods_per_year=len(trades) / period_years if period_years > 0 else 1,
+        seed=seed,
+        n_jobs=n_jobs,
+    )
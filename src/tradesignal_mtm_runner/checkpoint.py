@@ -0,0 +1,96 @@
+from __future__ import annotations
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from .models import ProxyTrade
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentCheckpoint:
+    """State of a book keeper agent before a bar is run
+    Outstanding trades are copies, archived trades are kept by count only
+    since the archive of a run only grows
+    """
+
+    bar_index: int
+    history_size: int
+    archive_long_count: int
+    archive_short_count: int
+    long_trades_outstanding: list[ProxyTrade]
+    short_trades_outstanding: list[ProxyTrade]
+
+
+@dataclass
+class RunCheckpoints:
+    """Inputs of a run and the agent checkpoints taken at least interval bars apart,
+    so that a run with other signals on the same market data is re-simulated
+    from the last checkpoint before the first bar where the signals differ
+    """
+
+    interval: int
+    timestamp_ms: np.ndarray
+    close_price: np.ndarray
+    buy_signal: np.ndarray
+    sell_signal: np.ndarray
+    checkpoints: list[AgentCheckpoint] = field(default_factory=list)
+
+    def is_due(self, bar_index: int) -> bool:
+        """Check if a checkpoint should be taken before the bar
+
+        Args:
+            bar_index (int): bar about to run
+
+        Returns:
+            bool: no checkpoint yet, or interval bars passed since the last one
+        """
+        return (
+            len(self.checkpoints) == 0
+            or bar_index >= self.checkpoints[-1].bar_index + self.interval
+        )
+
+    def add(self, checkpoint: AgentCheckpoint) -> None:
+        self.checkpoints.append(checkpoint)
+
+    def find_first_divergent_bar(
+        self,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_signal: np.ndarray,
+        sell_signal: np.ndarray,
+    ) -> int:
+        """Find the first bar where the inputs of a new run differ from this run
+
+        Args:
+            timestamp_ms (np.ndarray): time stamp of each bar of the new run in ms
+            close_price (np.ndarray): close price of the new run
+            buy_signal (np.ndarray): buy signal of the new run
+            sell_signal (np.ndarray): sell signal of the new run
+
+        Returns:
+            int: bar index, the length of the shorter run if one run is a prefix of the
+                other
+        """
+        common: int = min(len(self.timestamp_ms), len(timestamp_ms))
+        diverged: np.ndarray = (
+            (self.timestamp_ms[:common] != timestamp_ms[:common])
+            | (self.close_price[:common] != close_price[:common])
+            | (self.buy_signal[:common] != buy_signal[:common])
+            | (self.sell_signal[:common] != sell_signal[:common])
+        )
+        return int(np.argmax(diverged)) if diverged.any() else common
+
+    def rewind(self, bar_index: int) -> AgentCheckpoint:
+        """Get the last checkpoint at or before the bar and drop the later ones
+
+        Args:
+            bar_index (int): first bar to re-simulate
+
+        Returns:
+            AgentCheckpoint: checkpoint to restore, None if there is no checkpoint
+        """
+        position: int = bisect_right([c.bar_index for c in self.checkpoints], bar_index)
+        del self.checkpoints[position:]
+        return self.checkpoints[-1] if position > 0 else None
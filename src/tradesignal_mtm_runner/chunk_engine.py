@@ -0,0 +1,320 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Sequence
+from .config import PnlCalcConfig
+from .trade_reward import TradeBookKeeperAgent
+from .event_engine import run_event_driven
+from .models import ProxyTrade, Buy_Sell_Action_Enum
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chunks of a long series are at least this long, shorter series run in one chunk
+MIN_CHUNK_BARS: int = 1000
+# Chunks per process, more chunks balance the load of the processes
+CHUNKS_PER_JOB: int = 4
+
+
+@dataclass
+class ChunkResult:
+    """mtm history and trades of a chunk simulated from a flat agent"""
+
+    mtm: np.ndarray
+    fee_event_count: np.ndarray
+    is_flat: np.ndarray
+    long_trades_archive: list[ProxyTrade]
+    short_trades_archive: list[ProxyTrade]
+    long_trades_outstanding: list[ProxyTrade]
+    short_trades_outstanding: list[ProxyTrade]
+
+
+def find_chunk_bounds(
+    buy_signal: np.ndarray,
+    sell_signal: np.ndarray,
+    chunk_count: int,
+    min_chunk_bars: int = MIN_CHUNK_BARS,
+) -> np.ndarray:
+    """Split the bars into chunks likely to start without outstanding trade
+    Around each even split, a chunk starts at the signal bar after the longest stretch
+    without signal, where the trades of the previous chunk had the most time to
+    close by roi or stop loss.
+
+    Args:
+        buy_signal (np.ndarray): buy signal of each bar
+        sell_signal (np.ndarray): sell signal of each bar
+        chunk_count (int): number of chunks wanted
+        min_chunk_bars (int, optional): min number of bars of a chunk. Defaults to
+            MIN_CHUNK_BARS.
+
+    Returns:
+        np.ndarray: sorted chunk bounds, from 0 to the number of bars
+    """
+    bar_count: int = len(buy_signal)
+    chunk_count = max(1, min(chunk_count, bar_count // max(1, min_chunk_bars)))
+    even_bounds: np.ndarray = np.linspace(0, bar_count, chunk_count + 1).astype(
+        np.int64
+    )
+    signal_index: np.ndarray = np.flatnonzero((buy_signal == 1) | (sell_signal == 1))
+    window: int = bar_count // chunk_count // 4
+    bounds: list[int] = [0]
+    for even_bound in even_bounds[1:-1]:
+        candidates: np.ndarray = signal_index[
+            np.searchsorted(signal_index, even_bound - window) : np.searchsorted(
+                signal_index, even_bound + window
+            )
+        ]
+        bound: int = (
+            int(candidates[np.argmax(np.diff(candidates)) + 1])
+            if len(candidates) > 1
+            else int(even_bound)
+        )
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    bounds.append(bar_count)
+    return np.array(bounds, dtype=np.int64)
+
+
+def _simulate_chunk(
+    symbol: str,
+    pnl_config: PnlCalcConfig,
+    time_line: Sequence[datetime],
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    price_move: np.ndarray,
+    buy_signal: np.ndarray,
+    sell_signal: np.ndarray,
+) -> ChunkResult:
+    """Simulate the bars of a chunk from a flat agent with the event driven engine
+
+    Args:
+        symbol (str): symbol of the asset
+        pnl_config (PnlCalcConfig): pnl calculation config
+        time_line (Sequence[datetime]): time stamp of each bar of the chunk
+        timestamp_ms (np.ndarray): time stamp of each bar of the chunk in ms
+        close_price (np.ndarray): close price of the chunk
+        price_move (np.ndarray): price diff = price(t) - price(t-1) of the chunk
+        buy_signal (np.ndarray): buy signal of the chunk
+        sell_signal (np.ndarray): sell signal of the chunk
+
+    Returns:
+        ChunkResult: speculative result of the chunk
+    """
+    trade_order_agent = TradeBookKeeperAgent(
+        symbol=symbol, pnl_config=pnl_config, capacity=len(close_price)
+    )
+    run_event_driven(
+        trade_order_agent=trade_order_agent,
+        time_line=time_line,
+        timestamp_ms=timestamp_ms,
+        close_price=close_price,
+        price_move=price_move,
+        buy_index=np.flatnonzero(buy_signal == 1),
+        sell_index=np.flatnonzero(sell_signal == 1),
+    )
+    return ChunkResult(
+        mtm=trade_order_agent.mtm_history_value.copy(),
+        fee_event_count=trade_order_agent.fee_event_history.copy(),
+        is_flat=trade_order_agent.flat_history.copy(),
+        long_trades_archive=trade_order_agent.archive_long_positions_list,
+        short_trades_archive=trade_order_agent.archive_short_positions_list,
+        long_trades_outstanding=list(trade_order_agent.outstanding_long_position_list),
+        short_trades_outstanding=list(
+            trade_order_agent.outstanding_short_position_list
+        ),
+    )
+
+
+def run_chunked_parallel(
+    trade_order_agent: TradeBookKeeperAgent,
+    pnl_config: PnlCalcConfig,
+    time_line: Sequence[datetime],
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    price_move: np.ndarray,
+    buy_signal: np.ndarray,
+    sell_signal: np.ndarray,
+    n_jobs: int = 1,
+    chunk_count: int = None,
+    min_chunk_bars: int = MIN_CHUNK_BARS,
+) -> None:
+    """Simulate a long series in chunks in parallel processes and stitch the chunks
+    Once the agent holds no trade, the rest of the run does not depend on the past,
+    so each chunk is simulated speculatively from a flat agent.
+    The chunks are then stitched in order: a chunk following a chunk ending with
+    outstanding trades is re-simulated bar by bar from the actual trades until both runs
+    are flat after the same bar, the speculative run is taken from there on.
+    The result is the same as running the agent on each bar.
+    Drawdown and sharpe ratio are worked out from the stitched mtm history.
+
+    Args:
+        trade_order_agent (TradeBookKeeperAgent): book keeper agent, its outstanding
+            trades are carried into the first chunk
+        pnl_config (PnlCalcConfig): pnl calculation config
+        time_line (Sequence[datetime]): time stamp of each bar
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        price_move (np.ndarray): price diff = price(t) - price(t-1)
+        buy_signal (np.ndarray): buy signal of each bar
+        sell_signal (np.ndarray): sell signal of each bar, buy wins if both at the same
+            bar
+        n_jobs (int, optional): number of processes, 1 to run in this process. Defaults
+            to 1.
+        chunk_count (int, optional): number of chunks. Defaults to n_jobs *
+            CHUNKS_PER_JOB.
+        min_chunk_bars (int, optional): min number of bars of a chunk. Defaults to
+            MIN_CHUNK_BARS.
+    """
+    bounds: np.ndarray = find_chunk_bounds(
+        buy_signal=buy_signal,
+        sell_signal=sell_signal,
+        chunk_count=chunk_count if chunk_count is not None else n_jobs * CHUNKS_PER_JOB,
+        min_chunk_bars=min_chunk_bars,
+    )
+    arguments = [
+        (
+            trade_order_agent.symbol,
+            pnl_config,
+            time_line[start:end],
+            timestamp_ms[start:end],
+            close_price[start:end],
+            price_move[start:end],
+            buy_signal[start:end],
+            sell_signal[start:end],
+        )
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    if n_jobs == 1 or len(arguments) == 1:
+        chunks: list[ChunkResult] = [
+            _simulate_chunk(*argument) for argument in arguments
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunks: list[ChunkResult] = list(
+                executor.map(_simulate_chunk, *zip(*arguments))
+            )
+
+    # Stitch the chunks, the trades outstanding at the end of each chunk are carried on
+    carry_long: list[ProxyTrade] = list(
+        trade_order_agent.outstanding_long_position_list
+    )
+    carry_short: list[ProxyTrade] = list(
+        trade_order_agent.outstanding_short_position_list
+    )
+    trade_order_agent.outstanding_long_position_list.clear()
+    trade_order_agent.outstanding_short_position_list.clear()
+    resimulated_bars: int = 0
+    for start, end, chunk in zip(bounds[:-1], bounds[1:], chunks):
+        converged_bar: int = start - 1
+        if len(carry_long) > 0 or len(carry_short) > 0:
+            rerun_agent = TradeBookKeeperAgent(
+                symbol=trade_order_agent.symbol,
+                pnl_config=pnl_config,
+                capacity=end - start,
+                roi_helper=trade_order_agent.roi_helper,
+            )
+            rerun_agent.outstanding_long_position_list.extend(carry_long)
+            rerun_agent.outstanding_short_position_list.extend(carry_short)
+            converged_bar = _resimulate_until_converged(
+                rerun_agent=rerun_agent,
+                chunk=chunk,
+                start=start,
+                end=end,
+                time_line=time_line,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                price_move=price_move,
+                buy_signal=buy_signal,
+                sell_signal=sell_signal,
+            )
+            resimulated_bars += converged_bar + 1 - start
+            trade_order_agent.record_mtm_history_bulk(
+                timestamp_ms=timestamp_ms[start : converged_bar + 1],
+                mtm=rerun_agent.mtm_history_value,
+                fee_event_count=rerun_agent.fee_event_history,
+                is_flat=rerun_agent.flat_history,
+            )
+            trade_order_agent.archive_long_positions_list.extend(
+                rerun_agent.archive_long_positions_list
+            )
+            trade_order_agent.archive_short_positions_list.extend(
+                rerun_agent.archive_short_positions_list
+            )
+            if converged_bar == end - 1:
+                carry_long = list(rerun_agent.outstanding_long_position_list)
+                carry_short = list(rerun_agent.outstanding_short_position_list)
+                continue
+
+        # the speculative run holds from the bar after the convergence
+        offset: int = converged_bar + 1 - start
+        trade_order_agent.record_mtm_history_bulk(
+            timestamp_ms=timestamp_ms[converged_bar + 1 : end],
+            mtm=chunk.mtm[offset:],
+            fee_event_count=chunk.fee_event_count[offset:],
+            is_flat=chunk.is_flat[offset:],
+        )
+        for archive, speculative_archive in (
+            (trade_order_agent.archive_long_positions_list, chunk.long_trades_archive),
+            (
+                trade_order_agent.archive_short_positions_list,
+                chunk.short_trades_archive,
+            ),
+        ):
+            archive.extend(
+                t
+                for t in speculative_archive
+                if offset == 0 or t.entry_datetime > time_line[converged_bar]
+            )
+        carry_long = chunk.long_trades_outstanding
+        carry_short = chunk.short_trades_outstanding
+
+    trade_order_agent.outstanding_long_position_list.extend(carry_long)
+    trade_order_agent.outstanding_short_position_list.extend(carry_short)
+    logger.debug(
+        f"{trade_order_agent.symbol}: {len(chunks)} chunks, re-simulated "
+        f"{resimulated_bars} bars"
+    )
+
+
+def _resimulate_until_converged(
+    rerun_agent: TradeBookKeeperAgent,
+    chunk: ChunkResult,
+    start: int,
+    end: int,
+    time_line: Sequence[datetime],
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    price_move: np.ndarray,
+    buy_signal: np.ndarray,
+    sell_signal: np.ndarray,
+) -> int:
+    """Run the agent holding the actual trades at the start of a chunk bar by bar
+    until it is flat after a bar where the speculative run is also flat
+
+    Args:
+        rerun_agent (TradeBookKeeperAgent): agent with the trades carried into the chunk
+        chunk (ChunkResult): speculative result of the chunk
+        start (int): first bar of the chunk
+        end (int): bar after the chunk
+
+    Returns:
+        int: last re-simulated bar, end - 1 if the runs do not converge
+    """
+    for i in range(start, end):
+        buy_sell_signal: Buy_Sell_Action_Enum = Buy_Sell_Action_Enum.HOLD
+        if buy_signal[i] == 1:
+            buy_sell_signal = Buy_Sell_Action_Enum.BUY
+        elif sell_signal[i] == 1:
+            buy_sell_signal = Buy_Sell_Action_Enum.SELL
+        rerun_agent.run_at_timestamp(
+            dt=time_line[i],
+            price=close_price[i],
+            price_diff=price_move[i],
+            buy_sell_action=buy_sell_signal,
+            timestamp_ms=timestamp_ms[i],
+        )
+        if rerun_agent.flat_history[-1] and chunk.is_flat[i - start]:
+            return i
+    return end - 1
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Any
+from .exceptions import UnSupportedException
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pyarrow and polars are optional, the tables are recognized by the module of their type
+# so that neither package is imported unless such a table is given
+ARROW_TABLE_TYPES: tuple[str, ...] = ("Table", "RecordBatch")
+POLARS_FRAME_TYPES: tuple[str, ...] = ("DataFrame",)
+
+
+def is_columnar_table(table: Any) -> bool:
+    """Check if the table is an Arrow table / record batch or a Polars data frame
+
+    Args:
+        table (Any): table to check
+
+    Returns:
+        bool: True if the columns can be read by read_column
+    """
+    table_type: type = type(table)
+    module: str = table_type.__module__.split(".")[0]
+    return (module == "pyarrow" and table_type.__name__ in ARROW_TABLE_TYPES) or (
+        module == "polars" and table_type.__name__ in POLARS_FRAME_TYPES
+    )
+
+
+def read_column(table: Any, name: str) -> np.ndarray:
+    """Read a column of an Arrow table or Polars data frame as numpy array
+    The array is a view of the column buffer if the column is a single chunk of
+    a primitive type without null, otherwise the column is copied.
+    Null values become nan.
+
+    Args:
+        table (Any): pyarrow Table / RecordBatch or polars DataFrame
+        name (str): column name
+
+    Raises:
+        UnSupportedException: the table is not an Arrow table or Polars data frame
+
+    Returns:
+        np.ndarray: values of the column
+    """
+    if not is_columnar_table(table):
+        raise UnSupportedException(
+            f"{type(table).__name__} is not an Arrow table or Polars data frame"
+        )
+    if type(table).__module__.startswith("polars"):
+        return table.get_column(name).to_numpy()
+    column = table.column(name)
+    if hasattr(column, "num_chunks"):
+        if column.num_chunks != 1:
+            logger.debug(f"column {name} of {column.num_chunks} chunks is copied")
+            return column.to_numpy()
+        column = column.chunk(0)
+    return column.to_numpy(zero_copy_only=False)
+
+
+def read_timestamp_ms(table: Any, name: str) -> np.ndarray:
+    """Read a time stamp column as UTC time stamp in ms
+    A datetime column in ms or an int64 column of ms is read without copy,
+    datetime columns of other units are converted.
+
+    Args:
+        table (Any): pyarrow Table / RecordBatch or polars DataFrame
+        name (str): column name of the time stamp
+
+    Returns:
+        np.ndarray: int64 time stamp in ms
+    """
+    timestamp: np.ndarray = read_column(table=table, name=name)
+    if timestamp.dtype.kind == "M":
+        if np.datetime_data(timestamp.dtype)[0] != "ms":
+            timestamp = timestamp.astype("datetime64[ms]")
+        return timestamp.view(np.int64)
+    return np.asarray(timestamp, dtype=np.int64)
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from collections import deque, namedtuple
 from typing import List, Any, Tuple
 from enum import Enum
+import numpy as np
 #https://iq.opengenus.org/b-tree-searching-insertion/
 
 class BPlusTree:
@@ -248,4 +249,92 @@ class IndexedList:
         if s == SearchResultType.Exact or s == SearchResultType.SmallestValueJustLarger:
             return self._list[inx:]
         else:
-            return self._list[inx + 1 :]
\ No newline at end of file
+            return self._list[inx + 1 :]
+
+
+class SparseTable:
+    """Sparse table answering range minimum or maximum of an immutable array
+    level k keeps the extremum of each window of 2^k values,
+    a range [begin, end] is covered by two overlapping windows of the largest level
+    fitting in it
+    Build cost is O(NlogN), storage cost is NlogN, query cost is O(1)
+    """
+
+    def __init__(self, values: np.ndarray, func: np.ufunc = np.minimum) -> None:
+        """
+        Args:
+            values (np.ndarray): array to query
+            func (np.ufunc, optional): np.minimum or np.maximum. Defaults to np.minimum.
+        """
+        values = np.asarray(values)
+        self.func: np.ufunc = func
+        level_count: int = max(1, int(len(values)).bit_length())
+        self._table: np.ndarray = np.empty(
+            (level_count, len(values)), dtype=values.dtype
+        )
+        self._table[0] = values
+        for k in range(1, level_count):
+            width: int = 1 << (k - 1)
+            func(
+                self._table[k - 1, : len(values) - width],
+                self._table[k - 1, width:],
+                out=self._table[k, : len(values) - width],
+            )
+
+    def query(self, begin, end):
+        """Extremum of values[begin : end + 1], vectorized over arrays of ranges
+
+        Args:
+            begin (Union[int, np.ndarray]): first index of the range
+            end (Union[int, np.ndarray]): last index of the range, end >= begin
+
+        Returns:
+            Union[float, np.ndarray]: extremum of each range
+        """
+        begin = np.asarray(begin, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        level: np.ndarray = np.frexp(end - begin + 1)[1] - 1
+        return self.func(
+            self._table[level, begin], self._table[level, end - (1 << level) + 1]
+        )
+
+
+class SortedIndex:
+    """Index of an immutable sorted array, e.g. the time stamps of a memory mapped file
+    The array is searched in place by binary search, nothing is copied or built.
+    Query cost is O(logN), storage cost is none beyond the array
+    """
+
+    def __init__(self, values: np.ndarray) -> None:
+        """
+        Args:
+            values (np.ndarray): sorted array, not checked
+        """
+        self.values: np.ndarray = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def search_left(self, value) -> int:
+        """position of the first value >= value, len if there is none"""
+        return int(np.searchsorted(self.values, value, side="left"))
+
+    def search_right(self, value) -> int:
+        """position after the last value <= value, 0 if there is none"""
+        return int(np.searchsorted(self.values, value, side="right"))
+
+    def range_slice(self, begin=None, end=None) -> slice:
+        """slice of the values in [begin, end]
+
+        Args:
+            begin (Any, optional): smallest value of the range. Defaults to None, no
+                lower bound.
+            end (Any, optional): largest value of the range. Defaults to None, no upper
+                bound.
+
+        Returns:
+            slice: positions of the values in the range
+        """
+        start: int = 0 if begin is None else self.search_left(begin)
+        stop: int = len(self.values) if end is None else self.search_right(end)
+        return slice(start, max(start, stop))
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Sequence
+from .trade_reward import TradeBookKeeperAgent
+from .checkpoint import RunCheckpoints
+from .position_list import TRIGGER_PRICE_TOLERANCE
+from .models import Buy_Sell_Action_Enum, LongShort_Enum
+from .utility import convert_datetime_to_ms
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of bars of the first vectorized trigger search after an event
+TRIGGER_SEARCH_CHUNK_SIZE: int = 64
+
+
+def run_event_driven(
+    trade_order_agent: TradeBookKeeperAgent,
+    time_line: Sequence[datetime],
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    price_move: np.ndarray,
+    buy_index: np.ndarray,
+    sell_index: np.ndarray,
+    start: int = 0,
+    run_checkpoints: RunCheckpoints = None,
+) -> None:
+    """Run the book keeper agent on event bars only
+    An event bar is
+    - a bar with buy or sell signal
+    - a bar where an outstanding trade reaches its next roi period
+    - a bar where the price crosses the stop loss or roi trigger price of an
+      outstanding trade
+    The bars in between are idle, their mtm and laid back tax are recorded in bulk.
+    The result is the same as running the agent on each bar.
+
+    Args:
+        trade_order_agent (TradeBookKeeperAgent): book keeper agent
+        time_line (Sequence[datetime]): time stamp of each bar
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        price_move (np.ndarray): price diff = price(t) - price(t-1)
+        buy_index (np.ndarray): sorted bar index of buy signals
+        sell_index (np.ndarray): sorted bar index of sell signals, buy wins if both at
+            the same bar
+        start (int, optional): first bar to run, the agent holds the state before it.
+            Defaults to 0.
+        run_checkpoints (RunCheckpoints, optional): checkpoints to record at event bars.
+            Defaults to None.
+    """
+    bar_count: int = len(close_price)
+    signal_index, is_buy_signal = merge_signal_index(buy_index, sell_index)
+    signal_pointer: int = int(np.searchsorted(signal_index, start))
+
+    i: int = start
+    while i < bar_count:
+        if run_checkpoints is not None and run_checkpoints.is_due(i):
+            run_checkpoints.add(trade_order_agent.create_checkpoint(i))
+        buy_sell_signal: Buy_Sell_Action_Enum = Buy_Sell_Action_Enum.HOLD
+        if signal_pointer < len(signal_index) and signal_index[signal_pointer] == i:
+            buy_sell_signal = (
+                Buy_Sell_Action_Enum.BUY
+                if is_buy_signal[signal_pointer]
+                else Buy_Sell_Action_Enum.SELL
+            )
+            signal_pointer += 1
+
+        trade_order_agent.run_at_timestamp(
+            dt=time_line[i],
+            price=close_price[i],
+            price_diff=price_move[i],
+            buy_sell_action=buy_sell_signal,
+            timestamp_ms=timestamp_ms[i],
+        )
+
+        next_signal_bar: int = (
+            int(signal_index[signal_pointer])
+            if signal_pointer < len(signal_index)
+            else bar_count
+        )
+        next_event_bar: int = _find_next_trigger_bar(
+            trade_order_agent=trade_order_agent,
+            dt=time_line[i],
+            timestamp_ms=timestamp_ms,
+            close_price=close_price,
+            start=i + 1,
+            end=next_signal_bar,
+        )
+        trade_order_agent.run_idle_bars(
+            timestamp_ms=timestamp_ms[i + 1 : next_event_bar],
+            price_diff=price_move[i + 1 : next_event_bar],
+        )
+        i = next_event_bar
+
+
+def merge_signal_index(
+    buy_index: np.ndarray, sell_index: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Merge the bar index of buy and sell signals into one sorted index
+
+    Args:
+        buy_index (np.ndarray): sorted bar index of buy signals
+        sell_index (np.ndarray): sorted bar index of sell signals
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: bar index of all signals, and True where the
+            signal is a buy, buy wins if both at the same bar
+    """
+    signal_index: np.ndarray = np.union1d(buy_index, sell_index).astype(np.int64)
+    return signal_index, np.isin(signal_index, buy_index)
+
+
+def dense_signal(signal_index: np.ndarray, bar_count: int) -> np.ndarray:
+    """Expand the bar index of signals to a signal of each bar
+
+    Args:
+        signal_index (np.ndarray): bar index of signals
+        bar_count (int): number of bars
+
+    Returns:
+        np.ndarray: int8 signal of each bar, 1 at the signal bars and 0 elsewhere
+    """
+    signal: np.ndarray = np.zeros(bar_count, dtype=np.int8)
+    signal[signal_index] = 1
+    return signal
+
+
+def _find_next_trigger_bar(
+    trade_order_agent: TradeBookKeeperAgent,
+    dt: datetime,
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    start: int,
+    end: int,
+) -> int:
+    """Find the first bar in [start, end) where an outstanding trade may be closed by
+    roi or stop loss
+
+    Args:
+        trade_order_agent (TradeBookKeeperAgent): book keeper agent
+        dt (datetime): time stamp of the last processed bar
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        start (int): first bar to search
+        end (int): bar to stop the search
+
+    Returns:
+        int: bar index, end if no trigger is found
+    """
+    triggers: list[tuple[int, float, float]] = []
+    for position_list in (
+        trade_order_agent.outstanding_long_position_list,
+        trade_order_agent.outstanding_short_position_list,
+    ):
+        if len(position_list) == 0:
+            continue
+        stop_loss_key, roi_key, next_roi_period = position_list.get_trigger_bounds(dt)
+        if next_roi_period is not None:
+            # the roi of the next period is in effect from this bar
+            end = min(
+                end,
+                int(
+                    np.searchsorted(
+                        timestamp_ms,
+                        convert_datetime_to_ms(next_roi_period),
+                        side="left",
+                    )
+                ),
+            )
+        sign: int = 1 if position_list[0].direction == LongShort_Enum.LONG else -1
+        triggers.append((sign, stop_loss_key, roi_key))
+
+    if len(triggers) == 0:
+        return end
+
+    chunk_size: int = TRIGGER_SEARCH_CHUNK_SIZE
+    while start < end:
+        chunk_end: int = min(end, start + chunk_size)
+        price: np.ndarray = close_price[start:chunk_end]
+        tolerance: np.ndarray = np.abs(price) * TRIGGER_PRICE_TOLERANCE
+        fired: np.ndarray = np.zeros(len(price), dtype=bool)
+        for sign, stop_loss_key, roi_key in triggers:
+            if stop_loss_key < float("inf"):
+                fired |= stop_loss_key <= -sign * price + tolerance
+            if roi_key < float("inf"):
+                fired |= roi_key <= sign * price + tolerance
+        if fired.any():
+            return start + int(np.argmax(fired))
+        start = chunk_end
+        chunk_size *= 2
+    return end
@@ -0,0 +1,92 @@
+from __future__ import annotations
+from .models import ProxyTrade, LongShort_Enum
+from .data_struct import SparseTable
+from .utility import convert_datetime_to_ms
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PriceRangeIndex:
+    """Range minimum and maximum of the close price in O(1) per query"""
+
+    def __init__(self, timestamp_ms: np.ndarray, close_price: np.ndarray) -> None:
+        """
+        Args:
+            timestamp_ms (np.ndarray): sorted time stamp of each bar in ms
+            close_price (np.ndarray): close price
+        """
+        self.timestamp_ms: np.ndarray = np.asarray(timestamp_ms, dtype=np.int64)
+        self.min_table: SparseTable = SparseTable(close_price, np.minimum)
+        self.max_table: SparseTable = SparseTable(close_price, np.maximum)
+
+    def calculate_trade_excursions(
+        self, trades: list[ProxyTrade]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Calculate the max adverse and favorable excursion of the trades in one
+        vectorized call and store them into the trades.
+        The excursion of a trade covers the close price from its entry bar to its exit
+        bar, or to the last bar if it is still open.
+        A trade entered before the first bar, e.g. carried over from a resumed
+        snapshot, extends its stored excursions with the bars of the index, and stays
+        None without them.
+
+        Args:
+            trades (list[ProxyTrade]): trades exited at bars of the index or still open
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: max adverse excursion (<= 0), max favorable
+                excursion (>= 0) in normalized pnl of each trade
+        """
+        if len(trades) == 0:
+            return np.empty(0), np.empty(0)
+        last_bar: int = len(self.timestamp_ms) - 1
+        is_open: np.ndarray = np.array([t.exit_datetime is None for t in trades])
+        entry_ms: np.ndarray = np.array(
+            [convert_datetime_to_ms(t.entry_datetime) for t in trades], dtype=np.int64
+        )
+        entry_index: np.ndarray = np.searchsorted(self.timestamp_ms, entry_ms)
+        exit_index: np.ndarray = np.searchsorted(
+            self.timestamp_ms,
+            np.array(
+                [
+                    (
+                        convert_datetime_to_ms(t.exit_datetime)
+                        if t.exit_datetime is not None
+                        else 0
+                    )
+                    for t in trades
+                ],
+                dtype=np.int64,
+            ),
+        )
+        exit_index[is_open] = last_bar
+
+        entry_price: np.ndarray = np.array([t.entry_price for t in trades])
+        is_long: np.ndarray = np.array(
+            [t.direction == LongShort_Enum.LONG for t in trades]
+        )
+        low: np.ndarray = self.min_table.query(entry_index, exit_index)
+        high: np.ndarray = self.max_table.query(entry_index, exit_index)
+        adverse: np.ndarray = (
+            np.where(is_long, low - entry_price, entry_price - high) / entry_price
+        )
+        favorable: np.ndarray = (
+            np.where(is_long, high - entry_price, entry_price - low) / entry_price
+        )
+        # the bars before the first bar are only known from the stored excursions
+        for i in np.flatnonzero(entry_ms < self.timestamp_ms[0]):
+            trade: ProxyTrade = trades[i]
+            if (
+                trade.max_adverse_excursion is None
+                or trade.max_favorable_excursion is None
+            ):
+                adverse[i] = favorable[i] = np.nan
+            else:
+                adverse[i] = min(adverse[i], trade.max_adverse_excursion)
+                favorable[i] = max(favorable[i], trade.max_favorable_excursion)
+        for trade, mae, mfe in zip(trades, adverse, favorable):
+            trade.max_adverse_excursion = None if np.isnan(mae) else float(mae)
+            trade.max_favorable_excursion = None if np.isnan(mfe) else float(mfe)
+        return adverse, favorable
@@ -0,0 +1,389 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Sequence
+from .config import PnlCalcConfig
+from .helper import ROI_Helper
+from .trade_reward import TradeBookKeeperAgent
+from .models import ProxyTrade, LongShort_Enum, Proxy_Trade_Actions
+from .exceptions import UnSupportedException
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of bars of the first vectorized exit search after an entry
+EXIT_SEARCH_CHUNK_SIZE: int = 64
+
+
+@dataclass
+class TradeInterval:
+    """Life of a trade of the first passage engine, in bar index"""
+
+    direction: int  # +1 long, -1 short
+    entry_index: int
+    exit_index: int = None  # None if the trade is still outstanding at the last bar
+    close_reason: Proxy_Trade_Actions = None
+
+
+class FirstPassageSignals:
+    """Effective buy/sell signals of each bar, buy wins if both at the same bar"""
+
+    def __init__(self, buy_index: np.ndarray, sell_index: np.ndarray) -> None:
+        self.buy_index: np.ndarray = np.asarray(buy_index, dtype=np.int64)
+        self.sell_index: np.ndarray = np.setdiff1d(sell_index, buy_index).astype(
+            np.int64
+        )
+
+    @staticmethod
+    def _next_index(index: np.ndarray, start: int) -> int:
+        inx: int = int(np.searchsorted(index, start, side="left"))
+        return int(index[inx]) if inx < len(index) else None
+
+    def next_buy(self, start: int) -> int:
+        return self._next_index(self.buy_index, start)
+
+    def next_sell(self, start: int) -> int:
+        return self._next_index(self.sell_index, start)
+
+
+def find_exit(
+    direction: int,
+    entry_index: int,
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    roi_helper: ROI_Helper,
+    stop_loss: float,
+    end: int,
+) -> tuple[int, Proxy_Trade_Actions]:
+    """Find the first bar after the entry in (entry_index, end) where roi or stop
+    loss fires
+    The bars are searched in chunks of growing size with vectorized pnl comparisons
+
+    Args:
+        direction (int): +1 long, -1 short
+        entry_index (int): entry bar
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        roi_helper (ROI_Helper): roi helper
+        stop_loss (float): stop loss ratio
+        end (int): bar to stop the search
+
+    Returns:
+        tuple[int, Proxy_Trade_Actions]: exit bar and close reason, (None, None) if not
+            found
+    """
+    entry_price: float = close_price[entry_index]
+    start: int = entry_index + 1
+    chunk_size: int = EXIT_SEARCH_CHUNK_SIZE
+    while start < end:
+        chunk_end: int = min(end, start + chunk_size)
+        price: np.ndarray = close_price[start:chunk_end]
+        pnl: np.ndarray = (
+            (price - entry_price) if direction == 1 else (entry_price - price)
+        ) / entry_price
+        elapsed_seconds: np.ndarray = (
+            timestamp_ms[start:chunk_end] - timestamp_ms[entry_index]
+        ) // 1000
+        roi_fired: np.ndarray = pnl > roi_helper.get_take_profit_thresholds(
+            elapsed_seconds
+        )
+        fired: np.ndarray = roi_fired | (pnl < -abs(stop_loss))
+        if fired.any():
+            k: int = int(np.argmax(fired))
+            return start + k, (
+                Proxy_Trade_Actions.ROI
+                if roi_fired[k]
+                else Proxy_Trade_Actions.STOP_LOSS
+            )
+        start = chunk_end
+        chunk_size *= 2
+    return None, None
+
+
+def find_trade_intervals(
+    pnl_config: PnlCalcConfig,
+    roi_helper: ROI_Helper,
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    signals: FirstPassageSignals,
+    start: int = 0,
+    exit_finder: Callable[[int, int, int], tuple[int, Proxy_Trade_Actions]] = None,
+) -> list[TradeInterval]:
+    """Work out the trades of a single position per symbol run from start
+    For each entry, the exit is the first bar where roi, stop loss or the opposite
+    signal fires
+
+    Args:
+        pnl_config (PnlCalcConfig): pnl calculation config
+        roi_helper (ROI_Helper): roi helper built from pnl_config.roi
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        signals (FirstPassageSignals): buy/sell signals
+        start (int, optional): first bar to look for an entry. Defaults to 0.
+        exit_finder (Callable, optional): (direction, entry_index, end) -> (exit bar,
+            close reason) of roi or stop loss. Defaults to find_exit with
+            pnl_config.stoploss and roi_helper.
+
+    Returns:
+        list[TradeInterval]: trades in time order
+    """
+    bar_count: int = len(close_price)
+    trades: list[TradeInterval] = []
+    i: int = start
+    while i < bar_count:
+        # Flat: the next buy signal opens a long, the next sell signal opens a short
+        next_buy: int = signals.next_buy(i)
+        next_sell: int = (
+            signals.next_sell(i) if pnl_config.enable_short_position else None
+        )
+        if next_buy is None and next_sell is None:
+            break
+        if next_sell is None or (next_buy is not None and next_buy < next_sell):
+            trade = TradeInterval(direction=1, entry_index=next_buy)
+        else:
+            trade = TradeInterval(direction=-1, entry_index=next_sell)
+        trades.append(trade)
+
+        # Holding: roi and stop loss are checked before the opposite signal at each bar
+        next_opposite: int = (
+            signals.next_sell(trade.entry_index + 1)
+            if trade.direction == 1
+            else signals.next_buy(trade.entry_index + 1)
+        )
+        exit_end: int = bar_count if next_opposite is None else next_opposite + 1
+        if exit_finder is not None:
+            trade.exit_index, trade.close_reason = exit_finder(
+                trade.direction, trade.entry_index, exit_end
+            )
+        else:
+            trade.exit_index, trade.close_reason = find_exit(
+                direction=trade.direction,
+                entry_index=trade.entry_index,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                roi_helper=roi_helper,
+                stop_loss=pnl_config.stoploss,
+                end=exit_end,
+            )
+        if trade.exit_index is None:
+            if next_opposite is None:
+                break
+            trade.exit_index, trade.close_reason = (
+                next_opposite,
+                Proxy_Trade_Actions.SIGNAL,
+            )
+            i = trade.exit_index + 1
+        else:
+            # The signal at the exit bar is processed after the trade is closed
+            i = trade.exit_index
+    return trades
+
+
+def build_trade_interval_arrays(
+    trades: list[TradeInterval],
+    close_price: np.ndarray,
+    start: int = 0,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Work out the exposure, fee events and flat bars of each bar in [start, bar count)
+    from the trades
+
+    Args:
+        trades (list[TradeInterval]): trades in time order, entered at or after start
+        close_price (np.ndarray): close price
+        start (int, optional): first bar. Defaults to 0.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: exposure = direction / entry price,
+            number of trade actions, True if no position is held after the bar
+    """
+    bar_count: int = len(close_price)
+    exposure: np.ndarray = np.zeros(bar_count - start)
+    fee_count: np.ndarray = np.zeros(bar_count - start)
+    is_flat: np.ndarray = np.ones(bar_count - start, dtype=bool)
+    for trade in trades:
+        entry: int = trade.entry_index - start
+        exit: int = (
+            trade.exit_index - start
+            if trade.exit_index is not None
+            else bar_count - start
+        )
+        exposure[entry + 1 : exit + 1] = (
+            trade.direction / close_price[trade.entry_index]
+        )
+        fee_count[entry] += 1
+        if trade.exit_index is not None:
+            fee_count[exit] += 1
+        is_flat[entry:exit] = False
+    return exposure, fee_count, is_flat
+
+
+def calculate_mtm_from_exposure(
+    exposure: np.ndarray,
+    price_move: np.ndarray,
+    fee_count: np.ndarray,
+    is_flat: np.ndarray,
+    fee_rate: float,
+    laid_back_tax: float,
+) -> np.ndarray:
+    """mtm of each bar = exposure * price diff - fee of the trade actions - laid back
+    tax
+
+    Args:
+        exposure (np.ndarray): direction / entry price of the trade held during each bar
+        price_move (np.ndarray): price diff = price(t) - price(t-1)
+        fee_count (np.ndarray): number of trade actions of each bar
+        is_flat (np.ndarray): True if no position is held after the bar
+        fee_rate (float): fee rate of each trade action
+        laid_back_tax (float): tax of each bar without position
+
+    Returns:
+        np.ndarray: mtm of each bar
+    """
+    mtm: np.ndarray = exposure * price_move
+    # no position, no price move
+    mtm[exposure == 0] = 0
+    return mtm - (fee_count * abs(fee_rate) + is_flat * abs(laid_back_tax))
+
+
+def build_mtm_from_trade_intervals(
+    trades: list[TradeInterval],
+    close_price: np.ndarray,
+    price_move: np.ndarray,
+    fee_rate: float,
+    laid_back_tax: float,
+    start: int = 0,
+) -> np.ndarray:
+    """Build the mtm of each bar in [start, bar count) from the trades
+
+    Args:
+        trades (list[TradeInterval]): trades in time order, entered at or after start
+        close_price (np.ndarray): close price
+        price_move (np.ndarray): price diff = price(t) - price(t-1)
+        fee_rate (float): fee rate of each trade action
+        laid_back_tax (float): tax of each bar without position
+        start (int, optional): first bar. Defaults to 0.
+
+    Returns:
+        np.ndarray: mtm of each bar
+    """
+    exposure, fee_count, is_flat = build_trade_interval_arrays(
+        trades=trades, close_price=close_price, start=start
+    )
+    return calculate_mtm_from_exposure(
+        exposure=exposure,
+        price_move=price_move[start:],
+        fee_count=fee_count,
+        is_flat=is_flat,
+        fee_rate=fee_rate,
+        laid_back_tax=laid_back_tax,
+    )
+
+
+def load_trade_intervals(
+    trade_order_agent: TradeBookKeeperAgent,
+    trades: list[TradeInterval],
+    time_line: Sequence[datetime],
+    close_price: np.ndarray,
+) -> None:
+    """Add the trades to the archives and outstanding positions of the agent
+
+    Args:
+        trade_order_agent (TradeBookKeeperAgent): book keeper agent
+        trades (list[TradeInterval]): trades in time order
+        time_line (Sequence[datetime]): time stamp of each bar
+        close_price (np.ndarray): close price
+    """
+    for trade in trades:
+        is_long: bool = trade.direction == 1
+        proxy_trade: ProxyTrade = ProxyTrade(
+            symbol=trade_order_agent.symbol,
+            entry_datetime=time_line[trade.entry_index],
+            entry_price=close_price[trade.entry_index],
+            inventory_mode=trade_order_agent.inventory_mode,
+            direction=LongShort_Enum.LONG if is_long else LongShort_Enum.SHORT,
+            unit=trade_order_agent.fixed_unit,
+            fee_rate=trade_order_agent.fee_rate_from_pnl_config,
+        )
+        if trade.exit_index is None:
+            (
+                trade_order_agent.outstanding_long_position_list
+                if is_long
+                else trade_order_agent.outstanding_short_position_list
+            ).append(proxy_trade)
+            continue
+        proxy_trade.close_position(
+            exit_price=close_price[trade.exit_index],
+            exit_datetime=time_line[trade.exit_index],
+            close_reason=trade.close_reason,
+        )
+        (
+            trade_order_agent.archive_long_positions_list
+            if is_long
+            else trade_order_agent.archive_short_positions_list
+        ).append(proxy_trade)
+
+
+def run_first_passage(
+    trade_order_agent: TradeBookKeeperAgent,
+    pnl_config: PnlCalcConfig,
+    time_line: Sequence[datetime],
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    price_move: np.ndarray,
+    buy_index: np.ndarray,
+    sell_index: np.ndarray,
+) -> None:
+    """Run a single position per symbol config trade by trade instead of bar by bar
+    The exit of each trade is located by vectorized first passage search over the
+    close price, then the mtm of each bar is built from the trade intervals.
+    The roi period of each bar is worked out from the time stamps in ms.
+
+    Args:
+        trade_order_agent (TradeBookKeeperAgent): fresh book keeper agent
+        pnl_config (PnlCalcConfig): pnl calculation config
+        time_line (Sequence[datetime]): time stamp of each bar
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        price_move (np.ndarray): price diff = price(t) - price(t-1)
+        buy_index (np.ndarray): sorted bar index of buy signals
+        sell_index (np.ndarray): sorted bar index of sell signals, buy wins if both at
+            the same bar
+
+    Raises:
+        UnSupportedException: max_position_per_symbol is not 1
+    """
+    if pnl_config.max_position_per_symbol != 1:
+        raise UnSupportedException(
+            "First passage engine supports max_position_per_symbol=1 only, got "
+            f"{pnl_config.max_position_per_symbol}"
+        )
+    trades: list[TradeInterval] = find_trade_intervals(
+        pnl_config=pnl_config,
+        roi_helper=trade_order_agent.roi_helper,
+        timestamp_ms=timestamp_ms,
+        close_price=close_price,
+        signals=FirstPassageSignals(buy_index=buy_index, sell_index=sell_index),
+    )
+    exposure, fee_count, is_flat = build_trade_interval_arrays(
+        trades=trades, close_price=close_price
+    )
+    trade_order_agent.record_mtm_history_bulk(
+        timestamp_ms=timestamp_ms,
+        mtm=calculate_mtm_from_exposure(
+            exposure=exposure,
+            price_move=price_move,
+            fee_count=fee_count,
+            is_flat=is_flat,
+            fee_rate=pnl_config.fee_rate,
+            laid_back_tax=pnl_config.laid_back_tax,
+        ),
+        fee_event_count=fee_count,
+        is_flat=is_flat,
+    )
+    load_trade_intervals(
+        trade_order_agent=trade_order_agent,
+        trades=trades,
+        time_line=time_line,
+        close_price=close_price,
+    )
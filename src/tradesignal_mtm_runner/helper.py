@@ -1,4 +1,5 @@
 import numpy as np
+from bisect import bisect_right
 from datetime import datetime
 from .data_struct import IndexedList
 import logging
@@ -11,8 +12,54 @@ class ROI_Helper:
         _roi_seconds_list = [k for k in self._roi_dict.keys()]
         self._roi_seconds_list: list[int] = sorted(_roi_seconds_list)
         self.indexed_list = IndexedList(base_list=self._roi_seconds_list)
+        # Lowest take profit pnl in effect once each roi period is reached
+        self._roi_threshold_list: list[float] = np.minimum.accumulate(
+            [self._roi_dict[k] for k in self._roi_seconds_list]
+        ).tolist()
         pass
 
+    def get_take_profit_threshold(self, elapsed_seconds: int) -> float:
+        """Get the lowest take profit pnl in effect after elapsed_seconds
+            calculate cost is O(logR)
+        Args:
+            elapsed_seconds (int): seconds since the entry of the trade
+
+        Returns:
+            float: take profit pnl, inf if no roi is in effect yet
+        """
+        inx: int = bisect_right(self._roi_seconds_list, elapsed_seconds)
+        return self._roi_threshold_list[inx - 1] if inx > 0 else float("inf")
+
+    def get_take_profit_thresholds(self, elapsed_seconds: np.ndarray) -> np.ndarray:
+        """Vectorized get_take_profit_threshold
+
+        Args:
+            elapsed_seconds (np.ndarray): seconds since the entry of the trade
+
+        Returns:
+            np.ndarray: take profit pnl, inf if no roi is in effect yet
+        """
+        inx: np.ndarray = np.searchsorted(
+            self._roi_seconds_list, elapsed_seconds, side="right"
+        )
+        thresholds: np.ndarray = np.append(np.inf, self._roi_threshold_list)
+        return thresholds[inx]
+
+    def get_next_roi_seconds(self, elapsed_seconds: int) -> int:
+        """Get the next roi period after elapsed_seconds
+
+        Args:
+            elapsed_seconds (int): seconds since the entry of the trade
+
+        Returns:
+            int: seconds since the entry when the next roi comes into effect, None if no
+                more
+        """
+        inx: int = bisect_right(self._roi_seconds_list, elapsed_seconds)
+        if inx < len(self._roi_seconds_list):
+            return self._roi_seconds_list[inx]
+        return None
+
     def get_all_take_profit_pnl(
         self, entry_date: datetime, current_date: datetime
     ) -> list[float]:
@@ -1,5 +1,6 @@
-from typing import Protocol
+from typing import Any, Protocol
 from .models import Mtm_Result
+import numpy as np
 import pandas as pd
 
 class ITradeSignalRunner(Protocol):
@@ -22,4 +23,74 @@ class ITradeSignalRunner(Protocol):
         Returns:
             Mtm_Result: [MTM result]
         """
-        pass
\ No newline at end of file
+        pass
+
+    def calculate_arrays(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_signal: np.ndarray,
+        sell_signal: np.ndarray,
+    ) -> Mtm_Result:
+        """
+            calculate Pnl given by the buy and sell signal arrays, without pandas
+
+        Args:
+            symbol (str): [symbol of the asset]
+            timestamp_ms (np.ndarray): [sorted UTC time stamp of each bar in ms]
+            close_price (np.ndarray): [close price of each bar]
+            buy_signal (np.ndarray): [buy signal of each bar]
+            sell_signal (np.ndarray): [sell signal of each bar]
+
+        Returns:
+            Mtm_Result: [MTM result]
+        """
+        pass
+
+    def calculate_events(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_events: np.ndarray,
+        sell_events: np.ndarray,
+        events_by_timestamp: bool = False,
+    ) -> Mtm_Result:
+        """
+            calculate Pnl given by the buy and sell signal events
+
+        Args:
+            symbol (str): [symbol of the asset]
+            timestamp_ms (np.ndarray): [sorted UTC time stamp of each bar in ms]
+            close_price (np.ndarray): [close price of each bar]
+            buy_events (np.ndarray): [bar index of buy signals]
+            sell_events (np.ndarray): [bar index of sell signals]
+            events_by_timestamp (bool, optional): [the events are time stamps of bars in
+                ms]
+
+        Returns:
+            Mtm_Result: [MTM result]
+        """
+        pass
+
+    def calculate_table(
+        self,
+        symbol: str,
+        buy_signal_table: Any,
+        sell_signal_table: Any = None,
+        timestamp_column: str = "timestamp",
+    ) -> Mtm_Result:
+        """
+            calculate Pnl given by an Arrow table or Polars data frame, without pandas
+
+        Args:
+            symbol (str): [symbol of the asset]
+            buy_signal_table (Any): [table with time stamp, close and buy columns]
+            sell_signal_table (Any, optional): [table with time stamp and sell columns]
+            timestamp_column (str, optional): [column of the time stamp]
+
+        Returns:
+            Mtm_Result: [MTM result]
+        """
+        pass
@@ -0,0 +1,465 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterator, Union
+from .config import PnlCalcConfig
+from .helper import ROI_Helper
+from .models import (
+    Mtm_Result,
+    Proxy_Trade_Actions,
+    PROFIT_SLIPPAGE,
+    MIN_NUMERIC_VALUE,
+)
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of bars of signals unpacked at a time
+SIGNAL_BLOCK_SIZE: int = 4096
+
+
+@dataclass
+class ScenarioBatchResult:
+    """Summary of each price scenario of a batch, one item per scenario"""
+
+    pnl: np.ndarray
+    max_drawdown: np.ndarray
+    sharpe_ratio: np.ndarray
+    trades_opened: np.ndarray
+
+
+class LockstepBookKeeper:
+    """Book keeper of many independent books stepped bar by bar together
+    Each book follows the rules of TradeBookKeeperAgent with FIFO inventory,
+    its state is kept in arrays instead of trade objects:
+    - direction of the book: +1 long, -1 short, 0 flat
+    - max_position_per_symbol trade slots with entry price and entry time in ms
+    so each bar costs a fixed number of array operations over all books.
+
+    The books may share the price or the signals of a bar, any per bar input
+    is either a scalar or an array of one value per book.
+
+    Only the summary of each book is kept:
+    pnl, max drawdown, sharpe ratio from running moments, and trade counts.
+    """
+
+    def __init__(
+        self, pnl_config: PnlCalcConfig, book_count: int, roi_helper: ROI_Helper = None
+    ) -> None:
+        """
+        Args:
+            pnl_config (PnlCalcConfig): pnl calculation config
+            book_count (int): number of books
+            roi_helper (ROI_Helper, optional): shared ROI helper built from
+                pnl_config.roi. Defaults to None.
+        """
+        self.book_count: int = book_count
+        self.max_position_per_symbol: int = pnl_config.max_position_per_symbol
+        self.enable_short_position: bool = pnl_config.enable_short_position
+        self.stop_loss: float = abs(pnl_config.stoploss)
+        self.fee_rate: float = abs(pnl_config.fee_rate)
+        self.laid_back_tax: float = abs(pnl_config.laid_back_tax)
+        self.roi_helper: ROI_Helper = (
+            roi_helper if roi_helper is not None else ROI_Helper(pnl_config.roi)
+        )
+
+        shape: tuple[int, int] = (book_count, self.max_position_per_symbol)
+        self.direction: np.ndarray = np.zeros(book_count, dtype=np.int8)
+        self.is_active: np.ndarray = np.zeros(shape, dtype=bool)
+        self.entry_price: np.ndarray = np.ones(shape)
+        self.entry_ms: np.ndarray = np.zeros(shape, dtype=np.int64)
+
+        # running summary of each book
+        self.bar_count: int = 0
+        self.first_timestamp_ms: int = None
+        self.last_timestamp_ms: int = None
+        self.pnl: np.ndarray = np.zeros(book_count)
+        self.peak_pnl: np.ndarray = np.zeros(book_count)
+        self.max_drawdown: np.ndarray = np.zeros(book_count)
+        # Welford running mean and sum of squared deviations of mtm
+        self._mtm_mean: np.ndarray = np.zeros(book_count)
+        self._mtm_m2: np.ndarray = np.zeros(book_count)
+        self.trades_opened: np.ndarray = np.zeros(book_count, dtype=np.int64)
+        self.trades_closed: dict[Proxy_Trade_Actions, np.ndarray] = {
+            reason: np.zeros(book_count, dtype=np.int64)
+            for reason in Proxy_Trade_Actions
+        }
+
+    def _close_fired(
+        self, fired: np.ndarray, close_reason: Proxy_Trade_Actions
+    ) -> np.ndarray:
+        """Close the fired trade slots
+
+        Args:
+            fired (np.ndarray): fired slots of each book
+            close_reason (Proxy_Trade_Actions): close reason
+
+        Returns:
+            np.ndarray: number of trades closed in each book
+        """
+        self.is_active &= ~fired
+        closed: np.ndarray = fired.sum(axis=1)
+        self.trades_closed[close_reason] += closed
+        return closed
+
+    def _close_oldest(self, books: np.ndarray) -> None:
+        """Close the earliest entered trade of the books by signal
+
+        Args:
+            books (np.ndarray): index of the books
+        """
+        if len(books) == 0:
+            return
+        slot: np.ndarray = np.argmin(
+            np.where(
+                self.is_active[books],
+                self.entry_ms[books],
+                np.iinfo(np.int64).max,
+            ),
+            axis=1,
+        )
+        self.is_active[books, slot] = False
+        self.trades_closed[Proxy_Trade_Actions.SIGNAL][books] += 1
+
+    def _open(
+        self,
+        books: np.ndarray,
+        direction: int,
+        price: np.ndarray,
+        timestamp_ms: int,
+    ) -> None:
+        """Open a trade in the first free slot of the books
+
+        Args:
+            books (np.ndarray): index of the books
+            direction (int): +1 long, -1 short
+            price (np.ndarray): price of each book
+            timestamp_ms (int): entry time in ms
+        """
+        if len(books) == 0:
+            return
+        slot: np.ndarray = np.argmin(self.is_active[books], axis=1)
+        self.is_active[books, slot] = True
+        self.entry_price[books, slot] = price[books]
+        self.entry_ms[books, slot] = timestamp_ms
+        self.direction[books] = direction
+        self.trades_opened[books] += 1
+
+    def step(
+        self,
+        timestamp_ms: int,
+        price: Union[float, np.ndarray],
+        price_diff: Union[float, np.ndarray],
+        buy_signal: Union[bool, np.ndarray],
+        sell_signal: Union[bool, np.ndarray],
+    ) -> np.ndarray:
+        """Run all books at a bar, in the same order as
+        TradeBookKeeperAgent.run_at_timestamp
+
+        Args:
+            timestamp_ms (int): time stamp of the bar in ms
+            price (Union[float, np.ndarray]): price of the bar
+            price_diff (Union[float, np.ndarray]): price diff = price(t) - price(t-1)
+            buy_signal (Union[bool, np.ndarray]): buy signal, buy wins if both signals
+                are set
+            sell_signal (Union[bool, np.ndarray]): sell signal
+
+        Returns:
+            np.ndarray: mtm of each book at the bar
+        """
+        price = np.broadcast_to(np.asarray(price, dtype=float), (self.book_count,))
+        price_diff = np.broadcast_to(
+            np.asarray(price_diff, dtype=float), (self.book_count,)
+        )
+        buy_signal = np.broadcast_to(
+            np.asarray(buy_signal, dtype=bool), (self.book_count,)
+        )
+        sell_signal = (
+            np.broadcast_to(np.asarray(sell_signal, dtype=bool), (self.book_count,))
+            & ~buy_signal
+        )
+        fee_count: np.ndarray = np.zeros(self.book_count, dtype=np.int64)
+
+        # 1. mtm from the exposure of the outstanding trades
+        has_position: np.ndarray = self.is_active.any(axis=1)
+        exposure: np.ndarray = self.direction * np.where(
+            self.is_active, 1 / self.entry_price, 0
+        ).sum(axis=1)
+        mtm: np.ndarray = np.zeros(self.book_count)
+        np.multiply(exposure, price_diff, out=mtm, where=has_position)
+
+        # 2. roi and 3. stop loss
+        if has_position.any():
+            book_price: np.ndarray = price[:, None]
+            pnl: np.ndarray = (
+                np.where(
+                    self.direction[:, None] == 1,
+                    book_price - self.entry_price,
+                    self.entry_price - book_price,
+                )
+                / self.entry_price
+            )
+            elapsed_seconds: np.ndarray = (timestamp_ms - self.entry_ms) // 1000
+            fee_count += self._close_fired(
+                self.is_active
+                & (pnl > self.roi_helper.get_take_profit_thresholds(elapsed_seconds)),
+                Proxy_Trade_Actions.ROI,
+            )
+            fee_count += self._close_fired(
+                self.is_active & (pnl < -self.stop_loss),
+                Proxy_Trade_Actions.STOP_LOSS,
+            )
+            self.direction[~self.is_active.any(axis=1)] = 0
+
+        # 4. buy / sell signal closes the earliest opposite trade or opens a new trade
+        position_count: np.ndarray = self.is_active.sum(axis=1)
+        close_short: np.ndarray = buy_signal & (self.direction == -1)
+        open_long: np.ndarray = (
+            buy_signal & ~close_short & (position_count < self.max_position_per_symbol)
+        )
+        close_long: np.ndarray = sell_signal & (self.direction == 1)
+        open_short: np.ndarray = (
+            sell_signal
+            & ~close_long
+            & (position_count < self.max_position_per_symbol)
+            & self.enable_short_position
+        )
+        self._close_oldest(np.flatnonzero(close_short | close_long))
+        self._open(np.flatnonzero(open_long), 1, price, timestamp_ms)
+        self._open(np.flatnonzero(open_short), -1, price, timestamp_ms)
+        fee_count += close_short | close_long | open_long | open_short
+
+        # 5. laid back tax and 6. fee
+        is_flat: np.ndarray = ~self.is_active.any(axis=1)
+        self.direction[is_flat] = 0
+        mtm -= fee_count * self.fee_rate + is_flat * self.laid_back_tax
+
+        self._update_summary(timestamp_ms=timestamp_ms, mtm=mtm)
+        return mtm
+
+    def _update_summary(self, timestamp_ms: int, mtm: np.ndarray) -> None:
+        if self.first_timestamp_ms is None:
+            self.first_timestamp_ms = timestamp_ms
+        self.last_timestamp_ms = timestamp_ms
+        self.bar_count += 1
+
+        self.pnl += mtm
+        np.maximum(self.peak_pnl, self.pnl, out=self.peak_pnl)
+        np.maximum(self.max_drawdown, self.peak_pnl - self.pnl, out=self.max_drawdown)
+
+        delta: np.ndarray = mtm - self._mtm_mean
+        self._mtm_mean += delta / self.bar_count
+        self._mtm_m2 += delta * (mtm - self._mtm_mean)
+
+    def calculate_sharpe_ratio(self) -> np.ndarray:
+        """Sharpe ratio of each book, same as
+        TradeBookKeeperAgent.calculate_sharpe_ratio
+
+        Returns:
+            np.ndarray: sharpe ratio
+        """
+        time_period_hours: float = (
+            (self.last_timestamp_ms - self.first_timestamp_ms) / 1000 / 3600
+        )
+        std_profit: np.ndarray = np.sqrt(self._mtm_m2 / self.bar_count)
+        expected_return: np.ndarray = (
+            self.pnl - self.bar_count * PROFIT_SLIPPAGE
+        ) / time_period_hours
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                std_profit > 0,
+                expected_return / std_profit * np.sqrt(365 * 24),
+                MIN_NUMERIC_VALUE,
+            )
+
+    def get_results(self) -> list[Mtm_Result]:
+        """Summary of each book
+
+        Returns:
+            list[Mtm_Result]: mtm result without timeline and trade archives
+        """
+        sharpe_ratio: np.ndarray = self.calculate_sharpe_ratio()
+        return [
+            Mtm_Result(
+                pnl=self.pnl[i],
+                max_drawdown=self.max_drawdown[i],
+                sharpe_ratio=sharpe_ratio[i],
+                mkt_start_epoch=self.first_timestamp_ms,
+                mkt_end_epoch=self.last_timestamp_ms,
+                bar_count=self.bar_count,
+                trades_opened=self.trades_opened[i],
+                trades_closed_by_reason={
+                    reason.value: int(count[i])
+                    for reason, count in self.trades_closed.items()
+                },
+            )
+            for i in range(self.book_count)
+        ]
+
+
+def pack_signal_matrix(signal: np.ndarray) -> np.ndarray:
+    """Pack a signal matrix (variants x bars) into 1 bit per bar
+
+    Args:
+        signal (np.ndarray): signal matrix, 1 for a signal, nan and other values are not
+
+    Returns:
+        np.ndarray: uint8 matrix (variants x ceil(bars / 8))
+    """
+    return np.packbits(np.asarray(signal) == 1, axis=1)
+
+
+def _iterate_signal_blocks(
+    signal: np.ndarray, bar_count: int, packed: bool, block_size: int
+) -> Iterator[np.ndarray]:
+    """Iterate the signal matrix in blocks of bars
+
+    Args:
+        signal (np.ndarray): signal matrix (variants x bars), or packed by
+            pack_signal_matrix
+        bar_count (int): number of bars
+        packed (bool): the signal matrix is packed
+        block_size (int): number of bars of a block, multiple of 8
+
+    Yields:
+        Iterator[np.ndarray]: bool matrix (bars of the block x variants)
+    """
+    for start in range(0, bar_count, block_size):
+        end: int = min(bar_count, start + block_size)
+        if packed:
+            block: np.ndarray = np.unpackbits(
+                signal[:, start // 8 : (end + 7) // 8], axis=1, count=end - start
+            ).astype(bool)
+        else:
+            # the same rule as Trade_Mtm_Runner.calculate
+            block: np.ndarray = signal[:, start:end] == 1
+        yield np.ascontiguousarray(block.T)
+
+
+def run_signal_matrix(
+    pnl_config: PnlCalcConfig,
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    buy_signal: np.ndarray,
+    sell_signal: np.ndarray,
+    packed: bool = False,
+    roi_helper: ROI_Helper = None,
+    block_size: int = SIGNAL_BLOCK_SIZE,
+) -> list[Mtm_Result]:
+    """Evaluate many signal variants against one price series in lockstep
+
+    Args:
+        pnl_config (PnlCalcConfig): pnl calculation config
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        buy_signal (np.ndarray): buy signal matrix (variants x bars), int8/bool or
+            packed
+        sell_signal (np.ndarray): sell signal matrix (variants x bars), int8/bool or
+            packed
+        packed (bool, optional): signal matrices are packed by pack_signal_matrix.
+            Defaults to False.
+        roi_helper (ROI_Helper, optional): shared ROI helper. Defaults to None.
+        block_size (int, optional): number of bars of signals unpacked at a time.
+            Defaults to SIGNAL_BLOCK_SIZE.
+
+    Raises:
+        ValueError: the signal matrices do not match the bars, or block_size is not
+            a positive multiple of 8
+
+    Returns:
+        list[Mtm_Result]: summary of each variant
+    """
+    bar_count: int = len(close_price)
+    if buy_signal.shape != sell_signal.shape or buy_signal.shape[1] != (
+        (bar_count + 7) // 8 if packed else bar_count
+    ):
+        raise ValueError(
+            f"signal matrices {buy_signal.shape} {sell_signal.shape} of {bar_count} "
+            "bars"
+        )
+    if block_size <= 0 or block_size % 8 != 0:
+        raise ValueError(f"block size should be a positive multiple of 8: {block_size}")
+    price_move: np.ndarray = np.append(np.nan, np.diff(close_price))
+    book_keeper: LockstepBookKeeper = LockstepBookKeeper(
+        pnl_config=pnl_config, book_count=buy_signal.shape[0], roi_helper=roi_helper
+    )
+    for block_start, (buy_block, sell_block) in zip(
+        range(0, bar_count, block_size),
+        zip(
+            _iterate_signal_blocks(buy_signal, bar_count, packed, block_size),
+            _iterate_signal_blocks(sell_signal, bar_count, packed, block_size),
+        ),
+    ):
+        for k in range(len(buy_block)):
+            i: int = block_start + k
+            book_keeper.step(
+                timestamp_ms=timestamp_ms[i],
+                price=close_price[i],
+                price_diff=price_move[i],
+                buy_signal=buy_block[k],
+                sell_signal=sell_block[k],
+            )
+    return book_keeper.get_results()
+
+
+def run_price_scenarios(
+    pnl_config: PnlCalcConfig,
+    timestamp_ms: np.ndarray,
+    price_matrix: np.ndarray,
+    buy_signal: np.ndarray,
+    sell_signal: np.ndarray,
+    roi_helper: ROI_Helper = None,
+) -> ScenarioBatchResult:
+    """Evaluate the same signals against many price scenarios in lockstep
+
+    Args:
+        pnl_config (PnlCalcConfig): pnl calculation config
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        price_matrix (np.ndarray): close price (scenarios x bars)
+        buy_signal (np.ndarray): buy signal of each bar of all scenarios, 1 to buy
+        sell_signal (np.ndarray): sell signal of each bar of all scenarios, 1 to sell
+        roi_helper (ROI_Helper, optional): shared ROI helper. Defaults to None.
+
+    Raises:
+        ValueError: the price matrix is not scenarios x bars of the signals
+
+    Returns:
+        ScenarioBatchResult: pnl, max drawdown, sharpe ratio and trades opened of each
+            scenario
+    """
+    price_matrix = np.asarray(price_matrix, dtype=float)
+    if price_matrix.ndim != 2:
+        raise ValueError("price matrix should be scenarios x bars")
+    if not (
+        price_matrix.shape[1]
+        == len(buy_signal)
+        == len(sell_signal)
+        == len(timestamp_ms)
+    ):
+        raise ValueError("bar count mismatch")
+    # bars x scenarios for contiguous access of each bar
+    price_by_bar: np.ndarray = np.ascontiguousarray(price_matrix.T)
+    price_move: np.ndarray = np.vstack(
+        [np.full((1, price_matrix.shape[0]), np.nan), np.diff(price_by_bar, axis=0)]
+    )
+    # the same rule as Trade_Mtm_Runner.calculate, nan and other values are no signal
+    buy_signal = np.asarray(buy_signal) == 1
+    sell_signal = np.asarray(sell_signal) == 1
+
+    book_keeper: LockstepBookKeeper = LockstepBookKeeper(
+        pnl_config=pnl_config, book_count=price_matrix.shape[0], roi_helper=roi_helper
+    )
+    for i in range(price_matrix.shape[1]):
+        book_keeper.step(
+            timestamp_ms=timestamp_ms[i],
+            price=price_by_bar[i],
+            price_diff=price_move[i],
+            buy_signal=buy_signal[i],
+            sell_signal=sell_signal[i],
+        )
+    return ScenarioBatchResult(
+        pnl=book_keeper.pnl,
+        max_drawdown=book_keeper.max_drawdown,
+        sharpe_ratio=book_keeper.calculate_sharpe_ratio(),
+        trades_opened=book_keeper.trades_opened,
+    )
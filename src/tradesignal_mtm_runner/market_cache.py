@@ -0,0 +1,215 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Sequence
+import hashlib
+import logging
+import sys
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default size of the cache of each process
+DEFAULT_MAX_BYTES: int = 512 * 1024 * 1024
+# Size of a datetime object of a time line of python objects
+DATETIME_OBJECT_BYTES: int = sys.getsizeof(datetime(2000, 1, 1))
+
+
+@dataclass
+class PreparedMarket:
+    """Arrays derived from the market data of a symbol, shared by the runs on it"""
+
+    time_line: Sequence[datetime]
+    timestamp_ms: np.ndarray
+    close_price: np.ndarray
+    price_move: np.ndarray  # price(t) - price(t-1), nan at the first bar
+    bar_period_ms: int  # median time between bars, 0 with less than two bars
+
+    @property
+    def nbytes(self) -> int:
+        time_line_bytes: int = getattr(self.time_line, "nbytes", 0)
+        if getattr(self.time_line, "dtype", None) == object:
+            time_line_bytes += len(self.time_line) * DATETIME_OBJECT_BYTES
+        return (
+            time_line_bytes
+            + self.timestamp_ms.nbytes
+            + self.close_price.nbytes
+            + self.price_move.nbytes
+        )
+
+    def freeze(
+        self, timestamp_owned: bool = False, close_owned: bool = False
+    ) -> PreparedMarket:
+        """Read only arrays to share, the time stamps and close prices writable by their
+        owner are copied so that the cached values cannot change under their key.
+        The price movement is owned by the prepared market and is not copied.
+        Frozen arrays are not copied again.
+
+        Args:
+            timestamp_owned (bool, optional): the time stamps are not referenced by the
+                caller and are made read only without copy. Defaults to False.
+            close_owned (bool, optional): the close prices are not referenced by the
+                caller and are made read only without copy. Defaults to False.
+
+        Returns:
+            PreparedMarket: prepared market of read only arrays
+        """
+        return PreparedMarket(
+            time_line=self.time_line,
+            timestamp_ms=_read_only(self.timestamp_ms, owned=timestamp_owned),
+            close_price=_read_only(self.close_price, owned=close_owned),
+            price_move=_read_only(self.price_move, owned=True),
+            bar_period_ms=self.bar_period_ms,
+        )
+
+
+def calculate_price_movement(close_price: np.ndarray) -> np.ndarray:
+    """price diff = price(t) - price(t-1), nan at the first bar
+
+    Args:
+        close_price (np.ndarray): close price of each bar
+
+    Returns:
+        np.ndarray: price movement of each bar
+    """
+    price_move: np.ndarray = np.empty_like(close_price)
+    price_move[:1] = np.nan
+    np.subtract(close_price[1:], close_price[:-1], out=price_move[1:])
+    return price_move
+
+
+def _read_only(values: np.ndarray, owned: bool = False) -> np.ndarray:
+    if values.flags.writeable:
+        if not owned:
+            values = values.copy()
+        values.flags.writeable = False
+    return values
+
+
+def prepare_market(
+    time_line: Sequence[datetime], timestamp_ms: np.ndarray, close_price: np.ndarray
+) -> PreparedMarket:
+    """Work out the arrays derived from the market data of a symbol
+
+    Args:
+        time_line (Sequence[datetime]): time stamp of each bar
+        timestamp_ms (np.ndarray): int64 time stamp of each bar in ms
+        close_price (np.ndarray): close price of each bar
+
+    Returns:
+        PreparedMarket: arrays of the market data, the inputs are not copied
+    """
+    return PreparedMarket(
+        time_line=time_line,
+        timestamp_ms=timestamp_ms,
+        close_price=close_price,
+        price_move=calculate_price_movement(close_price),
+        bar_period_ms=(
+            int(np.median(np.diff(timestamp_ms))) if len(timestamp_ms) > 1 else 0
+        ),
+    )
+
+
+def market_data_version(timestamp_ms: np.ndarray, close_price: np.ndarray) -> str:
+    """Hash of the market data, the version of the data of a symbol
+
+    Args:
+        timestamp_ms (np.ndarray): int64 time stamp of each bar in ms
+        close_price (np.ndarray): close price of each bar
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for values in (timestamp_ms, close_price):
+        values = np.ascontiguousarray(values)
+        digest.update(f"{values.dtype.str}{values.shape}".encode())
+        digest.update(memoryview(values).cast("B"))
+    return digest.hexdigest()
+
+
+class MarketArrayCache:
+    """Per process LRU cache of the arrays prepared from the market data of a symbol
+    The entries are keyed by symbol, data version, dtype and type of the time line,
+    and the least recently used entries are evicted once the arrays exceed max_bytes.
+    The cached arrays are read only.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """
+        Args:
+            max_bytes (int, optional): max bytes of the cached arrays.
+                Defaults to DEFAULT_MAX_BYTES.
+
+        Raises:
+            ValueError: max_bytes is not > 0
+        """
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes should be > 0: {max_bytes}")
+        self.max_bytes: int = max_bytes
+        self.current_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[tuple, PreparedMarket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_prepare(
+        self,
+        symbol: str,
+        data_version: str,
+        prepare: Callable[[], PreparedMarket],
+        dtype: type = np.float64,
+        time_line_type: str = None,
+    ) -> PreparedMarket:
+        """Get the prepared arrays of the market data, prepare and cache them if missing
+
+        Args:
+            symbol (str): symbol of the asset
+            data_version (str): version of the market data, e.g. market_data_version
+            prepare (Callable[[], PreparedMarket]): prepare the arrays on a cache miss,
+                the writable arrays it returns are copied, see PreparedMarket.freeze
+            dtype (type, optional): dtype of the prices. Defaults to np.float64.
+            time_line_type (str, optional): type and dtype of the time line, e.g. the
+                time zone of a pandas index, time lines of other types are not shared.
+                Defaults to None.
+
+        Returns:
+            PreparedMarket: prepared read only arrays
+        """
+        key: tuple = (symbol, data_version, np.dtype(dtype).str, time_line_type)
+        with self._lock:
+            prepared_market: PreparedMarket = self._entries.get(key)
+            if prepared_market is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prepared_market
+            self.misses += 1
+
+        prepared_market = prepare().freeze()
+        nbytes: int = prepared_market.nbytes
+        if nbytes > self.max_bytes:
+            logger.debug(f"{symbol}: {nbytes} bytes of market arrays not cached")
+            return prepared_market
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = prepared_market
+                self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+        return prepared_market
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+# Cache shared by the runners of this process
+PROCESS_MARKET_CACHE: MarketArrayCache = MarketArrayCache()
@@ -0,0 +1,200 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from .data_struct import SortedIndex
+import numpy as np
+import pandas as pd
+import logging
+import os
+import shutil
+import time
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FILE_NAME: str = "timestamp_ms.npy"
+CLOSE_PRICE_FILE_NAME: str = "close.npy"
+# link to the version folder of the current data of a symbol
+CURRENT_LINK_NAME: str = "current"
+VERSION_FOLDER_PREFIX: str = "v"
+
+
+@dataclass
+class MarketSeries:
+    """Time stamp and close price of a symbol, views of the memory mapped files"""
+
+    symbol: str
+    timestamp_ms: np.ndarray
+    close_price: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp_ms)
+
+
+class MarketDataStore:
+    """Local store of the time stamp and close price of each symbol in .npy files
+    The files are memory mapped read only: a symbol is opened without reading it,
+    slices are views of the map and the page cache is shared by every process
+    reading the same symbol.
+
+    Layout: <root_folder>/<quoted symbol>/current/timestamp_ms.npy (sorted int64 ms)
+    and close.npy,
+    current is a symbolic link to the version folder of the latest write.
+    The symbol is percent-encoded in the folder name, e.g. BTC%2FUSDT for BTC/USDT.
+    """
+
+    def __init__(self, root_folder: str) -> None:
+        """
+        Args:
+            root_folder (str): folder of the store
+        """
+        self.root_folder: str = root_folder
+        # memory maps and time index of the opened symbols
+        self._opened: dict[str, tuple[MarketSeries, SortedIndex]] = {}
+
+    def _symbol_folder(self, symbol: str) -> str:
+        if symbol in ("", ".", ".."):
+            raise ValueError(f"invalid symbol {symbol!r}")
+        return os.path.join(self.root_folder, urllib.parse.quote(symbol, safe=""))
+
+    def symbols(self) -> list[str]:
+        """symbols in the store
+
+        Returns:
+            list[str]: sorted symbols
+        """
+        if not os.path.isdir(self.root_folder):
+            return []
+        return sorted(
+            urllib.parse.unquote(s)
+            for s in os.listdir(self.root_folder)
+            if os.path.isfile(
+                os.path.join(
+                    self.root_folder, s, CURRENT_LINK_NAME, TIMESTAMP_FILE_NAME
+                )
+            )
+        )
+
+    def write(
+        self, symbol: str, timestamp_ms: np.ndarray, close_price: np.ndarray
+    ) -> None:
+        """Write the market data of a symbol, replacing the existing data
+        Both files are written to a new version folder and the current link is switched
+        to it by one atomic rename, readers see either the old or the new data.
+        The previous version is kept for the readers still opening it, older ones are
+        removed.
+
+        Args:
+            symbol (str): symbol of the asset
+            timestamp_ms (np.ndarray): strictly increasing UTC time stamp of each bar in
+                ms
+            close_price (np.ndarray): close price of each bar, float32 is kept, others
+                are float64
+
+        Raises:
+            ValueError: the symbol is empty, "." or "..", the arrays have different
+                lengths or the time stamps are not strictly increasing
+        """
+        timestamp_ms = np.asarray(timestamp_ms, dtype=np.int64)
+        close_price = np.asarray(close_price)
+        if close_price.dtype != np.float32:
+            close_price = close_price.astype(np.float64, copy=False)
+        if len(timestamp_ms) != len(close_price):
+            raise ValueError("arrays should have the same length")
+        if np.any(np.diff(timestamp_ms) <= 0):
+            raise ValueError("time stamps should be strictly increasing")
+
+        folder: str = self._symbol_folder(symbol)
+        version: str = f"{VERSION_FOLDER_PREFIX}{time.time_ns()}.{os.getpid()}"
+        os.makedirs(os.path.join(folder, version))
+        for file_name, values in (
+            (CLOSE_PRICE_FILE_NAME, close_price),
+            (TIMESTAMP_FILE_NAME, timestamp_ms),
+        ):
+            np.save(os.path.join(folder, version, file_name), values)
+
+        current_link: str = os.path.join(folder, CURRENT_LINK_NAME)
+        previous_version: str = (
+            os.readlink(current_link) if os.path.islink(current_link) else None
+        )
+        temp_link: str = os.path.join(folder, f".{CURRENT_LINK_NAME}.{os.getpid()}.tmp")
+        os.symlink(version, temp_link)
+        os.replace(temp_link, current_link)
+        for old_version in os.listdir(folder):
+            if old_version.startswith(VERSION_FOLDER_PREFIX) and old_version not in (
+                version,
+                previous_version,
+            ):
+                shutil.rmtree(os.path.join(folder, old_version), ignore_errors=True)
+        self._opened.pop(symbol, None)
+        logger.debug(f"{symbol}: wrote {len(timestamp_ms)} bars")
+
+    def write_dataframe(self, symbol: str, price_dataframe: pd.DataFrame) -> None:
+        """Write the "close" column of a data frame with timestamp index
+
+        Args:
+            symbol (str): symbol of the asset
+            price_dataframe (pd.DataFrame): market data with "close" column and
+                timestamp index
+        """
+        self.write(
+            symbol=symbol,
+            timestamp_ms=np.asarray(
+                pd.to_numeric(price_dataframe.index), dtype=np.int64
+            )
+            // 1_000_000,
+            close_price=price_dataframe["close"].to_numpy(),
+        )
+
+    def _open(self, symbol: str) -> tuple[MarketSeries, SortedIndex]:
+        opened = self._opened.get(symbol)
+        if opened is None:
+            # resolve the link once so that both files are of the same version
+            folder: str = os.path.realpath(
+                os.path.join(self._symbol_folder(symbol), CURRENT_LINK_NAME)
+            )
+            market_series = MarketSeries(
+                symbol=symbol,
+                timestamp_ms=np.load(
+                    os.path.join(folder, TIMESTAMP_FILE_NAME), mmap_mode="r"
+                ),
+                close_price=np.load(
+                    os.path.join(folder, CLOSE_PRICE_FILE_NAME), mmap_mode="r"
+                ),
+            )
+            if len(market_series.timestamp_ms) != len(market_series.close_price):
+                raise ValueError(
+                    f"{symbol}: time stamps and close prices of different length"
+                )
+            opened = (market_series, SortedIndex(market_series.timestamp_ms))
+            self._opened[symbol] = opened
+        return opened
+
+    def load(
+        self, symbol: str, start_ms: int = None, end_ms: int = None
+    ) -> MarketSeries:
+        """Bars of a symbol in [start_ms, end_ms], found by binary search on the time
+        stamps
+        The arrays are read only views of the memory maps, nothing is read or copied
+        until the values are used.
+
+        Args:
+            symbol (str): symbol of the asset
+            start_ms (int, optional): first time stamp in ms. Defaults to None, the
+                first bar.
+            end_ms (int, optional): last time stamp in ms. Defaults to None, the last
+                bar.
+
+        Raises:
+            FileNotFoundError: the symbol is not in the store
+            ValueError: the symbol is empty, "." or "..", or its files differ in length
+
+        Returns:
+            MarketSeries: bars in the range
+        """
+        market_series, time_index = self._open(symbol)
+        bars: slice = time_index.range_slice(start_ms, end_ms)
+        return MarketSeries(
+            symbol=symbol,
+            timestamp_ms=market_series.timestamp_ms[bars],
+            close_price=market_series.close_price[bars],
+        )
@@ -0,0 +1,177 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from .models import ProxyTrade, PROFIT_SLIPPAGE, MIN_NUMERIC_VALUE
+from .utility import calculate_sharpe_ratio
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOUR_MS: int = 3600 * 1000
+DAY_MS: int = 24 * HOUR_MS
+YEAR_MS: int = 365 * DAY_MS
+
+
+@dataclass
+class PerformanceMetrics:
+    """Performance metrics of a run
+    Ratios are annualized, durations are in ms
+    """
+
+    pnl: float
+    max_drawdown: float
+    sharpe_ratio: float
+    sortino_ratio: float
+    calmar_ratio: float
+    max_drawdown_duration_ms: int
+    max_drawdown_duration_bars: int
+    profit_factor: float
+    win_rate: float
+    exposure_time: float  # ratio of bars holding a position
+    average_holding_ms: float
+    trade_count: int  # closed trades
+    underwater: np.ndarray  # cumulative pnl - running peak of each bar, <= 0
+    period_ms: int = None  # ratios from returns of this period, None for bar returns
+
+
+def resample_by_period(
+    timestamp_ms: np.ndarray, value: np.ndarray, period_ms: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Sum the values of each period by integer bucketing of sorted time stamps
+    Periods without any bar are skipped
+
+    Args:
+        timestamp_ms (np.ndarray): sorted time stamp of each value in ms
+        value (np.ndarray): value of each time stamp
+        period_ms (int): period length in ms, e.g. HOUR_MS, DAY_MS
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: start of each period in ms, sum of each period
+    """
+    bucket: np.ndarray = np.asarray(timestamp_ms, dtype=np.int64) // period_ms
+    first_index: np.ndarray = np.flatnonzero(
+        np.concatenate(([True], bucket[1:] != bucket[:-1]))
+    )
+    return bucket[first_index] * period_ms, np.add.reduceat(value, first_index)
+
+
+def calculate_performance_metrics(
+    timestamp_ms: np.ndarray,
+    mtm: np.ndarray,
+    trades: list[ProxyTrade] = (),
+    is_flat: np.ndarray = None,
+    period_ms: int = None,
+) -> PerformanceMetrics:
+    """Calculate the performance metrics of a run in one vectorized pass
+    over the mtm series and the closed trades
+
+    With period_ms, the ratios are calculated from the pnl of each period,
+    annualized by the number of periods in a year.
+    Otherwise the sharpe ratio is the same as
+    TradeBookKeeperAgent.calculate_sharpe_ratio, and the sortino ratio is annualized
+    the same way.
+
+    Args:
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        mtm (np.ndarray): mtm of each bar
+        trades (list[ProxyTrade], optional): trades of the run, open trades are ignored.
+            Defaults to ().
+        is_flat (np.ndarray, optional): bars without position, e.g.
+            TradeBookKeeperAgent.flat_history. Defaults to None.
+        period_ms (int, optional): period to resample the mtm, e.g. HOUR_MS, DAY_MS.
+            Defaults to None.
+
+    Returns:
+        PerformanceMetrics: performance metrics
+    """
+    timestamp_ms = np.asarray(timestamp_ms, dtype=np.int64)
+    mtm = np.asarray(mtm, dtype=float)
+
+    # Drawdown: the running peak starts at zero pnl
+    pnl_cumulative: np.ndarray = np.cumsum(mtm)
+    running_peak: np.ndarray = np.maximum.accumulate(np.maximum(pnl_cumulative, 0))
+    underwater: np.ndarray = pnl_cumulative - running_peak
+    max_drawdown: float = max(0, float(-underwater.min())) if len(mtm) > 0 else 0
+    # underwater stretches are measured from the last bar at the peak, or the first bar
+    last_peak_index: np.ndarray = np.maximum.accumulate(
+        np.where(underwater >= 0, np.arange(len(mtm)), 0)
+    )
+    drawdown_bars: np.ndarray = np.where(
+        underwater < 0, np.arange(len(mtm)) - last_peak_index, 0
+    )
+    drawdown_ms: np.ndarray = np.where(
+        underwater < 0, timestamp_ms - timestamp_ms[last_peak_index], 0
+    )
+
+    # Ratios
+    pnl: float = float(mtm.sum())
+    span_ms: int = int(timestamp_ms[-1] - timestamp_ms[0]) if len(mtm) > 0 else 0
+    if period_ms is None:
+        sharpe_ratio: float = calculate_sharpe_ratio(
+            timestamp_ms=timestamp_ms, mtm=mtm, profit_slippage=PROFIT_SLIPPAGE
+        )
+        profit: np.ndarray = mtm - PROFIT_SLIPPAGE
+        downside: float = np.sqrt(np.mean(np.minimum(profit, 0) ** 2))
+        sortino_ratio: float = (
+            profit.sum() / (span_ms / HOUR_MS) / downside * np.sqrt(YEAR_MS / HOUR_MS)
+            if downside > 0
+            else MIN_NUMERIC_VALUE
+        )
+    else:
+        _, period_pnl = resample_by_period(timestamp_ms, mtm, period_ms)
+        profit: np.ndarray = period_pnl - PROFIT_SLIPPAGE
+        annualization: float = np.sqrt(YEAR_MS / period_ms)
+        std_profit: float = profit.std()
+        downside: float = np.sqrt(np.mean(np.minimum(profit, 0) ** 2))
+        sharpe_ratio: float = (
+            profit.mean() / std_profit * annualization
+            if std_profit > 0
+            else MIN_NUMERIC_VALUE
+        )
+        sortino_ratio: float = (
+            profit.mean() / downside * annualization
+            if downside > 0
+            else MIN_NUMERIC_VALUE
+        )
+    calmar_ratio: float = (
+        pnl / (span_ms / YEAR_MS) / max_drawdown
+        if max_drawdown > 0 and span_ms > 0
+        else MIN_NUMERIC_VALUE
+    )
+
+    # Trades
+    closed_trades: list[ProxyTrade] = [t for t in trades if t.is_closed]
+    trade_pnl: np.ndarray = np.array([t.pnl_normalized for t in closed_trades])
+    holding_ms: np.ndarray = np.array(
+        [
+            (t.exit_datetime - t.entry_datetime).total_seconds() * 1000
+            for t in closed_trades
+        ]
+    )
+    gross_profit: float = float(trade_pnl[trade_pnl > 0].sum())
+    gross_loss: float = float(-trade_pnl[trade_pnl < 0].sum())
+
+    return PerformanceMetrics(
+        pnl=pnl,
+        max_drawdown=max_drawdown,
+        sharpe_ratio=float(sharpe_ratio),
+        sortino_ratio=float(sortino_ratio),
+        calmar_ratio=float(calmar_ratio),
+        max_drawdown_duration_ms=int(drawdown_ms.max()) if len(mtm) > 0 else 0,
+        max_drawdown_duration_bars=int(drawdown_bars.max()) if len(mtm) > 0 else 0,
+        profit_factor=(gross_profit / gross_loss if gross_loss > 0 else float("inf")),
+        win_rate=(
+            float(np.mean(trade_pnl > 0)) if len(trade_pnl) > 0 else float("nan")
+        ),
+        exposure_time=(
+            float(1 - np.mean(is_flat))
+            if is_flat is not None and len(is_flat) > 0
+            else float("nan")
+        ),
+        average_holding_ms=(
+            float(holding_ms.mean()) if len(holding_ms) > 0 else float("nan")
+        ),
+        trade_count=len(closed_trades),
+        underwater=underwater,
+        period_ms=period_ms,
+    )
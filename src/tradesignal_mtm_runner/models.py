@@ -14,6 +14,7 @@ logger = logging.getLogger(__name__)
 
 MAX_NUMERIC_VALUE: float = 1e50
 MIN_NUMERIC_VALUE: float = -1e50
+PROFIT_SLIPPAGE: float = 0.000001  # deducted from each mtm in the sharpe ratio
 
 
 class LongShort_Enum(str, Enum):
@@ -33,6 +34,20 @@ class Proxy_Trade_Actions(str, Enum):
     ROI = "ROI"
 
 
+class Engine_Mode(str, Enum):
+    BAR = "B"  # run the book keeper agent on each bar
+    EVENT = "E"  # run the book keeper agent on signal and trigger bars only
+    FIRST_PASSAGE = "F"  # locate the exit of each trade, max_position_per_symbol=1 only
+    CHUNKED = "C"  # simulate chunks of the bars in parallel processes and stitch them
+
+
+class Agent_Retention_Policy(str, Enum):
+    KEEP_ALL = "A"
+    KEEP_NONE = "N"
+    KEEP_LAST_N = "L"
+    WEAK_REFERENCE = "W"
+
+
 class Inventory_Mode(str, Enum):
     LIFO = "L"
     FIFO = "F"
@@ -52,6 +67,9 @@ class ProxyTrade(BaseModel):
     # mtm_history: list[float] = Field(default_factory=list)
     inventory_mode: Inventory_Mode = Field(default=Inventory_Mode.WORST_PRICE)
     fee_rate: float = Field(default=0.01)
+    # worst and best normalized pnl of the close price during the trade
+    max_adverse_excursion: float = Field(default=None)
+    max_favorable_excursion: float = Field(default=None)
 
     @property
     def check_closed(self) -> bool:
@@ -200,6 +218,72 @@ class ProxyTrade(BaseModel):
     #     return not self.__lt__(other=other)
 
 
+class Memory_Report(BaseModel):
+    """Estimated bytes held by the book keeper agents retained in a runner"""
+
+    agent_count: int = 0
+    agent_bytes: int = 0  # agent objects and helpers, excluding the items below
+    timeline_bytes: int = 0  # mtm history
+    trade_archive_bytes: int = 0  # closed trades
+    outstanding_trade_bytes: int = 0  # live trades
+    symbol_bytes: dict[str, int] = Field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return (
+            self.agent_bytes
+            + self.timeline_bytes
+            + self.trade_archive_bytes
+            + self.outstanding_trade_bytes
+        )
+
+
+class Sweep_Result(BaseModel):
+    """Summary of one stop loss and roi table combination of a parameter sweep"""
+
+    stoploss: float
+    roi: dict[int, float]
+    pnl: float = np.nan
+    max_drawdown: float = np.nan
+    sharpe_ratio: float = np.nan
+    trades_opened: int = 0
+
+
+class Fee_Sweep_Result(BaseModel):
+    """Summary of one fee rate and laid back tax combination of a fee sweep"""
+
+    fee_rate: float
+    laid_back_tax: float
+    pnl: float = np.nan
+    max_drawdown: float = np.nan
+    sharpe_ratio: float = np.nan
+
+
+class Agent_Snapshot(BaseModel):
+    """State of a book keeper agent at the last bar of a run to resume the run with
+    new bars
+    Only the outstanding trades and the running summary are kept, not the mtm history
+    """
+
+    symbol: str
+    first_timestamp_ms: int
+    last_timestamp_ms: int
+    last_close_price: float
+    bar_count: int = 0
+
+    # Running summary of the mtm history
+    pnl: float = 0
+    peak_pnl: float = 0  # running peak of the cumulative pnl, starts at zero
+    max_drawdown: float = 0
+    mtm_mean: float = 0
+    mtm_m2: float = 0  # sum of squared deviations of the mtm from mtm_mean
+
+    trades_opened: int = 0
+    trades_closed_by_reason: dict[str, int] = Field(default_factory=dict)
+    long_trades_outstanding: list[ProxyTrade] = Field(default_factory=list)
+    short_trades_outstanding: list[ProxyTrade] = Field(default_factory=list)
+
+
 class Mtm_Result(BaseModel):
     """Class containing Mtm Result"""
 
@@ -217,6 +301,13 @@ class Mtm_Result(BaseModel):
     run_start_epoch: int = 0
     run_end_epoch: int = 0
 
+    # Run diagnostics
+    bar_count: int = 0
+    bars_per_second: float = np.nan
+    trades_opened: int = 0
+    trades_closed_by_reason: dict[str, int] = Field(default_factory=dict)
+    peak_memory_bytes: int = None  # only populated when tracemalloc tracing is enabled
+
     params: dict = Field(default_factory=dict)  # Strategy parameters
     pnl_timeline: dict = Field(default_factory=dict)  # Dict column form of pandas frame
     long_trades_archive: list[ProxyTrade] = Field(default_factory=list)
@@ -231,6 +322,10 @@ class Mtm_Result(BaseModel):
         pdict["short_trades_archive_size"] = len(self.short_trades_archive)
         pdict["long_trades_outstanding_size"] = len(self.long_trades_outstanding)
         pdict["short_trades_outstanding_size"] = len(self.short_trades_oustanding)
+        for reason in Proxy_Trade_Actions:
+            pdict[f"trades_closed_{reason.value.lower()}"] = (
+                self.trades_closed_by_reason.get(reason.value, 0)
+            )
         return pdict
 
     def to_query_dict(self) -> Dict:
@@ -250,6 +345,13 @@ class Mtm_Result(BaseModel):
             "short_trades_archive_size",
             "long_trades_outstanding_size",
             "short_trades_outstanding_size",
+            "bar_count",
+            "bars_per_second",
+            "trades_opened",
+            "trades_closed_signal",
+            "trades_closed_stop_loss",
+            "trades_closed_roi",
+            "peak_memory_bytes",
         ]
         _d = self.to_Dict()
         return {k: _d[k] for k in fields_queryable}
@@ -262,6 +364,8 @@ class Mtm_Result(BaseModel):
             """JSON serializer for objects not serializable by default json code"""
             if isinstance(obj, (datetime)):
                 return obj.isoformat()
+            if isinstance(obj, np.ndarray):
+                return obj.tolist()
 
         pdict: Dict = self.to_Dict()
         return json.dumps(pdict, default=_json_serial)
@@ -0,0 +1,350 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from typing import Iterable
+from .models import ProxyTrade, LongShort_Enum
+from .helper import ROI_Helper
+import heapq
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Relative tolerance to pick candidates from the trigger price heaps,
+# candidates are confirmed with the exact pnl comparison
+TRIGGER_PRICE_TOLERANCE: float = 1e-9
+
+
+class PositionList(list):
+    """List of outstanding trades keeping the aggregated exposure of its trades
+    exposure = sum(direction / entry price) over all trades in the list
+    so that the normalized mtm of all trades at time t is exposure * (p(t) - p(t-1))
+
+    The exposure is updated whenever the list is modified.
+    Adding or removing a trade updates the exposure in O(1), on top of the O(N) shift
+    of list.remove, only removing the latest entered trade rescans the entry datetimes.
+
+    With enable_trigger_index, trades are also indexed by the price firing their
+    stop loss and their roi in effect, with s = +1 for long and -1 for short trade:
+    - stop loss fires when s * price < s * entry price * (1 - s * |stoploss|)
+    - roi fires when s * price > s * entry price * (1 + s * roi(t - entry datetime))
+    The roi trigger price is re-keyed when the trade reaches the next roi period.
+    Checking the triggers costs O(KlogN) for K fired trades.
+    Removed trades are dropped from the heaps lazily.
+    """
+
+    def __init__(self, trades: Iterable[ProxyTrade] = ()) -> None:
+        super().__init__(trades)
+        self._pending_trades: list[ProxyTrade] = list(self)
+        self._stop_loss: float = None
+        self._roi_helper: ROI_Helper = None
+        self._reindex()
+
+    def enable_trigger_index(self, stop_loss: float, roi_helper: ROI_Helper) -> None:
+        """Index the trades by their stop loss and roi trigger prices
+
+        Args:
+            stop_loss (float): stop loss ratio
+            roi_helper (ROI_Helper): roi helper
+        """
+        self._stop_loss = abs(stop_loss)
+        self._roi_helper = roi_helper
+        self._sequence = itertools.count()
+        # heap items: (key, sequence, trade), the smallest key fires first
+        self._stop_loss_heap: list[tuple] = []
+        self._roi_heap: list[tuple] = []
+        # heap items: (datetime of next roi period, sequence, trade)
+        self._roi_period_heap: list[tuple] = []
+        # latest roi heap sequence of each trade, older heap items are stale
+        self._roi_sequence: dict[int, int] = {}
+
+    @staticmethod
+    def _trade_exposure(trade: ProxyTrade) -> float:
+        return (1 if trade.direction == LongShort_Enum.LONG else -1) / trade.entry_price
+
+    @staticmethod
+    def _trade_sign(trade: ProxyTrade) -> int:
+        return 1 if trade.direction == LongShort_Enum.LONG else -1
+
+    def _reindex(self) -> None:
+        """Recalculate the aggregated exposure from scratch"""
+        self.exposure: float = sum(self._trade_exposure(t) for t in self)
+        self.latest_entry_datetime: datetime = max(
+            (t.entry_datetime for t in self), default=None
+        )
+        self._trade_ids: set[int] = {id(t) for t in self}
+        if self._roi_helper is not None:
+            self._roi_sequence = {
+                k: v for k, v in self._roi_sequence.items() if k in self._trade_ids
+            }
+
+    def _add_trade(self, trade: ProxyTrade) -> None:
+        self._pending_trades.append(trade)
+        self._trade_ids.add(id(trade))
+        self.exposure += self._trade_exposure(trade)
+        if (
+            self.latest_entry_datetime is None
+            or self.latest_entry_datetime < trade.entry_datetime
+        ):
+            self.latest_entry_datetime = trade.entry_datetime
+
+    def _remove_trade(self, trade: ProxyTrade) -> None:
+        self._trade_ids.discard(id(trade))
+        if len(self) == 0:
+            # reset instead of accumulating the rounding of the subtractions
+            self.exposure = 0
+        else:
+            self.exposure -= self._trade_exposure(trade)
+        if self._roi_helper is not None:
+            self._roi_sequence.pop(id(trade), None)
+        if len(self) == 0:
+            self.latest_entry_datetime = None
+        elif self.latest_entry_datetime <= trade.entry_datetime:
+            self.latest_entry_datetime = max(t.entry_datetime for t in self)
+
+    def append(self, trade: ProxyTrade) -> None:
+        super().append(trade)
+        self._add_trade(trade)
+
+    def extend(self, trades: Iterable[ProxyTrade]) -> None:
+        for trade in trades:
+            self.append(trade)
+
+    def __iadd__(self, trades: Iterable[ProxyTrade]) -> PositionList:
+        self.extend(trades)
+        return self
+
+    def insert(self, index: int, trade: ProxyTrade) -> None:
+        super().insert(index, trade)
+        self._add_trade(trade)
+
+    def remove(self, trade: ProxyTrade) -> None:
+        index: int = self.index(trade)
+        removed_trade: ProxyTrade = self[index]
+        super().__delitem__(index)
+        self._remove_trade(removed_trade)
+
+    def pop(self, index: int = -1) -> ProxyTrade:
+        trade: ProxyTrade = super().pop(index)
+        self._remove_trade(trade)
+        return trade
+
+    def clear(self) -> None:
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self._pending_trades.extend(value if isinstance(index, slice) else [value])
+        self._reindex()
+
+    def __delitem__(self, index) -> None:
+        removed_trades: list[ProxyTrade] = (
+            self[index] if isinstance(index, slice) else [self[index]]
+        )
+        super().__delitem__(index)
+        for trade in removed_trades:
+            self._remove_trade(trade)
+
+    def calculate_mtm_normalized(self, dt: datetime, price_diff: float) -> float:
+        """calculate the normalized mtm of all trades from the price difference
+        p(t) - p(t-1)
+        trades entered at or after dt are excluded
+
+        Args:
+            dt (datetime): time stamp t
+            price_diff (float): price diff between p(t) and p(t-1)
+
+        Returns:
+            float: delta mtm
+        """
+        if len(self) == 0:
+            return 0
+        if self.latest_entry_datetime < dt:
+            return self.exposure * price_diff
+
+        # Some trades are entered at or after dt, fall back to loop the trades
+        mtm: float = 0
+        for trade in self:
+            if dt <= trade.entry_datetime or (
+                trade.exit_datetime is not None and trade.exit_datetime < dt
+            ):
+                logger.debug(f"exclude {trade.entry_datetime} <= {dt}")
+                continue
+            mtm += trade.calculate_mtm_normalized(price_diff=price_diff)
+        return mtm
+
+    def _is_live(self, trade: ProxyTrade) -> bool:
+        return id(trade) in self._trade_ids
+
+    def _push_roi_trigger(self, trade: ProxyTrade, dt: datetime) -> None:
+        """Key the trade by the roi in effect at dt and schedule the next roi period
+
+        Args:
+            trade (ProxyTrade): trade
+            dt (datetime): time stamp
+        """
+        elapsed_seconds: int = int((dt - trade.entry_datetime).total_seconds())
+        sequence: int = next(self._sequence)
+        self._roi_sequence[id(trade)] = sequence
+        sign: int = self._trade_sign(trade)
+        threshold: float = self._roi_helper.get_take_profit_threshold(elapsed_seconds)
+        key: float = sign * trade.entry_price * (1 + sign * threshold)
+        if key < float("inf"):
+            heapq.heappush(self._roi_heap, (key, sequence, trade))
+
+        next_roi_seconds: int = self._roi_helper.get_next_roi_seconds(elapsed_seconds)
+        if next_roi_seconds is not None:
+            heapq.heappush(
+                self._roi_period_heap,
+                (
+                    trade.entry_datetime + timedelta(seconds=next_roi_seconds),
+                    sequence,
+                    trade,
+                ),
+            )
+
+    def _sync_trigger_index(self, dt: datetime) -> None:
+        """Index the trades added since the last check
+        and re-key the trades reaching their next roi period at dt
+
+        Args:
+            dt (datetime): time stamp
+        """
+        assert self._roi_helper is not None, "trigger index is not enabled"
+        pending_trades, self._pending_trades = self._pending_trades, []
+        for trade in pending_trades:
+            if not self._is_live(trade) or id(trade) in self._roi_sequence:
+                continue
+            sign: int = self._trade_sign(trade)
+            key: float = -sign * trade.entry_price * (1 - sign * self._stop_loss)
+            if key < float("inf"):
+                heapq.heappush(self._stop_loss_heap, (key, next(self._sequence), trade))
+            self._push_roi_trigger(trade=trade, dt=dt)
+
+        while len(self._roi_period_heap) > 0 and self._roi_period_heap[0][0] <= dt:
+            _, sequence, trade = heapq.heappop(self._roi_period_heap)
+            if self._is_live(trade) and self._roi_sequence.get(id(trade)) == sequence:
+                self._push_roi_trigger(trade=trade, dt=dt)
+
+        # Drop the removed trades once they dominate the heaps
+        if len(self._stop_loss_heap) + len(self._roi_heap) > 4 * len(self) + 64:
+            for heap in (self._stop_loss_heap, self._roi_heap, self._roi_period_heap):
+                heap[:] = [item for item in heap if self._is_live(item[2])]
+                heapq.heapify(heap)
+
+    def get_trigger_bounds(self, dt: datetime) -> tuple[float, float, datetime]:
+        """Get the smallest keys of the trigger heaps after indexing the trades up to dt
+        with s = +1 for long and -1 for short trade, a trade may fire at price p only if
+        - stop loss: stop_loss_key <= -s * p
+        - roi: roi_key <= s * p
+        until the next roi period
+
+        Args:
+            dt (datetime): time stamp
+
+        Returns:
+            tuple[float, float, datetime]: stop loss key, roi key (inf if none),
+                datetime of the next roi period (None if none)
+        """
+        self._sync_trigger_index(dt)
+        for heap, is_stale in (
+            (self._stop_loss_heap, lambda item: False),
+            (
+                self._roi_heap,
+                lambda item: self._roi_sequence.get(id(item[2])) != item[1],
+            ),
+            (
+                self._roi_period_heap,
+                lambda item: self._roi_sequence.get(id(item[2])) != item[1],
+            ),
+        ):
+            while len(heap) > 0 and (
+                not self._is_live(heap[0][2]) or is_stale(heap[0])
+            ):
+                heapq.heappop(heap)
+        return (
+            (
+                self._stop_loss_heap[0][0]
+                if len(self._stop_loss_heap) > 0
+                else float("inf")
+            ),
+            self._roi_heap[0][0] if len(self._roi_heap) > 0 else float("inf"),
+            self._roi_period_heap[0][0] if len(self._roi_period_heap) > 0 else None,
+        )
+
+    def _pop_triggered(
+        self, heap: list[tuple], bound: float, is_fired, is_stale
+    ) -> list[ProxyTrade]:
+        """Pop the trades of the heap with key <= bound confirmed by is_fired
+
+        Args:
+            heap (list[tuple]): trigger heap
+            bound (float): largest key of candidates
+            is_fired (Callable): exact firing check of a trade
+            is_stale (Callable): check if a heap item is outdated
+
+        Returns:
+            list[ProxyTrade]: fired trades in entry order
+        """
+        fired_trades: dict[int, ProxyTrade] = {}
+        not_fired_items: list[tuple] = []
+        while len(heap) > 0 and heap[0][0] <= bound:
+            item = heapq.heappop(heap)
+            trade: ProxyTrade = item[2]
+            if not self._is_live(trade) or is_stale(item) or id(trade) in fired_trades:
+                continue
+            if is_fired(trade):
+                fired_trades[id(trade)] = trade
+            else:
+                not_fired_items.append(item)
+        for item in not_fired_items:
+            heapq.heappush(heap, item)
+        # popped by trigger price, closed and archived first in first out
+        return sorted(fired_trades.values(), key=lambda trade: trade.entry_datetime)
+
+    def pop_stop_loss_triggered(self, price: float, dt: datetime) -> list[ProxyTrade]:
+        """Get the trades hitting stop loss at price, the trades stay in the list
+
+        Args:
+            price (float): price at the timestamp
+            dt (datetime): time stamp
+
+        Returns:
+            list[ProxyTrade]: trades to close in entry order
+        """
+        self._sync_trigger_index(dt)
+        if len(self) == 0:
+            return []
+        sign: int = self._trade_sign(self[0])
+        return self._pop_triggered(
+            heap=self._stop_loss_heap,
+            bound=-sign * price + abs(price) * TRIGGER_PRICE_TOLERANCE,
+            is_fired=lambda trade: trade.calculate_pnl_normalized(price=price)
+            < -self._stop_loss,
+            is_stale=lambda item: False,
+        )
+
+    def pop_roi_triggered(self, price: float, dt: datetime) -> list[ProxyTrade]:
+        """Get the trades reaching roi at price, the trades stay in the list
+
+        Args:
+            price (float): price at the timestamp
+            dt (datetime): time stamp
+
+        Returns:
+            list[ProxyTrade]: trades to close in entry order
+        """
+        self._sync_trigger_index(dt)
+        if len(self) == 0:
+            return []
+        sign: int = self._trade_sign(self[0])
+        return self._pop_triggered(
+            heap=self._roi_heap,
+            bound=sign * price + abs(price) * TRIGGER_PRICE_TOLERANCE,
+            is_fired=lambda trade: trade.calculate_pnl_normalized(price=price)
+            > self._roi_helper.get_take_profit_threshold(
+                int((dt - trade.entry_datetime).total_seconds())
+            ),
+            is_stale=lambda item: self._roi_sequence.get(id(item[2])) != item[1],
+        )
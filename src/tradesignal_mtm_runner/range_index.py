@@ -0,0 +1,209 @@
+from __future__ import annotations
+from typing import Union
+from .models import PROFIT_SLIPPAGE, MIN_NUMERIC_VALUE
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Relative rounding of prefix sum differences
+PREFIX_ROUNDING_TOLERANCE: float = 1e-12
+
+
+class MtmRangeIndex:
+    """Index over the mtm series of a completed run answering the pnl, sharpe ratio
+    and max drawdown of any bar range [start, end]
+    - pnl and sharpe ratio from prefix sums and prefix sums of squares in O(1)
+    - max drawdown from a segment tree over the cumulative pnl in O(logN),
+      each node keeps the max, min and max drawdown of its bars
+    All queries are vectorized over arrays of ranges.
+    The metrics of a range are the same as a run over the bars of the range only.
+    """
+
+    def __init__(self, timestamp_ms: np.ndarray, mtm: np.ndarray) -> None:
+        """
+        Args:
+            timestamp_ms (np.ndarray): sorted time stamp of each bar in ms
+            mtm (np.ndarray): mtm of each bar
+        """
+        self.timestamp_ms: np.ndarray = np.asarray(timestamp_ms, dtype=np.int64)
+        mtm = np.asarray(mtm, dtype=float)
+        self.bar_count: int = len(mtm)
+        # prefix sums with a leading zero, squares are centered to limit cancellation
+        self._center: float = float(mtm.mean()) if self.bar_count > 0 else 0
+        self._prefix_sum: np.ndarray = np.concatenate(([0], np.cumsum(mtm)))
+        self._prefix_centered_square_sum: np.ndarray = np.concatenate(
+            ([0], np.cumsum((mtm - self._center) ** 2))
+        )
+        self._build_segment_tree(self._prefix_sum[1:])
+
+    @classmethod
+    def from_pnl_timeline(cls, pnl_timeline: dict) -> MtmRangeIndex:
+        """Build the index from Mtm_Result.pnl_timeline
+
+        Args:
+            pnl_timeline (dict): pnl timeline with "timestamp" and "mtm_ratio" columns
+
+        Returns:
+            MtmRangeIndex: range index
+        """
+        return cls(
+            timestamp_ms=np.asarray(pnl_timeline["timestamp"], dtype=np.int64),
+            mtm=np.asarray(pnl_timeline["mtm_ratio"], dtype=float),
+        )
+
+    def _build_segment_tree(self, pnl_cumulative: np.ndarray) -> None:
+        """Build the segment tree bottom up, node i has children 2i and 2i+1
+
+        Args:
+            pnl_cumulative (np.ndarray): cumulative pnl of each bar
+        """
+        self._leaf_count: int = 1 << max(0, int(self.bar_count - 1).bit_length())
+        size: int = 2 * self._leaf_count
+        self._max: np.ndarray = np.full(size, -np.inf)
+        self._min: np.ndarray = np.full(size, np.inf)
+        self._drawdown: np.ndarray = np.zeros(size)
+        self._max[self._leaf_count : self._leaf_count + self.bar_count] = pnl_cumulative
+        self._min[self._leaf_count : self._leaf_count + self.bar_count] = pnl_cumulative
+        level_start: int = self._leaf_count // 2
+        while level_start >= 1:
+            node: np.ndarray = np.arange(level_start, 2 * level_start)
+            (
+                self._max[node],
+                self._min[node],
+                self._drawdown[node],
+            ) = self._combine(
+                (self._max[2 * node], self._min[2 * node], self._drawdown[2 * node]),
+                (
+                    self._max[2 * node + 1],
+                    self._min[2 * node + 1],
+                    self._drawdown[2 * node + 1],
+                ),
+            )
+            level_start //= 2
+
+    @staticmethod
+    def _combine(
+        left: tuple[np.ndarray, np.ndarray, np.ndarray],
+        right: tuple[np.ndarray, np.ndarray, np.ndarray],
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Combine the (max, min, max drawdown) of two consecutive bar ranges"""
+        return (
+            np.maximum(left[0], right[0]),
+            np.minimum(left[1], right[1]),
+            np.maximum(np.maximum(left[2], right[2]), left[0] - right[1]),
+        )
+
+    def _as_range(self, start, end) -> tuple[np.ndarray, np.ndarray]:
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        assert np.all(start <= end), "start should be <= end"
+        return start, end
+
+    def index_of(self, timestamp_ms: Union[int, np.ndarray]) -> np.ndarray:
+        """Bar index of the last bar at or before each time stamp
+
+        Args:
+            timestamp_ms (Union[int, np.ndarray]): time stamp in ms
+
+        Returns:
+            np.ndarray: bar index, -1 if before the first bar
+        """
+        return np.searchsorted(self.timestamp_ms, timestamp_ms, side="right") - 1
+
+    def pnl(self, start, end) -> np.ndarray:
+        """pnl of the bars in [start, end]
+
+        Args:
+            start (Union[int, np.ndarray]): first bar
+            end (Union[int, np.ndarray]): last bar
+
+        Returns:
+            np.ndarray: pnl
+        """
+        start, end = self._as_range(start, end)
+        return self._prefix_sum[end + 1] - self._prefix_sum[start]
+
+    def sharpe_ratio(self, start, end) -> np.ndarray:
+        """sharpe ratio of the bars in [start, end],
+        the same as TradeBookKeeperAgent.calculate_sharpe_ratio over these bars
+
+        Args:
+            start (Union[int, np.ndarray]): first bar
+            end (Union[int, np.ndarray]): last bar
+
+        Returns:
+            np.ndarray: sharpe ratio, MIN_NUMERIC_VALUE if the mtm has no variation
+        """
+        start, end = self._as_range(start, end)
+        bar_count: np.ndarray = end - start + 1
+        total: np.ndarray = self._prefix_sum[end + 1] - self._prefix_sum[start]
+        mean_offset: np.ndarray = total / bar_count - self._center
+        centered_square_sum: np.ndarray = (
+            self._prefix_centered_square_sum[end + 1]
+            - self._prefix_centered_square_sum[start]
+        )
+        variance: np.ndarray = centered_square_sum / bar_count - mean_offset**2
+        # differences of prefix sums carry rounding of the whole prefix,
+        # a variance below it is no variation
+        rounding: np.ndarray = (
+            PREFIX_ROUNDING_TOLERANCE
+            * self._prefix_centered_square_sum[end + 1]
+            / bar_count
+        )
+        variance = np.where(variance > rounding, variance, 0)
+        std_profit: np.ndarray = np.sqrt(variance)
+        time_period_hours: np.ndarray = (
+            (self.timestamp_ms[end] - self.timestamp_ms[start]) / 1000 / 3600
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                std_profit > 0,
+                (total - bar_count * PROFIT_SLIPPAGE)
+                / time_period_hours
+                / std_profit
+                * np.sqrt(365 * 24),
+                MIN_NUMERIC_VALUE,
+            )
+
+    def max_drawdown(self, start, end) -> np.ndarray:
+        """max drawdown of the bars in [start, end], the running peak starts at zero pnl
+        at the start of the range
+
+        Args:
+            start (Union[int, np.ndarray]): first bar
+            end (Union[int, np.ndarray]): last bar
+
+        Returns:
+            np.ndarray: max drawdown
+        """
+        start, end = self._as_range(start, end)
+        shape: tuple = np.broadcast(start, end).shape
+        left = (np.full(shape, -np.inf), np.full(shape, np.inf), np.zeros(shape))
+        right = (np.full(shape, -np.inf), np.full(shape, np.inf), np.zeros(shape))
+        low: np.ndarray = start + self._leaf_count
+        high: np.ndarray = end + self._leaf_count + 1
+        while np.any(low < high):
+            active: np.ndarray = low < high
+            take_low: np.ndarray = active & (low % 2 == 1)
+            node: np.ndarray = np.where(take_low, low, 0)
+            combined = self._combine(
+                left, (self._max[node], self._min[node], self._drawdown[node])
+            )
+            left = tuple(np.where(take_low, c, l) for c, l in zip(combined, left))
+            low = low + take_low
+
+            take_high: np.ndarray = active & (high % 2 == 1)
+            high = high - take_high
+            node = np.where(take_high, high, 0)
+            combined = self._combine(
+                (self._max[node], self._min[node], self._drawdown[node]), right
+            )
+            right = tuple(np.where(take_high, c, r) for c, r in zip(combined, right))
+
+            low = np.where(active, low // 2, low)
+            high = np.where(active, high // 2, high)
+
+        _, range_min, range_drawdown = self._combine(left, right)
+        base_pnl: np.ndarray = self._prefix_sum[start]
+        return np.maximum(0, np.maximum(range_drawdown, base_pnl - range_min))
@@ -4,21 +4,71 @@ from .config import PnlCalcConfig
 from .helper import ROI_Helper
 
 from .trade_reward import TradeBookKeeperAgent
-from .models import Mtm_Result, Buy_Sell_Action_Enum
+from .models import (
+    Mtm_Result,
+    Buy_Sell_Action_Enum,
+    Proxy_Trade_Actions,
+    Agent_Retention_Policy,
+    Engine_Mode,
+    Memory_Report,
+    Fee_Sweep_Result,
+    Agent_Snapshot,
+)
+from .event_engine import run_event_driven, merge_signal_index, dense_signal
+from .first_passage import run_first_passage
+from .chunk_engine import run_chunked_parallel
+from .sweep import sweep_fee_and_tax
+from .lockstep import run_signal_matrix, run_price_scenarios, ScenarioBatchResult
+from .bootstrap import block_bootstrap_mtm, shuffle_trade_order, ResampleDistribution
+from .metrics import calculate_performance_metrics, PerformanceMetrics
+from .excursion import PriceRangeIndex
+from .checkpoint import RunCheckpoints
+from .columnar import read_column, read_timestamp_ms
+from .market_cache import (
+    MarketArrayCache,
+    PreparedMarket,
+    prepare_market,
+    market_data_version,
+)
+from .exceptions import UnSupportedException
 
 from .models import MIN_NUMERIC_VALUE, MAX_NUMERIC_VALUE
+from .utility import calculate_max_drawdown, calculate_sharpe_ratio_from_moments
 
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Sequence
+import numpy as np
 import pandas as pd
 import logging
+import time
+import tracemalloc
+import weakref
 
 logger = logging.getLogger(__name__)
 
 
+def _signal_list(signal_index: np.ndarray, bar_count: int) -> list[int]:
+    """signal of each bar for the timeline, 1 at the signal bars and 0 elsewhere
+
+    Args:
+        signal_index (np.ndarray): bar index of signals
+        bar_count (int): number of bars
+
+    Returns:
+        list[int]: signal of each bar
+    """
+    signal: list[int] = [0] * bar_count
+    for i in signal_index.tolist():
+        signal[i] = 1
+    return signal
+
+
 class Trade_Mtm_Runner(ITradeSignalRunner):
     """Accept buy/sell signal from Strategy
     buy/sell signal should be coupled with market data from panda dataframe
     stop loss/profit checker also initialized into the runner.
-    Note: it will merage buy + sell signal into one dataframe when processing
+    Note: the buy and sell signal data frames are read without being modified or merged
 
     to reduce complexity, we assume trade is fully filled each time
 
@@ -44,12 +94,59 @@ class Trade_Mtm_Runner(ITradeSignalRunner):
     def __init__(
         self,
         pnl_config: PnlCalcConfig,
+        trace_memory: bool = False,
+        retention_policy: Agent_Retention_Policy = Agent_Retention_Policy.KEEP_ALL,
+        max_retained_agents: int = 1,
+        engine_mode: Engine_Mode = Engine_Mode.BAR,
+        trade_excursion: bool = False,
+        checkpoint_interval: int = None,
+        n_jobs: int = 1,
+        compact: bool = False,
+        compact_timeline: bool = False,
+        market_cache: MarketArrayCache = None,
     ) -> None:
         """
         Args:
-            enable_short_position (bool): enable short position
-            fixed_unit_amount (float): stake amount
-            no_duplicate_trade (bool, optional): no duplication for the same symbol. Defaults to True.
+            pnl_config (PnlCalcConfig): pnl calculation config
+            trace_memory (bool, optional): record the tracemalloc peak of each run
+                into Mtm_Result.peak_memory_bytes. Defaults to False.
+            retention_policy (Agent_Retention_Policy, optional): how book keeper agents
+                are kept in trade_order_simulator_map after a run. Defaults to KEEP_ALL.
+            max_retained_agents (int, optional): number of agents kept with KEEP_LAST_N.
+                Defaults to 1.
+            engine_mode (Engine_Mode, optional): run the agent on each bar, on event
+                bars only, trade by trade with first passage search, or in chunks in
+                parallel. Defaults to BAR.
+            trade_excursion (bool, optional): fill the max adverse/favorable excursion
+                of each trade of the result. Defaults to False.
+            checkpoint_interval (int, optional): bars between the agent checkpoints kept
+                for recalculate, smaller intervals keep more checkpoints and re-simulate
+                fewer bars. None to disable. Defaults to None.
+            n_jobs (int, optional): number of processes of the chunked engine. Defaults
+                to 1.
+            compact (bool, optional): float32 close price, price movement and mtm
+                history to halve the working set. float32 keeps 24 bits of mantissa,
+                each price and mtm is rounded by less than 6e-8 (2**-24) of its value.
+                The price movements of the rounded prices are exact, so the pnl of a
+                trade is off by about 1.2e-7 from rounding its entry and exit prices,
+                plus less than 6e-8 * sum(abs(mtm)) from storing the mtm. The pnl is
+                summed up with compensated summation, the running pnl, drawdown and
+                sharpe ratio in float64. Defaults to False.
+            compact_timeline (bool, optional): pnl_timeline of numpy arrays instead of
+                lists, float32 pnl, mtm and close price, int8 signals and int64 time
+                stamps. Requires compact. Defaults to False.
+            market_cache (MarketArrayCache, optional): cache of the arrays prepared from
+                the market data, shared by the runs on the same symbol and data, e.g.
+                PROCESS_MARKET_CACHE. On each run the market data is hashed, and on a
+                miss the time stamps and close prices still referenced by the caller are
+                copied so that the cached read only arrays cannot change.
+                PROCESS_MARKET_CACHE retains up to 512 MB of arrays for the lifetime of
+                the process. Defaults to None, the arrays are prepared on each run
+                without copy.
+
+        Raises:
+            ValueError: checkpoint_interval, n_jobs or max_retained_agents is not > 0,
+                or compact_timeline without compact
         """
 
         self._take_profit: float = pnl_config.roi[0]  # (take_profit_pct/100.0)
@@ -60,14 +157,333 @@ class Trade_Mtm_Runner(ITradeSignalRunner):
         self.pnl_config = pnl_config
         self.PROFIT_SLIPPAGE: float = 0.00005
 
+        self.trace_memory: bool = trace_memory
+        self.engine_mode: Engine_Mode = engine_mode
+        self.trade_excursion: bool = trade_excursion
+        if checkpoint_interval is not None and checkpoint_interval <= 0:
+            raise ValueError(
+                f"checkpoint_interval should be > 0: {checkpoint_interval}"
+            )
+        self.checkpoint_interval: int = checkpoint_interval
+        if n_jobs <= 0:
+            raise ValueError(f"n_jobs should be > 0: {n_jobs}")
+        self.n_jobs: int = n_jobs
+        if compact_timeline and not compact:
+            raise ValueError("compact_timeline requires compact")
+        self.compact: bool = compact
+        self.compact_timeline: bool = compact_timeline
+        self._float_dtype: type = np.float32 if compact else np.float64
+        self.market_cache: MarketArrayCache = market_cache
+
         self._roi_helper = ROI_Helper(roi_dict=self._roi)
         logger.debug(
             f"Take profit at {self._take_profit} ; Stop Loss at {self._stop_loss}"
         )
         # Potential to support multiple symbols in the pnl run.
-        self.trade_order_simulator_map: dict[str, TradeBookKeeperAgent] = {}
+        if max_retained_agents <= 0:
+            raise ValueError(
+                f"max_retained_agents should be > 0: {max_retained_agents}"
+            )
+        self.retention_policy: Agent_Retention_Policy = retention_policy
+        self.max_retained_agents: int = max_retained_agents
+        self.trade_order_simulator_map: dict[str, TradeBookKeeperAgent] = (
+            weakref.WeakValueDictionary()
+            if retention_policy == Agent_Retention_Policy.WEAK_REFERENCE
+            else OrderedDict()
+        )
         pass
 
+    def _get_trade_order_agent(
+        self, symbol: str, capacity: int
+    ) -> TradeBookKeeperAgent:
+        """Reuse the retained agent of the symbol or create a new one
+
+        Args:
+            symbol (str): symbol of the run
+            capacity (int): number of bars of the run
+
+        Returns:
+            TradeBookKeeperAgent: agent ready for a new run
+        """
+        trade_order_agent: TradeBookKeeperAgent = self.trade_order_simulator_map.get(
+            symbol
+        )
+        if trade_order_agent is not None:
+            trade_order_agent.reset(capacity=capacity)
+            return trade_order_agent
+        return TradeBookKeeperAgent(
+            symbol=symbol,
+            pnl_config=self.pnl_config,
+            fixed_unit=True,
+            capacity=capacity,
+            roi_helper=self._roi_helper,
+            mtm_dtype=self._float_dtype,
+        )
+
+    def _retain_trade_order_agent(
+        self, symbol: str, trade_order_agent: TradeBookKeeperAgent
+    ) -> None:
+        """Keep the agent of a run according to the retention policy
+
+        Args:
+            symbol (str): symbol of the run
+            trade_order_agent (TradeBookKeeperAgent): agent of the run
+        """
+        if self.retention_policy == Agent_Retention_Policy.KEEP_NONE:
+            return
+        self.trade_order_simulator_map.pop(symbol, None)
+        self.trade_order_simulator_map[symbol] = trade_order_agent
+        if self.retention_policy == Agent_Retention_Policy.KEEP_LAST_N:
+            while len(self.trade_order_simulator_map) > self.max_retained_agents:
+                self.trade_order_simulator_map.popitem(last=False)
+
+    def memory_report(self) -> Memory_Report:
+        """Estimate the memory held by the retained book keeper agents
+
+        Returns:
+            Memory_Report: bytes held by agents, timelines and trade archives
+        """
+        report: Memory_Report = Memory_Report()
+        for symbol, agent in list(self.trade_order_simulator_map.items()):
+            footprint: dict[str, int] = agent.memory_footprint()
+            report.agent_count += 1
+            report.agent_bytes += footprint["agent"]
+            report.timeline_bytes += footprint["timeline"]
+            report.trade_archive_bytes += footprint["trade_archive"]
+            report.outstanding_trade_bytes += footprint["outstanding_trades"]
+            report.symbol_bytes[symbol] = sum(footprint.values())
+        return report
+
+    def sweep_fee_and_tax(
+        self, symbol: str, fee_rates: list[float], laid_back_taxes: list[float]
+    ) -> list[Fee_Sweep_Result]:
+        """Re-price the last run of the symbol with other fee rates and laid back taxes
+        without running the simulation again
+
+        Args:
+            symbol (str): symbol of a finished run
+            fee_rates (list[float]): fee rates of each trade action
+            laid_back_taxes (list[float]): taxes of each bar without position
+
+        Raises:
+            UnSupportedException: the agent of the symbol is not retained, or it ran
+                the bars of a resumed snapshot without the history
+
+        Returns:
+            list[Fee_Sweep_Result]: result of each combination, laid back taxes vary
+                fastest
+        """
+        return sweep_fee_and_tax(
+            trade_order_agent=self._get_retained_agent(symbol, full_history=True),
+            fee_rates=fee_rates,
+            laid_back_taxes=laid_back_taxes,
+        )
+
+    def bootstrap_mtm(
+        self,
+        symbol: str,
+        resample_count: int = 1000,
+        block_size: int = 24,
+        seed: int = None,
+        n_jobs: int = 1,
+    ) -> ResampleDistribution:
+        """Block bootstrap the mtm history of the last run of the symbol
+
+        Args:
+            symbol (str): symbol of a finished run
+            resample_count (int, optional): number of resamples. Defaults to 1000.
+            block_size (int, optional): number of consecutive bars of a block. Defaults
+                to 24.
+            seed (int, optional): random seed. Defaults to None.
+            n_jobs (int, optional): number of processes. Defaults to 1.
+
+        Raises:
+            UnSupportedException: the agent of the symbol is not retained, or it ran
+                the bars of a resumed snapshot without the history
+
+        Returns:
+            ResampleDistribution: pnl, sharpe ratio and max drawdown of each resample
+        """
+        trade_order_agent: TradeBookKeeperAgent = self._get_retained_agent(
+            symbol, full_history=True
+        )
+        return block_bootstrap_mtm(
+            timestamp_ms=trade_order_agent.mtm_history_timestamp_ms,
+            mtm=trade_order_agent.mtm_history_value,
+            resample_count=resample_count,
+            block_size=block_size,
+            seed=seed,
+            n_jobs=n_jobs,
+        )
+
+    def shuffle_trades(
+        self,
+        symbol: str,
+        resample_count: int = 1000,
+        with_replacement: bool = False,
+        seed: int = None,
+        n_jobs: int = 1,
+    ) -> ResampleDistribution:
+        """Shuffle the closed trades of the last run of the symbol
+
+        Args:
+            symbol (str): symbol of a finished run
+            resample_count (int, optional): number of resamples. Defaults to 1000.
+            with_replacement (bool, optional): draw trades with replacement. Defaults to
+                False.
+            seed (int, optional): random seed. Defaults to None.
+            n_jobs (int, optional): number of processes. Defaults to 1.
+
+        Raises:
+            UnSupportedException: the agent of the symbol is not retained, or it ran
+                the bars of a resumed snapshot without the history
+
+        Returns:
+            ResampleDistribution: pnl, sharpe ratio and max drawdown of each resample
+        """
+        trade_order_agent: TradeBookKeeperAgent = self._get_retained_agent(
+            symbol, full_history=True
+        )
+        return shuffle_trade_order(
+            trades=trade_order_agent.archive_long_positions_list
+            + trade_order_agent.archive_short_positions_list,
+            resample_count=resample_count,
+            with_replacement=with_replacement,
+            seed=seed,
+            n_jobs=n_jobs,
+        )
+
+    def calculate_metrics(
+        self, symbol: str, period_ms: int = None
+    ) -> PerformanceMetrics:
+        """Performance metrics of the last run of the symbol
+
+        Args:
+            symbol (str): symbol of a finished run
+            period_ms (int, optional): period to resample the mtm, e.g. metrics.DAY_MS.
+                Defaults to None.
+
+        Raises:
+            UnSupportedException: the agent of the symbol is not retained, or it ran
+                the bars of a resumed snapshot without the history
+
+        Returns:
+            PerformanceMetrics: performance metrics
+        """
+        trade_order_agent: TradeBookKeeperAgent = self._get_retained_agent(
+            symbol, full_history=True
+        )
+        return calculate_performance_metrics(
+            timestamp_ms=trade_order_agent.mtm_history_timestamp_ms,
+            mtm=trade_order_agent.mtm_history_value,
+            trades=trade_order_agent.archive_long_positions_list
+            + trade_order_agent.archive_short_positions_list,
+            is_flat=trade_order_agent.flat_history,
+            period_ms=period_ms,
+        )
+
+    def _get_retained_agent(
+        self, symbol: str, full_history: bool = False
+    ) -> TradeBookKeeperAgent:
+        """Get the agent of the last run of the symbol
+
+        Args:
+            symbol (str): symbol of a finished run
+            full_history (bool, optional): the agent should hold the mtm history and
+                trades of all bars. Defaults to False.
+
+        Raises:
+            UnSupportedException: the agent of the symbol is not retained, or it resumed
+                a snapshot and holds the new bars only while full_history is required
+
+        Returns:
+            TradeBookKeeperAgent: agent of the run
+        """
+        trade_order_agent: TradeBookKeeperAgent = self.trade_order_simulator_map.get(
+            symbol
+        )
+        if trade_order_agent is None:
+            raise UnSupportedException(
+                f"No retained run of {symbol} with retention policy "
+                f"{self.retention_policy}"
+            )
+        if full_history and trade_order_agent.resumed_from is not None:
+            raise UnSupportedException(
+                f"The run of {symbol} resumed a snapshot and holds the new bars only"
+            )
+        return trade_order_agent
+
+    def calculate_signal_matrix(
+        self,
+        symbol: str,
+        price_dataframe: pd.DataFrame,
+        buy_signal_matrix: np.ndarray,
+        sell_signal_matrix: np.ndarray,
+        packed: bool = False,
+    ) -> list[Mtm_Result]:
+        """Evaluate many buy/sell signal variants of the same market data in lockstep
+
+        Args:
+            symbol (str): symbol of the asset
+            price_dataframe (pd.DataFrame): market data with "close" column and
+                timestamp index
+            buy_signal_matrix (np.ndarray): buy signal (variants x bars), 1 for a
+                signal, or uint8 packed by lockstep.pack_signal_matrix
+            sell_signal_matrix (np.ndarray): sell signal (variants x bars), same format
+                as buy
+            packed (bool, optional): signal matrices are packed. Defaults to False.
+
+        Returns:
+            list[Mtm_Result]: summary of each variant, without timeline and trade
+                archives
+        """
+        mtm_results: list[Mtm_Result] = run_signal_matrix(
+            pnl_config=self.pnl_config,
+            timestamp_ms=np.asarray(
+                pd.to_numeric(price_dataframe.index), dtype=np.int64
+            )
+            // 1_000_000,
+            close_price=price_dataframe["close"].to_numpy(dtype=float),
+            buy_signal=buy_signal_matrix,
+            sell_signal=sell_signal_matrix,
+            packed=packed,
+            roi_helper=self._roi_helper,
+        )
+        logger.debug(f"{symbol}: evaluated {len(mtm_results)} signal variants")
+        return mtm_results
+
+    def calculate_price_scenarios(
+        self,
+        symbol: str,
+        signal_dataframe: pd.DataFrame,
+        price_matrix: np.ndarray,
+    ) -> ScenarioBatchResult:
+        """Evaluate the buy/sell signals against many perturbed price paths in lockstep
+
+        Args:
+            symbol (str): symbol of the asset
+            signal_dataframe (pd.DataFrame): "buy" and "sell" columns with timestamp
+                index
+            price_matrix (np.ndarray): close price of each scenario (scenarios x bars)
+
+        Returns:
+            ScenarioBatchResult: pnl, max drawdown and sharpe ratio arrays, one item per
+                scenario
+        """
+        batch_result: ScenarioBatchResult = run_price_scenarios(
+            pnl_config=self.pnl_config,
+            timestamp_ms=np.asarray(
+                pd.to_numeric(signal_dataframe.index), dtype=np.int64
+            )
+            // 1_000_000,
+            price_matrix=price_matrix,
+            buy_signal=signal_dataframe["buy"].to_numpy(),
+            sell_signal=signal_dataframe["sell"].to_numpy(),
+            roi_helper=self._roi_helper,
+        )
+        logger.debug(f"{symbol}: evaluated {len(batch_result.pnl)} price scenarios")
+        return batch_result
+
     def calculate(
         self,
         symbol: str,
@@ -84,106 +500,697 @@ class Trade_Mtm_Runner(ITradeSignalRunner):
         Returns:
             Mtm_Result: [description]
         """
-        _signal_dataframe: pd.DataFrame = self._prepare_df_for_analysis(
+        _prepared_bars: dict[str, np.ndarray] = self._prepare_df_for_analysis(
             buy_signal_dataframe=buy_signal_dataframe,
             sell_signal_dataframe=sell_signal_dataframe,
+            symbol=symbol,
         )
 
+        return self._iterate_each_timeframe(symbol=symbol, prepared_bars=_prepared_bars)
+
+    def recalculate(
+        self,
+        symbol: str,
+        buy_signal_dataframe: pd.DataFrame,
+        sell_signal_dataframe: pd.DataFrame,
+    ) -> Mtm_Result:
+        """Same as calculate, but the bars before the first bar where the market data or
+        signals differ from the last run of the symbol are not simulated again: the
+        agent is rewound to the last checkpoint before that bar. The whole series is run
+        if checkpoint_interval is disabled, the agent of the symbol is not retained or
+        the last run has no checkpoint, e.g. first passage engine.
+
+        Args:
+            symbol (str): symbol of the asset
+            buy_signal_dataframe (pd.DataFrame): buy data frame "close price", "buy"
+                column
+            sell_signal_dataframe (pd.DataFrame): sell data frame "sell" column
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        _prepared_bars: dict[str, np.ndarray] = self._prepare_df_for_analysis(
+            buy_signal_dataframe=buy_signal_dataframe,
+            sell_signal_dataframe=sell_signal_dataframe,
+            symbol=symbol,
+        )
         return self._iterate_each_timeframe(
-            symbol=symbol, signal_dataframe=_signal_dataframe
+            symbol=symbol, prepared_bars=_prepared_bars, rewind=True
         )
 
-    def _prepare_df_for_analysis(
+    def _rewind_retained_agent(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_signal: np.ndarray,
+        sell_signal: np.ndarray,
+    ) -> tuple[TradeBookKeeperAgent, int]:
+        """Rewind the retained agent of the symbol to the last checkpoint
+        before the first bar where the inputs differ from its run
+
+        Args:
+            symbol (str): symbol of the run
+            timestamp_ms (np.ndarray): time stamp of each bar in ms
+            close_price (np.ndarray): close price
+            buy_signal (np.ndarray): buy signal
+            sell_signal (np.ndarray): sell signal
+
+        Returns:
+            tuple[TradeBookKeeperAgent, int]: rewound agent and the first bar to run,
+                None and 0 if there is no checkpoint to rewind to
+        """
+        trade_order_agent: TradeBookKeeperAgent = self.trade_order_simulator_map.get(
+            symbol
+        )
+        if trade_order_agent is None or trade_order_agent.run_checkpoints is None:
+            return None, 0
+        run_checkpoints: RunCheckpoints = trade_order_agent.run_checkpoints
+        divergent_bar: int = run_checkpoints.find_first_divergent_bar(
+            timestamp_ms=timestamp_ms,
+            close_price=close_price,
+            buy_signal=buy_signal,
+            sell_signal=sell_signal,
+        )
+        checkpoint = run_checkpoints.rewind(divergent_bar)
+        if checkpoint is None:
+            return None, 0
+        trade_order_agent.rewind(checkpoint)
+        logger.debug(
+            f"{symbol}: inputs diverge at bar {divergent_bar}, re-simulate from bar "
+            f"{checkpoint.bar_index}"
+        )
+        return trade_order_agent, checkpoint.bar_index
+
+    def take_snapshot(self, symbol: str) -> Agent_Snapshot:
+        """Snapshot the last run of the symbol to resume it later with new bars
+
+        Args:
+            symbol (str): symbol of a finished run
+
+        Raises:
+            UnSupportedException: the agent of the symbol is not retained
+
+        Returns:
+            Agent_Snapshot: serializable snapshot, e.g. with Agent_Snapshot.json()
+        """
+        return self._get_retained_agent(symbol).take_snapshot()
+
+    def resume(
         self,
+        snapshot: Agent_Snapshot,
         buy_signal_dataframe: pd.DataFrame,
         sell_signal_dataframe: pd.DataFrame,
-    ) -> pd.DataFrame:
+        previous_result: Mtm_Result = None,
+    ) -> Mtm_Result:
+        """Continue the run of a snapshot with new bars, the history is not run again
+        pnl, max drawdown, sharpe ratio and trade counts of the result cover the history
+        and the new bars. The timeline and trade archives cover the new bars only,
+        unless the result of the previous run is given to merge with.
+        The retained agent holds the new bars only, sweep_fee_and_tax, bootstrap_mtm,
+        shuffle_trades and calculate_metrics raise UnSupportedException after a resume.
+        With trade_excursion, the excursions of the trades carried over from the
+        snapshot extend the excursions stored in the snapshot, or stay None if it has
+        none.
+
+        Args:
+            snapshot (Agent_Snapshot): snapshot of the previous run
+            buy_signal_dataframe (pd.DataFrame): new bars with "close" and "buy" columns
+            sell_signal_dataframe (pd.DataFrame): new bars with "sell" column
+            previous_result (Mtm_Result, optional): result of the previous run. Defaults
+                to None.
+
+        Raises:
+            UnSupportedException: first passage engine with outstanding trades in the
+                snapshot (the analysis of the retained agent raises it after the resume,
+                see above)
+            ValueError: the new bars do not start after the snapshot
+
+        Returns:
+            Mtm_Result: merged mtm result
         """
-        Prepare the dataframe for analysis
+        _prepared_bars: dict[str, np.ndarray] = self._prepare_df_for_analysis(
+            buy_signal_dataframe=buy_signal_dataframe,
+            sell_signal_dataframe=sell_signal_dataframe,
+            symbol=snapshot.symbol,
+        )
+        # checked before the retained agent is reset for the new bars
+        new_timestamp_ms: np.ndarray = _prepared_bars["timestamp_ms"]
+        if (
+            len(new_timestamp_ms) > 0
+            and new_timestamp_ms[0] <= snapshot.last_timestamp_ms
+        ):
+            raise ValueError("new bars should start after the snapshot")
+        mtm_result: Mtm_Result = self._iterate_each_timeframe(
+            symbol=snapshot.symbol, prepared_bars=_prepared_bars, snapshot=snapshot
+        )
+        if previous_result is not None:
+            mtm_result.pnl_timeline = {
+                k: (
+                    np.concatenate([previous_result.pnl_timeline.get(k, v[:0]), v])
+                    if isinstance(v, np.ndarray)
+                    else list(previous_result.pnl_timeline.get(k, [])) + list(v)
+                )
+                for k, v in mtm_result.pnl_timeline.items()
+            }
+            mtm_result.long_trades_archive[:0] = previous_result.long_trades_archive
+            mtm_result.short_trades_archive[:0] = previous_result.short_trades_archive
+        return mtm_result
 
+    def calculate_arrays(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_signal: np.ndarray,
+        sell_signal: np.ndarray,
+    ) -> Mtm_Result:
+        """Same as calculate with arrays instead of DataFrames, the bars are not
+        converted to pandas objects at any point
+
+        Args:
+            symbol (str): symbol of the asset
+            timestamp_ms (np.ndarray): sorted UTC time stamp of each bar in ms
+            close_price (np.ndarray): close price of each bar
+            buy_signal (np.ndarray): buy signal of each bar, 1 or True to buy
+            sell_signal (np.ndarray): sell signal of each bar, 1 or True to sell
+
+        Raises:
+            ValueError: the arrays have different lengths
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        if not (
+            len(timestamp_ms) == len(close_price) == len(buy_signal) == len(sell_signal)
+        ):
+            raise ValueError("arrays should have the same length")
+        return self.calculate_events(
+            symbol=symbol,
+            timestamp_ms=timestamp_ms,
+            close_price=close_price,
+            buy_events=np.flatnonzero(np.asarray(buy_signal) == 1),
+            sell_events=np.flatnonzero(np.asarray(sell_signal) == 1),
+        )
+
+    def calculate_events(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_events: np.ndarray,
+        sell_events: np.ndarray,
+        events_by_timestamp: bool = False,
+    ) -> Mtm_Result:
+        """Same as calculate_arrays with the signals given as events instead of a signal
+        of each bar, the engines consume the events without expanding them to the bars
+
+        Args:
+            symbol (str): symbol of the asset
+            timestamp_ms (np.ndarray): sorted UTC time stamp of each bar in ms
+            close_price (np.ndarray): close price of each bar
+            buy_events (np.ndarray): bar index of buy signals
+            sell_events (np.ndarray): bar index of sell signals, buy wins if both at the
+                same bar
+            events_by_timestamp (bool, optional): the events are time stamps of bars in
+                ms instead of bar index. Defaults to False.
+
+        Raises:
+            ValueError: the arrays have different lengths, or an event is not a bar
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        source_timestamp_ms, source_close_price = timestamp_ms, close_price
+        timestamp_ms = np.ascontiguousarray(timestamp_ms, dtype=np.int64)
+        close_price = np.ascontiguousarray(close_price, dtype=self._float_dtype)
+        if len(timestamp_ms) != len(close_price):
+            raise ValueError("arrays should have the same length")
+        buy_index: np.ndarray = self._to_bar_index(
+            events=buy_events,
+            timestamp_ms=timestamp_ms,
+            by_timestamp=events_by_timestamp,
+        )
+        sell_index: np.ndarray = self._to_bar_index(
+            events=sell_events,
+            timestamp_ms=timestamp_ms,
+            by_timestamp=events_by_timestamp,
+        )
+        prepared_market: PreparedMarket = self._prepare_market(
+            symbol=symbol,
+            timestamp_ms=timestamp_ms,
+            close_price=close_price,
+            timestamp_owned=not np.may_share_memory(timestamp_ms, source_timestamp_ms),
+            close_owned=not np.may_share_memory(close_price, source_close_price),
+        )
+        return self._iterate_arrays(
+            symbol=symbol,
+            time_line=prepared_market.time_line,
+            timestamp_ms=prepared_market.timestamp_ms,
+            close_price=prepared_market.close_price,
+            price_move=prepared_market.price_move,
+            buy_index=buy_index,
+            sell_index=sell_index,
+        )
+
+    def _prepare_market(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        time_line: Sequence[datetime] = None,
+        timestamp_owned: bool = False,
+        close_owned: bool = False,
+    ) -> PreparedMarket:
+        """Get the arrays prepared from the market data from the market cache,
+        or prepare them on a miss
+
+        Args:
+            symbol (str): symbol of the asset
+            timestamp_ms (np.ndarray): int64 time stamp of each bar in ms
+            close_price (np.ndarray): close price of each bar
+            time_line (Sequence[datetime], optional): time stamp of each bar.
+                Defaults to None, converted from timestamp_ms.
+            timestamp_owned (bool, optional): the time stamps were created by the runner
+                and are not copied into the cache. Defaults to False.
+            close_owned (bool, optional): the close prices were created by the runner
+                and are not copied into the cache. Defaults to False.
+
+        Returns:
+            PreparedMarket: arrays of the market data, read only if cached
+        """
+
+        def _prepare() -> PreparedMarket:
+            return prepare_market(
+                time_line=(
+                    time_line
+                    if time_line is not None
+                    else timestamp_ms.astype("datetime64[ms]").astype(datetime)
+                ),
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+            )
+
+        if self.market_cache is None:
+            return _prepare()
+
+        def _prepare_frozen() -> PreparedMarket:
+            return _prepare().freeze(
+                timestamp_owned=timestamp_owned, close_owned=close_owned
+            )
+
+        return self.market_cache.get_or_prepare(
+            symbol=symbol,
+            data_version=market_data_version(timestamp_ms, close_price),
+            prepare=_prepare_frozen,
+            dtype=self._float_dtype,
+            # e.g. naive and UTC pandas index of the same bars have different time lines
+            time_line_type=(
+                f"{type(time_line).__name__}[{getattr(time_line, 'dtype', None)}]"
+                if time_line is not None
+                else None
+            ),
+        )
+
+    @staticmethod
+    def _to_bar_index(
+        events: np.ndarray, timestamp_ms: np.ndarray, by_timestamp: bool
+    ) -> np.ndarray:
+        """Convert signal events to sorted unique bar index
+
+        Args:
+            events (np.ndarray): bar index or time stamp in ms of the signals
+            timestamp_ms (np.ndarray): sorted time stamp of each bar in ms
+            by_timestamp (bool): the events are time stamps
+
+        Raises:
+            ValueError: an event is not a bar
+
+        Returns:
+            np.ndarray: sorted unique bar index
+        """
+        bar_index: np.ndarray = np.unique(np.asarray(events, dtype=np.int64))
+        if by_timestamp:
+            time_stamps: np.ndarray = bar_index
+            bar_index = np.searchsorted(timestamp_ms, time_stamps)
+            if not (
+                np.all(bar_index < len(timestamp_ms))
+                and np.array_equal(timestamp_ms[bar_index], time_stamps)
+            ):
+                raise ValueError("event time stamps should be time stamps of bars")
+        if len(bar_index) > 0 and (
+            bar_index[0] < 0 or bar_index[-1] >= len(timestamp_ms)
+        ):
+            raise ValueError("event bar index out of range")
+        return bar_index
+
+    def calculate_table(
+        self,
+        symbol: str,
+        buy_signal_table: Any,
+        sell_signal_table: Any = None,
+        timestamp_column: str = "timestamp",
+    ) -> Mtm_Result:
+        """Same as calculate with an Arrow table or Polars data frame instead of pandas
+        The columns are read as numpy views where the buffers allow it and run by
+        calculate_arrays, the table is not converted to pandas.
+
+        Args:
+            symbol (str): symbol of the asset
+            buy_signal_table (Any): pyarrow Table / RecordBatch or polars DataFrame with
+                time stamp, "close" and "buy" columns
+            sell_signal_table (Any, optional): table with time stamp and "sell" columns
+                of the same bars. Defaults to None, the "sell" column of
+                buy_signal_table.
+            timestamp_column (str, optional): column of the UTC time stamp, datetime or
+                int64 ms. Defaults to "timestamp".
+
+        Raises:
+            UnSupportedException: the table is not an Arrow table or Polars data frame
+            ValueError: the buy and sell signal tables have different time stamps
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        timestamp_ms: np.ndarray = read_timestamp_ms(
+            table=buy_signal_table, name=timestamp_column
+        )
+        if sell_signal_table is None or sell_signal_table is buy_signal_table:
+            sell_signal_table = buy_signal_table
+        else:
+            if not np.array_equal(
+                timestamp_ms,
+                read_timestamp_ms(table=sell_signal_table, name=timestamp_column),
+            ):
+                raise ValueError(
+                    "buy and sell signal tables should have the same time stamps"
+                )
+        return self.calculate_arrays(
+            symbol=symbol,
+            timestamp_ms=timestamp_ms,
+            close_price=read_column(table=buy_signal_table, name="close"),
+            buy_signal=read_column(table=buy_signal_table, name="buy"),
+            sell_signal=read_column(table=sell_signal_table, name="sell"),
+        )
+
+    def _prepare_df_for_analysis(
+        self,
+        buy_signal_dataframe: pd.DataFrame,
+        sell_signal_dataframe: pd.DataFrame,
+        symbol: str = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Prepare the arrays for analysis
+        The data frames are not modified, only the "close", "buy" and "sell" columns
+        are read. Without market cache, the close price is read without copy if the
+        column is float64, or float32 in compact mode.
+        The sell column is aligned to the buy data frame index if the indexes differ.
 
         Args:
             buy_signal_dataframe (pd.DataFrame): buy data frame "close price", "buy" column
             sell_signal_dataframe (pd.DataFrame): sell data frame  "close price" "sell column
+            symbol (str, optional): symbol of the market cache entry. Defaults to None.
 
         Returns:
-            pd.DataFrame: _description_
+            dict[str, np.ndarray]: "time_line", "timestamp_ms", "close",
+                "price_movement", "buy_index" and "sell_index" arrays, the signals as
+                bar index of the 1 values
         """
-        _signal_dataframe: pd.DataFrame = buy_signal_dataframe
-        _signal_dataframe["sell"] = sell_signal_dataframe["sell"]
-        _signal_dataframe["price_movement"] = _signal_dataframe["close"].diff(1)
-
-        return _signal_dataframe
+        time_line: pd.Index = buy_signal_dataframe.index
+        sell_column: pd.Series = sell_signal_dataframe["sell"]
+        if sell_signal_dataframe is not buy_signal_dataframe and not (
+            sell_column.index is time_line or sell_column.index.equals(time_line)
+        ):
+            sell_column = sell_column.reindex(time_line)
+        close_column: np.ndarray = buy_signal_dataframe["close"].to_numpy()
+        close_price: np.ndarray = np.asarray(close_column, dtype=self._float_dtype)
+        prepared_market: PreparedMarket = self._prepare_market(
+            symbol=symbol,
+            timestamp_ms=np.asarray(pd.to_numeric(time_line), dtype=np.int64)
+            // 1_000_000,
+            close_price=close_price,
+            time_line=time_line,
+            timestamp_owned=True,
+            close_owned=not np.may_share_memory(close_price, close_column),
+        )
+        return {
+            "time_line": prepared_market.time_line,
+            "timestamp_ms": prepared_market.timestamp_ms,
+            "close": prepared_market.close_price,
+            "price_movement": prepared_market.price_move,
+            "buy_index": np.flatnonzero(buy_signal_dataframe["buy"].to_numpy() == 1),
+            "sell_index": np.flatnonzero(sell_column.to_numpy() == 1),
+        }
 
     def _iterate_each_timeframe(
-        self, symbol: str, signal_dataframe: pd.DataFrame
+        self,
+        symbol: str,
+        prepared_bars: dict[str, np.ndarray],
+        snapshot: Agent_Snapshot = None,
+        rewind: bool = False,
     ) -> Mtm_Result:
         """_summary_
 
         Args:
             symbol (str): _description_
-            signal_dataframe (pd.DataFrame): _description_
+            prepared_bars (dict[str, np.ndarray]): arrays from _prepare_df_for_analysis
+            snapshot (Agent_Snapshot, optional): snapshot of the run to continue.
+                Defaults to None.
+            rewind (bool, optional): reuse the last run of the symbol up to its last
+                checkpoint before the inputs differ. Defaults to False.
 
         Returns:
             Mtm_Result: _description_
         """
-        close_price = signal_dataframe["close"].to_numpy(dtype=float)
-        buy_signal = signal_dataframe["buy"].to_numpy(dtype=int)
-        sell_signal = signal_dataframe["sell"].to_numpy(dtype=int)
-        time_line = signal_dataframe.index
-        price_move = signal_dataframe["price_movement"].to_numpy(dtype=float)
-
-        pnl_ts_data: dict[str, list] = {
-            "timestamp": time_line.tolist(),
-            "pnl_ratio": [0] * len(signal_dataframe),
-            "buy_signal": buy_signal.tolist(),
-            "sell_signal": sell_signal.tolist(),
-            "close_price": close_price.tolist(),
-        }
+        return self._iterate_arrays(
+            symbol=symbol,
+            time_line=prepared_bars["time_line"],
+            timestamp_ms=prepared_bars["timestamp_ms"],
+            close_price=prepared_bars["close"],
+            price_move=prepared_bars["price_movement"],
+            buy_index=prepared_bars["buy_index"],
+            sell_index=prepared_bars["sell_index"],
+            snapshot=snapshot,
+            rewind=rewind,
+        )
 
-        max_pnl: float = 0
-        max_drawdown: float = 0
+    def _iterate_arrays(
+        self,
+        symbol: str,
+        time_line: Sequence[datetime],
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        price_move: np.ndarray,
+        buy_index: np.ndarray,
+        sell_index: np.ndarray,
+        snapshot: Agent_Snapshot = None,
+        rewind: bool = False,
+    ) -> Mtm_Result:
+        """Run the engine over the bar arrays and summarize the run
+        The signals are consumed as events, a signal of each bar is only expanded
+        for the chunked engine and the checkpoints.
 
-        _trade_order_agent: TradeBookKeeperAgent = TradeBookKeeperAgent(
-            symbol=symbol, pnl_config=self.pnl_config, fixed_unit=True
-        )
+        Args:
+            symbol (str): symbol of the asset
+            time_line (Sequence[datetime]): time stamp of each bar
+            timestamp_ms (np.ndarray): time stamp of each bar in ms
+            close_price (np.ndarray): close price
+            price_move (np.ndarray): price diff = price(t) - price(t-1)
+            buy_index (np.ndarray): sorted unique bar index of buy signals
+            sell_index (np.ndarray): sorted unique bar index of sell signals
+            snapshot (Agent_Snapshot, optional): snapshot of the run to continue.
+                Defaults to None.
+            rewind (bool, optional): reuse the last run of the symbol up to its last
+                checkpoint before the inputs differ. Defaults to False.
 
-        self.trade_order_simulator_map[symbol] = _trade_order_agent
+        Returns:
+            Mtm_Result: mtm result
+        """
+        run_start_epoch: int = time.time_ns() // 1_000_000
+        run_start_counter: float = time.perf_counter()
+        started_tracing: bool = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
 
-        for i in range(len(signal_dataframe)):
-            buy_sell_signal: Buy_Sell_Action_Enum = Buy_Sell_Action_Enum.HOLD
+        bar_count: int = len(close_price)
+        buy_signal: np.ndarray = None
+        sell_signal: np.ndarray = None
+        if (
+            rewind
+            or self.checkpoint_interval is not None
+            or (self.engine_mode == Engine_Mode.CHUNKED)
+        ):
+            buy_signal = dense_signal(buy_index, bar_count)
+            sell_signal = dense_signal(sell_index, bar_count)
 
-            if buy_signal[i] == 1:
-                buy_sell_signal = Buy_Sell_Action_Enum.BUY
-            elif sell_signal[i] == 1:
-                buy_sell_signal = Buy_Sell_Action_Enum.SELL
+        start_bar: int = 0
+        _trade_order_agent: TradeBookKeeperAgent = None
+        if rewind:
+            _trade_order_agent, start_bar = self._rewind_retained_agent(
+                symbol=symbol,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                buy_signal=buy_signal,
+                sell_signal=sell_signal,
+            )
+        if _trade_order_agent is None:
+            _trade_order_agent = self._get_trade_order_agent(
+                symbol=symbol, capacity=bar_count
+            )
+
+        self._retain_trade_order_agent(
+            symbol=symbol, trade_order_agent=_trade_order_agent
+        )
 
-            _trade_order_agent.run_at_timestamp(
-                dt=time_line[i],
-                price=close_price[i],
-                price_diff=price_move[i],
-                buy_sell_action=buy_sell_signal,
+        if snapshot is not None:
+            if self.engine_mode == Engine_Mode.FIRST_PASSAGE and (
+                len(snapshot.long_trades_outstanding) > 0
+                or len(snapshot.short_trades_outstanding) > 0
+            ):
+                raise UnSupportedException(
+                    "First passage engine cannot resume a snapshot with outstanding "
+                    "trades"
+                )
+            _trade_order_agent.restore_snapshot(snapshot)
+            # the first new bar moves from the last close of the snapshot
+            price_move = price_move.copy()
+            if len(price_move) > 0:
+                price_move[0] = close_price[0] - snapshot.last_close_price
+
+        # Checkpoints of runs from the first bar, the inputs are kept to compare with
+        # the next run
+        run_checkpoints: RunCheckpoints = None
+        if (
+            self.checkpoint_interval is not None
+            and snapshot is None
+            and self.engine_mode in (Engine_Mode.BAR, Engine_Mode.EVENT)
+        ):
+            run_checkpoints = RunCheckpoints(
+                interval=self.checkpoint_interval,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price.copy(),
+                buy_signal=buy_signal,
+                sell_signal=sell_signal,
+                checkpoints=(
+                    _trade_order_agent.run_checkpoints.checkpoints
+                    if start_bar > 0
+                    else []
+                ),
             )
+        _trade_order_agent.run_checkpoints = run_checkpoints
 
-            pnl_cum_at_this_moment: float = (
-                _trade_order_agent.calculate_pnl_from_mtm_history()
+        if self.engine_mode == Engine_Mode.EVENT:
+            run_event_driven(
+                trade_order_agent=_trade_order_agent,
+                time_line=time_line,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                price_move=price_move,
+                buy_index=buy_index,
+                sell_index=sell_index,
+                start=start_bar,
+                run_checkpoints=run_checkpoints,
+            )
+        elif self.engine_mode == Engine_Mode.FIRST_PASSAGE:
+            run_first_passage(
+                trade_order_agent=_trade_order_agent,
+                pnl_config=self.pnl_config,
+                time_line=time_line,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                price_move=price_move,
+                buy_index=buy_index,
+                sell_index=sell_index,
             )
-            max_pnl = max(max_pnl, pnl_cum_at_this_moment)
-            max_drawdown = max(max_drawdown, max_pnl - pnl_cum_at_this_moment)
-            pnl_ts_data["pnl_ratio"][i] = pnl_cum_at_this_moment
+        elif self.engine_mode == Engine_Mode.CHUNKED:
+            run_chunked_parallel(
+                trade_order_agent=_trade_order_agent,
+                pnl_config=self.pnl_config,
+                time_line=time_line,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                price_move=price_move,
+                buy_signal=buy_signal,
+                sell_signal=sell_signal,
+                n_jobs=self.n_jobs,
+            )
+        else:
+            signal_index, is_buy_signal = merge_signal_index(buy_index, sell_index)
+            signal_pointer: int = int(np.searchsorted(signal_index, start_bar))
+            for i in range(start_bar, bar_count):
+                if run_checkpoints is not None and run_checkpoints.is_due(i):
+                    run_checkpoints.add(_trade_order_agent.create_checkpoint(i))
+                buy_sell_signal: Buy_Sell_Action_Enum = Buy_Sell_Action_Enum.HOLD
 
-        # Summarize the pnl result
-        pnl_ts_data["mtm_ratio"] = _trade_order_agent.mtm_history_value
+                if (
+                    signal_pointer < len(signal_index)
+                    and signal_index[signal_pointer] == i
+                ):
+                    buy_sell_signal = (
+                        Buy_Sell_Action_Enum.BUY
+                        if is_buy_signal[signal_pointer]
+                        else Buy_Sell_Action_Enum.SELL
+                    )
+                    signal_pointer += 1
 
-        _df = pd.DataFrame.from_dict(data=pnl_ts_data)
-        _df.set_index("timestamp", drop=True, inplace=True)
-        sharpe_ratio = _trade_order_agent.calculate_sharpe_ratio()
-        _df["timestamp"] = (pd.to_numeric(_df.index) / 1000000).astype("int64")
+                _trade_order_agent.run_at_timestamp(
+                    dt=time_line[i],
+                    price=close_price[i],
+                    price_diff=price_move[i],
+                    buy_sell_action=buy_sell_signal,
+                    timestamp_ms=timestamp_ms[i],
+                )
 
-        data_in_dict: dict = _df.to_dict(orient="list")
+        if bar_count > 0:
+            _trade_order_agent.last_close_price = float(close_price[-1])
+
+        # Summarize the pnl result
+        mtm_ratio: np.ndarray = _trade_order_agent.mtm_history_value
+        pnl_ratio: np.ndarray = np.cumsum(mtm_ratio, dtype=np.float64)
+        if snapshot is None:
+            pnl: float = _trade_order_agent.calculate_pnl_from_mtm_history()
+            max_drawdown: float = calculate_max_drawdown(pnl_ratio)
+            sharpe_ratio = _trade_order_agent.calculate_sharpe_ratio()
+        else:
+            # summary of the history and the new bars
+            resumed_snapshot: Agent_Snapshot = _trade_order_agent.take_snapshot()
+            pnl_ratio += snapshot.pnl
+            pnl: float = resumed_snapshot.pnl
+            max_drawdown: float = resumed_snapshot.max_drawdown
+            sharpe_ratio = calculate_sharpe_ratio_from_moments(
+                time_period_ms=resumed_snapshot.last_timestamp_ms
+                - resumed_snapshot.first_timestamp_ms,
+                bar_count=resumed_snapshot.bar_count,
+                mtm_mean=resumed_snapshot.mtm_mean,
+                mtm_m2=resumed_snapshot.mtm_m2,
+                profit_slippage=_trade_order_agent.PROFIT_SLIPPAGE,
+            )
+
+        # Dict column form of the timeline, built from the arrays without a DataFrame
+        if self.compact_timeline:
+            data_in_dict: dict[str, np.ndarray] = {
+                "pnl_ratio": pnl_ratio.astype(np.float32),
+                "buy_signal": dense_signal(buy_index, bar_count),
+                "sell_signal": dense_signal(sell_index, bar_count),
+                "close_price": np.array(close_price, dtype=np.float32),
+                "mtm_ratio": mtm_ratio.astype(np.float32),
+                "timestamp": np.array(timestamp_ms, dtype=np.int64),
+            }
+        else:
+            data_in_dict: dict[str, list] = {
+                "pnl_ratio": pnl_ratio.tolist(),
+                "buy_signal": _signal_list(buy_index, bar_count),
+                "sell_signal": _signal_list(sell_index, bar_count),
+                "close_price": np.asarray(close_price).tolist(),
+                "mtm_ratio": mtm_ratio.tolist(),
+                "timestamp": np.asarray(timestamp_ms).tolist(),
+            }
 
         mtm_result: Mtm_Result = Mtm_Result(
-            pnl=_trade_order_agent.calculate_pnl_from_mtm_history(),
+            pnl=pnl,
             max_drawdown=max_drawdown,
             pnl_timeline=data_in_dict,
             sharpe_ratio=sharpe_ratio,
@@ -201,8 +1208,83 @@ class Trade_Mtm_Runner(ITradeSignalRunner):
         mtm_result.short_trades_oustanding.extend(
             _trade_order_agent.outstanding_short_position_list
         )
+        if self.trade_excursion:
+            PriceRangeIndex(
+                timestamp_ms=timestamp_ms, close_price=close_price
+            ).calculate_trade_excursions(
+                mtm_result.long_trades_archive
+                + mtm_result.short_trades_archive
+                + mtm_result.long_trades_outstanding
+                + mtm_result.short_trades_oustanding
+            )
+
+        # Run diagnostics
+        peak_memory_bytes: int = None
+        if self.trace_memory:
+            _, peak_memory_bytes = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+        self._fill_run_diagnostics(
+            mtm_result=mtm_result,
+            trade_order_agent=_trade_order_agent,
+            run_start_epoch=run_start_epoch,
+            elapsed_seconds=time.perf_counter() - run_start_counter,
+            peak_memory_bytes=peak_memory_bytes,
+        )
+        if snapshot is not None:
+            mtm_result.mkt_start_epoch = resumed_snapshot.first_timestamp_ms
+            mtm_result.bar_count = resumed_snapshot.bar_count
+            mtm_result.trades_opened = resumed_snapshot.trades_opened
+            mtm_result.trades_closed_by_reason = (
+                resumed_snapshot.trades_closed_by_reason
+            )
         return mtm_result
 
+    def _fill_run_diagnostics(
+        self,
+        mtm_result: Mtm_Result,
+        trade_order_agent: TradeBookKeeperAgent,
+        run_start_epoch: int,
+        elapsed_seconds: float,
+        peak_memory_bytes: int = None,
+    ) -> None:
+        """Fill the run diagnostics of a finished run into the mtm result
+
+        Args:
+            mtm_result (Mtm_Result): mtm result to fill
+            trade_order_agent (TradeBookKeeperAgent): agent of the finished run
+            run_start_epoch (int): wall clock at the start of the run in ms
+            elapsed_seconds (float): elapsed time of the run in seconds
+            peak_memory_bytes (int, optional): tracemalloc peak of the run. Defaults to
+                None.
+        """
+        timestamp_ms = trade_order_agent.mtm_history_timestamp_ms
+        bar_count: int = len(timestamp_ms)
+        if bar_count > 0:
+            mtm_result.mkt_start_epoch = int(timestamp_ms[0])
+            mtm_result.mkt_end_epoch = int(timestamp_ms[-1])
+        mtm_result.run_start_epoch = run_start_epoch
+        mtm_result.run_end_epoch = run_start_epoch + int(elapsed_seconds * 1000)
+        mtm_result.bar_count = bar_count
+        mtm_result.bars_per_second = (
+            bar_count / elapsed_seconds if elapsed_seconds > 0 else float("inf")
+        )
+
+        archived_trades = (
+            trade_order_agent.archive_long_positions_list
+            + trade_order_agent.archive_short_positions_list
+        )
+        mtm_result.trades_opened = (
+            len(archived_trades)
+            + len(trade_order_agent.outstanding_long_position_list)
+            + len(trade_order_agent.outstanding_short_position_list)
+        )
+        closed_by_reason: dict[str, int] = {r.value: 0 for r in Proxy_Trade_Actions}
+        for trade in archived_trades:
+            closed_by_reason[trade.close_reason.value] += 1
+        mtm_result.trades_closed_by_reason = closed_by_reason
+        mtm_result.peak_memory_bytes = peak_memory_bytes
+
 
 class HyperOptPnlCalculator_Adapter(ITradeSignalRunner):
     def __init__(self, calculator: ITradeSignalRunner) -> None:
@@ -224,11 +1306,109 @@ class HyperOptPnlCalculator_Adapter(ITradeSignalRunner):
         Returns:
             Mtm_Result: [description]
         """
-        mtm_result: Mtm_Result = self._calculator.calculate(
-            symbol=symbol,
-            buy_signal_dataframe=buy_signal_dataframe,
-            sell_signal_dataframe=sell_signal_dataframe,
+        return self._penalize_no_pnl(
+            self._calculator.calculate(
+                symbol=symbol,
+                buy_signal_dataframe=buy_signal_dataframe,
+                sell_signal_dataframe=sell_signal_dataframe,
+            )
+        )
+
+    def calculate_arrays(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_signal: np.ndarray,
+        sell_signal: np.ndarray,
+    ) -> Mtm_Result:
+        """Same as calculate with arrays instead of DataFrames
+
+        Args:
+            symbol (str): symbol of the asset
+            timestamp_ms (np.ndarray): sorted UTC time stamp of each bar in ms
+            close_price (np.ndarray): close price of each bar
+            buy_signal (np.ndarray): buy signal of each bar
+            sell_signal (np.ndarray): sell signal of each bar
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        return self._penalize_no_pnl(
+            self._calculator.calculate_arrays(
+                symbol=symbol,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                buy_signal=buy_signal,
+                sell_signal=sell_signal,
+            )
+        )
+
+    def calculate_events(
+        self,
+        symbol: str,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        buy_events: np.ndarray,
+        sell_events: np.ndarray,
+        events_by_timestamp: bool = False,
+    ) -> Mtm_Result:
+        """Same as calculate_arrays with the signals given as events
+
+        Args:
+            symbol (str): symbol of the asset
+            timestamp_ms (np.ndarray): sorted UTC time stamp of each bar in ms
+            close_price (np.ndarray): close price of each bar
+            buy_events (np.ndarray): bar index of buy signals
+            sell_events (np.ndarray): bar index of sell signals
+            events_by_timestamp (bool, optional): the events are time stamps of bars in
+                ms. Defaults to False.
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        return self._penalize_no_pnl(
+            self._calculator.calculate_events(
+                symbol=symbol,
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                buy_events=buy_events,
+                sell_events=sell_events,
+                events_by_timestamp=events_by_timestamp,
+            )
+        )
+
+    def calculate_table(
+        self,
+        symbol: str,
+        buy_signal_table: Any,
+        sell_signal_table: Any = None,
+        timestamp_column: str = "timestamp",
+    ) -> Mtm_Result:
+        """Same as calculate with an Arrow table or Polars data frame instead of pandas
+
+        Args:
+            symbol (str): symbol of the asset
+            buy_signal_table (Any): table with time stamp, "close" and "buy" columns
+            sell_signal_table (Any, optional): table with time stamp and "sell" columns.
+                Defaults to None, the "sell" column of buy_signal_table.
+            timestamp_column (str, optional): column of the time stamp. Defaults to
+                "timestamp".
+
+        Returns:
+            Mtm_Result: mtm result
+        """
+        return self._penalize_no_pnl(
+            self._calculator.calculate_table(
+                symbol=symbol,
+                buy_signal_table=buy_signal_table,
+                sell_signal_table=sell_signal_table,
+                timestamp_column=timestamp_column,
+            )
         )
+
+    @staticmethod
+    def _penalize_no_pnl(mtm_result: Mtm_Result) -> Mtm_Result:
         if abs(mtm_result.pnl) < 0.000000000001:
             mtm_result.pnl = MIN_NUMERIC_VALUE
             mtm_result.max_drawdown = MAX_NUMERIC_VALUE
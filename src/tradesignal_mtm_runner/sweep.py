@@ -0,0 +1,361 @@
+from __future__ import annotations
+from .config import PnlCalcConfig
+from .helper import ROI_Helper
+from .models import (
+    Proxy_Trade_Actions,
+    Sweep_Result,
+    Fee_Sweep_Result,
+    PROFIT_SLIPPAGE,
+    MIN_NUMERIC_VALUE,
+)
+from .first_passage import (
+    EXIT_SEARCH_CHUNK_SIZE,
+    FirstPassageSignals,
+    TradeInterval,
+    find_trade_intervals,
+    build_mtm_from_trade_intervals,
+)
+from .trade_reward import TradeBookKeeperAgent
+from .exceptions import UnSupportedException
+from .utility import (
+    calculate_max_drawdown,
+    calculate_max_drawdowns,
+    calculate_sharpe_ratio,
+)
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Memory of the cumulative pnl matrix of a chunk of fee sweep combinations
+FEE_SWEEP_CHUNK_BYTES: int = 64 * 1024 * 1024
+
+
+class ExitGridSearcher:
+    """Exit bars of a trade for a grid of stop loss levels and a family of roi tables
+    Trades of a single position per symbol run only depend on the entry bar, direction
+    and the opposite signal bar. For a fixed entry:
+    - a looser stop loss never exits earlier than a tighter one:
+      stop loss |sl| fires at the first bar where the running minimum of pnl < -|sl|,
+      so one running minimum over the price path serves all levels by binary search
+    - each roi table is compared against the same pnl path
+    The exit bars of each entry are searched once and shared by all combinations.
+    """
+
+    def __init__(
+        self,
+        timestamp_ms: np.ndarray,
+        close_price: np.ndarray,
+        stop_loss_grid: list[float],
+        roi_helpers: list[ROI_Helper],
+    ) -> None:
+        """
+        Args:
+            timestamp_ms (np.ndarray): time stamp of each bar in ms
+            close_price (np.ndarray): close price
+            stop_loss_grid (list[float]): stop loss ratios
+            roi_helpers (list[ROI_Helper]): roi helper of each roi table
+        """
+        self.timestamp_ms: np.ndarray = timestamp_ms
+        self.close_price: np.ndarray = close_price
+        self.bar_count: int = len(close_price)
+        # stop loss levels from the tightest to the loosest
+        self._stop_loss_order: np.ndarray = np.argsort(
+            np.abs(stop_loss_grid), kind="stable"
+        )
+        self._sorted_stop_loss: np.ndarray = np.abs(
+            np.asarray(stop_loss_grid, dtype=float)
+        )[self._stop_loss_order]
+        self.roi_helpers: list[ROI_Helper] = roi_helpers
+        # (direction, entry_index) -> (stop loss exit bars, roi exit bars),
+        # bar_count if none
+        self._exit_cache: dict[tuple[int, int], tuple[np.ndarray, np.ndarray]] = {}
+
+    def get_exit_bars(
+        self, direction: int, entry_index: int, end: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get the first bar in (entry_index, end) where each stop loss level
+        and each roi table fires, the end only depends on the entry and direction
+
+        Args:
+            direction (int): +1 long, -1 short
+            entry_index (int): entry bar
+            end (int): bar to stop the search
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: exit bar of each stop loss level in the grid
+                order, exit bar of each roi table, bar_count if not fired
+        """
+        key: tuple[int, int] = (direction, entry_index)
+        if key in self._exit_cache:
+            return self._exit_cache[key]
+
+        entry_price: float = self.close_price[entry_index]
+        sorted_stop_loss_exit: np.ndarray = np.full(
+            len(self._sorted_stop_loss), self.bar_count, dtype=np.int64
+        )
+        roi_exit: np.ndarray = np.full(
+            len(self.roi_helpers), self.bar_count, dtype=np.int64
+        )
+        # stop loss levels before first_open_level have fired
+        first_open_level: int = 0
+        open_roi: list[int] = list(range(len(self.roi_helpers)))
+        running_min_pnl: float = float("inf")
+
+        start: int = entry_index + 1
+        chunk_size: int = EXIT_SEARCH_CHUNK_SIZE
+        while start < end and (
+            first_open_level < len(self._sorted_stop_loss) or len(open_roi) > 0
+        ):
+            chunk_end: int = min(end, start + chunk_size)
+            price: np.ndarray = self.close_price[start:chunk_end]
+            pnl: np.ndarray = (
+                (price - entry_price) if direction == 1 else (entry_price - price)
+            ) / entry_price
+
+            if first_open_level < len(self._sorted_stop_loss):
+                # the running max loss is non-decreasing,
+                # fired levels are a prefix of the grid
+                running_max_loss: np.ndarray = -np.minimum(
+                    np.minimum.accumulate(pnl), running_min_pnl
+                )
+                running_min_pnl = -running_max_loss[-1]
+                fired_bar: np.ndarray = np.searchsorted(
+                    running_max_loss,
+                    self._sorted_stop_loss[first_open_level:],
+                    side="right",
+                )
+                fired_count: int = int(np.count_nonzero(fired_bar < len(pnl)))
+                sorted_stop_loss_exit[
+                    first_open_level : first_open_level + fired_count
+                ] = (start + fired_bar[:fired_count])
+                first_open_level += fired_count
+
+            if len(open_roi) > 0:
+                elapsed_seconds: np.ndarray = (
+                    self.timestamp_ms[start:chunk_end] - self.timestamp_ms[entry_index]
+                ) // 1000
+                still_open_roi: list[int] = []
+                for inx in open_roi:
+                    fired: np.ndarray = pnl > self.roi_helpers[
+                        inx
+                    ].get_take_profit_thresholds(elapsed_seconds)
+                    if fired.any():
+                        roi_exit[inx] = start + int(np.argmax(fired))
+                    else:
+                        still_open_roi.append(inx)
+                open_roi = still_open_roi
+
+            start = chunk_end
+            chunk_size *= 2
+
+        stop_loss_exit: np.ndarray = np.empty_like(sorted_stop_loss_exit)
+        stop_loss_exit[self._stop_loss_order] = sorted_stop_loss_exit
+        self._exit_cache[key] = (stop_loss_exit, roi_exit)
+        return self._exit_cache[key]
+
+    def get_exit_finder(self, stop_loss_inx: int, roi_inx: int):
+        """Exit finder of one combination for find_trade_intervals
+        roi is checked before stop loss at the same bar
+
+        Args:
+            stop_loss_inx (int): index of the stop loss grid
+            roi_inx (int): index of the roi tables
+
+        Returns:
+            Callable: (direction, entry_index, end) -> (exit bar, close reason)
+        """
+
+        def _find_exit(
+            direction: int, entry_index: int, end: int
+        ) -> tuple[int, Proxy_Trade_Actions]:
+            stop_loss_exit, roi_exit = self.get_exit_bars(direction, entry_index, end)
+            stop_loss_bar: int = int(stop_loss_exit[stop_loss_inx])
+            roi_bar: int = int(roi_exit[roi_inx])
+            if roi_bar < self.bar_count and roi_bar <= stop_loss_bar:
+                return roi_bar, Proxy_Trade_Actions.ROI
+            if stop_loss_bar < self.bar_count:
+                return stop_loss_bar, Proxy_Trade_Actions.STOP_LOSS
+            return None, None
+
+        return _find_exit
+
+
+def sweep_stop_loss_and_roi(
+    pnl_config: PnlCalcConfig,
+    stop_loss_grid: list[float],
+    roi_tables: list[dict[int, float]],
+    timestamp_ms: np.ndarray,
+    close_price: np.ndarray,
+    buy_index: np.ndarray,
+    sell_index: np.ndarray,
+) -> list[Sweep_Result]:
+    """Evaluate every combination of stop loss and roi table in one pass over the
+    price path
+    The other settings are taken from pnl_config, which must have
+    max_position_per_symbol=1.
+
+    Args:
+        pnl_config (PnlCalcConfig): base pnl calculation config
+        stop_loss_grid (list[float]): stop loss ratios, e.g. [-0.01, -0.02, -0.05]
+        roi_tables (list[dict[int, float]]): roi tables in the format of
+            PnlCalcConfig.roi
+        timestamp_ms (np.ndarray): time stamp of each bar in ms
+        close_price (np.ndarray): close price
+        buy_index (np.ndarray): sorted bar index of buy signals
+        sell_index (np.ndarray): sorted bar index of sell signals, buy wins if both at
+            the same bar
+
+    Raises:
+        UnSupportedException: max_position_per_symbol is not 1
+
+    Returns:
+        list[Sweep_Result]: result of each combination, roi tables vary fastest
+    """
+    if pnl_config.max_position_per_symbol != 1:
+        raise UnSupportedException(
+            "Stop loss and roi sweep supports max_position_per_symbol=1 only, got "
+            f"{pnl_config.max_position_per_symbol}"
+        )
+    roi_configs: list[PnlCalcConfig] = [
+        pnl_config.copy(update={"roi": PnlCalcConfig(roi=roi).roi})
+        for roi in roi_tables
+    ]
+    searcher: ExitGridSearcher = ExitGridSearcher(
+        timestamp_ms=timestamp_ms,
+        close_price=close_price,
+        stop_loss_grid=stop_loss_grid,
+        roi_helpers=[ROI_Helper(roi_dict=c.roi) for c in roi_configs],
+    )
+    signals: FirstPassageSignals = FirstPassageSignals(
+        buy_index=buy_index, sell_index=sell_index
+    )
+    price_move: np.ndarray = np.append(np.nan, np.diff(close_price))
+
+    results: list[Sweep_Result] = []
+    for stop_loss_inx, stop_loss in enumerate(stop_loss_grid):
+        for roi_inx, roi_config in enumerate(roi_configs):
+            trades: list[TradeInterval] = find_trade_intervals(
+                pnl_config=roi_config,
+                roi_helper=searcher.roi_helpers[roi_inx],
+                timestamp_ms=timestamp_ms,
+                close_price=close_price,
+                signals=signals,
+                exit_finder=searcher.get_exit_finder(stop_loss_inx, roi_inx),
+            )
+            mtm: np.ndarray = build_mtm_from_trade_intervals(
+                trades=trades,
+                close_price=close_price,
+                price_move=price_move,
+                fee_rate=pnl_config.fee_rate,
+                laid_back_tax=pnl_config.laid_back_tax,
+            )
+            results.append(
+                Sweep_Result(
+                    stoploss=stop_loss,
+                    roi=roi_config.roi,
+                    pnl=mtm.sum(),
+                    max_drawdown=calculate_max_drawdown(np.cumsum(mtm)),
+                    sharpe_ratio=calculate_sharpe_ratio(
+                        timestamp_ms=timestamp_ms,
+                        mtm=mtm,
+                        profit_slippage=PROFIT_SLIPPAGE,
+                    ),
+                    trades_opened=len(trades),
+                )
+            )
+    logger.debug(
+        f"sweep {len(results)} combinations with {len(searcher._exit_cache)} exit "
+        "searches"
+    )
+    return results
+
+
+def sweep_fee_and_tax(
+    trade_order_agent: TradeBookKeeperAgent,
+    fee_rates: list[float],
+    laid_back_taxes: list[float],
+    chunk_bytes: int = FEE_SWEEP_CHUNK_BYTES,
+) -> list[Fee_Sweep_Result]:
+    """Evaluate every combination of fee rate and laid back tax from a finished run
+    Opening and closing trades do not depend on the fee rate and laid back tax,
+    they only deduct from the mtm of each bar:
+        mtm(fee, tax) = mtm + fee events * (|run fee| - |fee|)
+                            + flat bars * (|run tax| - |tax|)
+    pnl and sharpe ratio are worked out from sums and covariances of the three series,
+    max drawdown from their cumulative sums in chunks of combinations.
+
+    Args:
+        trade_order_agent (TradeBookKeeperAgent): agent of a finished run
+        fee_rates (list[float]): fee rates of each trade action
+        laid_back_taxes (list[float]): taxes of each bar without position
+        chunk_bytes (int, optional): memory of the cumulative pnl matrix of a chunk.
+            Defaults to FEE_SWEEP_CHUNK_BYTES.
+
+    Returns:
+        list[Fee_Sweep_Result]: result of each combination, laid back taxes vary fastest
+    """
+    timestamp_ms: np.ndarray = trade_order_agent.mtm_history_timestamp_ms
+    mtm: np.ndarray = trade_order_agent.mtm_history_value - PROFIT_SLIPPAGE
+    fee_events: np.ndarray = trade_order_agent.fee_event_history.astype(float)
+    flat_bars: np.ndarray = trade_order_agent.flat_history.astype(float)
+    bar_count: int = len(mtm)
+
+    fee_grid, tax_grid = np.meshgrid(
+        np.abs(np.asarray(fee_rates, dtype=float)),
+        np.abs(np.asarray(laid_back_taxes, dtype=float)),
+        indexing="ij",
+    )
+    fee_delta: np.ndarray = (
+        abs(trade_order_agent.fee_rate_from_pnl_config) - fee_grid.ravel()
+    )
+    tax_delta: np.ndarray = abs(trade_order_agent.laid_back_tax) - tax_grid.ravel()
+
+    # pnl and sharpe ratio
+    pnl: np.ndarray = (
+        trade_order_agent.mtm_history_value.sum()
+        + fee_delta * fee_events.sum()
+        + tax_delta * flat_bars.sum()
+    )
+    centered: list[np.ndarray] = [x - x.mean() for x in (mtm, fee_events, flat_bars)]
+    covariance: np.ndarray = np.array(
+        [[np.mean(x * y) for y in centered] for x in centered]
+    )
+    weights: np.ndarray = np.stack([np.ones_like(fee_delta), fee_delta, tax_delta])
+    variance: np.ndarray = np.einsum("ik,ij,jk->k", weights, covariance, weights)
+    std_profit: np.ndarray = np.sqrt(np.maximum(variance, 0))
+    time_period_hours: float = (timestamp_ms[-1] - timestamp_ms[0]) / 1000 / 3600
+    expected_return: np.ndarray = (
+        pnl - bar_count * PROFIT_SLIPPAGE
+    ) / time_period_hours
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe_ratio: np.ndarray = np.where(
+            std_profit > 0,
+            expected_return / std_profit * np.sqrt(365 * 24),
+            MIN_NUMERIC_VALUE,
+        )
+
+    # max drawdown
+    cum_mtm: np.ndarray = np.cumsum(trade_order_agent.mtm_history_value)
+    cum_fee_events: np.ndarray = np.cumsum(fee_events)
+    cum_flat_bars: np.ndarray = np.cumsum(flat_bars)
+    max_drawdown: np.ndarray = np.empty(len(fee_delta))
+    chunk_size: int = max(1, chunk_bytes // max(1, bar_count * 8))
+    for start in range(0, len(fee_delta), chunk_size):
+        end: int = min(len(fee_delta), start + chunk_size)
+        max_drawdown[start:end] = calculate_max_drawdowns(
+            cum_mtm
+            + fee_delta[start:end, None] * cum_fee_events
+            + tax_delta[start:end, None] * cum_flat_bars
+        )
+
+    return [
+        Fee_Sweep_Result(
+            fee_rate=fee_grid.ravel()[i],
+            laid_back_tax=tax_grid.ravel()[i],
+            pnl=pnl[i],
+            max_drawdown=max_drawdown[i],
+            sharpe_ratio=sharpe_ratio[i],
+        )
+        for i in range(len(fee_delta))
+    ]
@@ -6,11 +6,19 @@ from .models import (
     Proxy_Trade_Actions,
     LongShort_Enum,
     Inventory_Mode,
-    MIN_NUMERIC_VALUE,
+    Agent_Snapshot,
+    PROFIT_SLIPPAGE,
 )
 from .helper import ROI_Helper
+from .position_list import PositionList
+from .checkpoint import AgentCheckpoint, RunCheckpoints
 from datetime import datetime, timedelta
-from .utility import convert_datetime_to_ms
+from .utility import (
+    convert_datetime_to_ms,
+    estimate_memory_bytes,
+    calculate_sharpe_ratio,
+    compensated_sum,
+)
 import logging
 import numpy as np
 import pandas as pd
@@ -35,14 +43,26 @@ class TradeBookKeeperAgent:
     """
 
     def __init__(
-        self, symbol: str, pnl_config: PnlCalcConfig, fixed_unit: bool = True
+        self,
+        symbol: str,
+        pnl_config: PnlCalcConfig,
+        fixed_unit: bool = True,
+        capacity: int = 0,
+        roi_helper: ROI_Helper = None,
+        mtm_dtype: type = np.float64,
     ) -> None:
-        self.outstanding_long_position_list: list[ProxyTrade] = []
-        self.outstanding_short_position_list: list[ProxyTrade] = []
-
-        self.archive_long_positions_list: list[ProxyTrade] = []
-        self.archive_short_positions_list: list[ProxyTrade] = []
-
+        """
+        Args:
+            symbol (str): symbol of the asset
+            pnl_config (PnlCalcConfig): pnl calculation config
+            fixed_unit (bool, optional): fixed stake unit. Defaults to True.
+            capacity (int, optional): number of bars to preallocate in the mtm history.
+                Defaults to 0.
+            roi_helper (ROI_Helper, optional): shared ROI helper built from
+                pnl_config.roi. Defaults to None.
+            mtm_dtype (type, optional): dtype of the mtm history, np.float32 in compact
+                mode. Defaults to np.float64.
+        """
         self.symbol = symbol
         self.enable_short_position = pnl_config.enable_short_position
         self.fixed_unit = fixed_unit
@@ -50,22 +70,312 @@ class TradeBookKeeperAgent:
 
         self.stop_loss: float = pnl_config.stoploss
 
-        self._mtm_history = {"timestamp_ms": [], "mtm": []}  # Integer in ms  # float
-
-        self.roi_helper = ROI_Helper(pnl_config.roi)
+        # Preallocated mtm history, only the first _history_size items are valid
+        self._mtm_dtype: type = mtm_dtype
+        self._timestamp_ms_buffer: np.ndarray = np.empty(capacity, dtype=np.int64)
+        self._mtm_buffer: np.ndarray = np.empty(capacity, dtype=mtm_dtype)
+        # trade actions charged with fee and bars charged with laid back tax
+        self._fee_event_buffer: np.ndarray = np.empty(capacity, dtype=np.int32)
+        self._flat_buffer: np.ndarray = np.empty(capacity, dtype=bool)
+        self._history_size: int = 0
+
+        self.roi_helper = (
+            roi_helper if roi_helper is not None else ROI_Helper(pnl_config.roi)
+        )
         self.inventory_mode = Inventory_Mode.FIFO
-        self.PROFIT_SLIPPAGE: float = 0.000001
+        self.PROFIT_SLIPPAGE: float = PROFIT_SLIPPAGE
         self.fee_rate_from_pnl_config: float = pnl_config.fee_rate
         self.laid_back_tax: float = pnl_config.laid_back_tax
+        self.reset()
         pass
 
+    def reset(self, capacity: int = 0) -> None:
+        """Reset the agent for a new run
+        The mtm history buffers are kept and only reallocated if they are shorter than
+        capacity
+
+        Args:
+            capacity (int, optional): number of bars expected in the new run. Defaults
+                to 0.
+        """
+        self._set_outstanding_positions(long_trades=[], short_trades=[])
+
+        self.archive_long_positions_list: list[ProxyTrade] = []
+        self.archive_short_positions_list: list[ProxyTrade] = []
+        # snapshot of the run continued by this run, and close price of the last bar
+        self.resumed_from: Agent_Snapshot = None
+        self.last_close_price: float = np.nan
+        # checkpoints of the run to re-simulate it with other signals
+        self.run_checkpoints: RunCheckpoints = None
+
+        if capacity > len(self._mtm_buffer):
+            self._timestamp_ms_buffer = np.empty(capacity, dtype=np.int64)
+            self._mtm_buffer = np.empty(capacity, dtype=self._mtm_dtype)
+            self._fee_event_buffer = np.empty(capacity, dtype=np.int32)
+            self._flat_buffer = np.empty(capacity, dtype=bool)
+        self._history_size = 0
+
+    def _set_outstanding_positions(
+        self, long_trades: list[ProxyTrade], short_trades: list[ProxyTrade]
+    ) -> None:
+        self.outstanding_long_position_list: PositionList = PositionList(long_trades)
+        self.outstanding_short_position_list: PositionList = PositionList(short_trades)
+        for position_list in (
+            self.outstanding_long_position_list,
+            self.outstanding_short_position_list,
+        ):
+            position_list.enable_trigger_index(
+                stop_loss=self.stop_loss, roi_helper=self.roi_helper
+            )
+
+    def create_checkpoint(self, bar_index: int) -> AgentCheckpoint:
+        """Checkpoint the agent before the bar is run
+
+        Args:
+            bar_index (int): bar about to run
+
+        Returns:
+            AgentCheckpoint: checkpoint
+        """
+        return AgentCheckpoint(
+            bar_index=bar_index,
+            history_size=self._history_size,
+            archive_long_count=len(self.archive_long_positions_list),
+            archive_short_count=len(self.archive_short_positions_list),
+            long_trades_outstanding=[
+                t.copy(deep=True) for t in self.outstanding_long_position_list
+            ],
+            short_trades_outstanding=[
+                t.copy(deep=True) for t in self.outstanding_short_position_list
+            ],
+        )
+
+    def rewind(self, checkpoint: AgentCheckpoint) -> None:
+        """Rewind the agent of the same run back to a checkpoint,
+        the mtm history and trade archives after the checkpoint are dropped
+
+        Args:
+            checkpoint (AgentCheckpoint): checkpoint taken in this run
+        """
+        assert (
+            checkpoint.history_size <= self._history_size
+        ), "checkpoint of another run"
+        self._history_size = checkpoint.history_size
+        del self.archive_long_positions_list[checkpoint.archive_long_count :]
+        del self.archive_short_positions_list[checkpoint.archive_short_count :]
+        self._set_outstanding_positions(
+            long_trades=[t.copy(deep=True) for t in checkpoint.long_trades_outstanding],
+            short_trades=[
+                t.copy(deep=True) for t in checkpoint.short_trades_outstanding
+            ],
+        )
+
+    def restore_snapshot(self, snapshot: Agent_Snapshot) -> None:
+        """Continue the run of a snapshot, the agent should be freshly reset
+        The outstanding trades are copied so the snapshot is left untouched
+
+        Args:
+            snapshot (Agent_Snapshot): snapshot of the previous run
+        """
+        assert snapshot.symbol == self.symbol, f"snapshot of {snapshot.symbol}"
+        assert (
+            self._history_size == 0
+        ), "agent should be reset before restoring a snapshot"
+        self.resumed_from = snapshot
+        self.last_close_price = snapshot.last_close_price
+        self.outstanding_long_position_list.extend(
+            t.copy(deep=True) for t in snapshot.long_trades_outstanding
+        )
+        self.outstanding_short_position_list.extend(
+            t.copy(deep=True) for t in snapshot.short_trades_outstanding
+        )
+
+    def take_snapshot(self) -> Agent_Snapshot:
+        """Snapshot the agent at the last bar, the running summary covers the resumed
+        snapshot and the mtm history of this run
+
+        Returns:
+            Agent_Snapshot: snapshot to resume the run
+        """
+        base: Agent_Snapshot = self.resumed_from
+        mtm: np.ndarray = self.mtm_history_value
+        assert len(mtm) > 0 or base is not None, "no bar to snapshot"
+
+        # Drawdown continues from the running peak of the resumed snapshot
+        base_pnl: float = base.pnl if base is not None else 0
+        base_peak_pnl: float = base.peak_pnl if base is not None else 0
+        max_drawdown: float = base.max_drawdown if base is not None else 0
+        pnl_cumulative: np.ndarray = base_pnl + np.cumsum(mtm, dtype=np.float64)
+        running_peak: np.ndarray = np.maximum.accumulate(
+            np.maximum(pnl_cumulative, base_peak_pnl)
+        )
+        if len(mtm) > 0:
+            max_drawdown = max(
+                max_drawdown, float((running_peak - pnl_cumulative).max())
+            )
+
+        # Merge the mean and squared deviations of both parts
+        base_count: int = base.bar_count if base is not None else 0
+        base_mean: float = base.mtm_mean if base is not None else 0
+        bar_count: int = base_count + len(mtm)
+        mtm_mean: float = (
+            float(mtm.mean(dtype=np.float64)) if len(mtm) > 0 else base_mean
+        )
+        delta: float = mtm_mean - base_mean
+        mtm_m2: float = (
+            (base.mtm_m2 if base is not None else 0)
+            + float((np.subtract(mtm, mtm_mean, dtype=np.float64) ** 2).sum())
+            + delta**2 * base_count * len(mtm) / bar_count
+        )
+
+        closed_by_reason: dict[str, int] = {r.value: 0 for r in Proxy_Trade_Actions}
+        if base is not None:
+            for reason, count in base.trades_closed_by_reason.items():
+                closed_by_reason[reason] += count
+        archived_trades: list[ProxyTrade] = (
+            self.archive_long_positions_list + self.archive_short_positions_list
+        )
+        for trade in archived_trades:
+            closed_by_reason[trade.close_reason.value] += 1
+        # trades restored from the base snapshot are already counted as opened
+        trades_opened: int = (
+            len(archived_trades)
+            + len(self.outstanding_long_position_list)
+            + len(self.outstanding_short_position_list)
+        )
+        if base is not None:
+            trades_opened += (
+                base.trades_opened
+                - len(base.long_trades_outstanding)
+                - len(base.short_trades_outstanding)
+            )
+
+        return Agent_Snapshot(
+            symbol=self.symbol,
+            first_timestamp_ms=(
+                base.first_timestamp_ms
+                if base is not None
+                else int(self.mtm_history_timestamp_ms[0])
+            ),
+            last_timestamp_ms=(
+                int(self.mtm_history_timestamp_ms[-1])
+                if len(mtm) > 0
+                else base.last_timestamp_ms
+            ),
+            last_close_price=self.last_close_price,
+            bar_count=bar_count,
+            pnl=float(pnl_cumulative[-1]) if len(mtm) > 0 else base_pnl,
+            peak_pnl=float(running_peak[-1]) if len(mtm) > 0 else base_peak_pnl,
+            max_drawdown=max_drawdown,
+            mtm_mean=base_mean + delta * len(mtm) / bar_count,
+            mtm_m2=mtm_m2,
+            trades_opened=trades_opened,
+            trades_closed_by_reason=closed_by_reason,
+            long_trades_outstanding=[
+                t.copy(deep=True) for t in self.outstanding_long_position_list
+            ],
+            short_trades_outstanding=[
+                t.copy(deep=True) for t in self.outstanding_short_position_list
+            ],
+        )
+
+    def _grow_history_buffers(self, new_capacity: int) -> None:
+        self._timestamp_ms_buffer = np.resize(self._timestamp_ms_buffer, new_capacity)
+        self._mtm_buffer = np.resize(self._mtm_buffer, new_capacity)
+        self._fee_event_buffer = np.resize(self._fee_event_buffer, new_capacity)
+        self._flat_buffer = np.resize(self._flat_buffer, new_capacity)
+
+    def _record_mtm_history(
+        self,
+        timestamp_ms: int,
+        mtm: float,
+        fee_event_count: int = 0,
+        is_flat: bool = False,
+    ) -> None:
+        """Append a bar to the mtm history, grow the buffers if they are full
+
+        Args:
+            timestamp_ms (int): timestamp of the bar in ms
+            mtm (float): mtm of the bar
+            fee_event_count (int, optional): number of trade actions charged with fee.
+                Defaults to 0.
+            is_flat (bool, optional): charged with laid back tax. Defaults to False.
+        """
+        if self._history_size == len(self._mtm_buffer):
+            self._grow_history_buffers(max(16, 2 * len(self._mtm_buffer)))
+        self._timestamp_ms_buffer[self._history_size] = timestamp_ms
+        self._mtm_buffer[self._history_size] = mtm
+        self._fee_event_buffer[self._history_size] = fee_event_count
+        self._flat_buffer[self._history_size] = is_flat
+        self._history_size += 1
+
+    def run_idle_bars(self, timestamp_ms: np.ndarray, price_diff: np.ndarray) -> None:
+        """Record a stretch of bars without any signal and without any trade to close
+        The mtm of each bar is the aggregated exposure of the outstanding trades times
+        the price diff, or the laid back tax if there is no outstanding trade
+
+        Args:
+            timestamp_ms (np.ndarray): timestamp of the bars in ms
+            price_diff (np.ndarray): price diff = price(t) - price(t-1) of the bars
+        """
+        is_flat: bool = self._is_flat()
+        if is_flat:
+            mtm: np.ndarray = np.full(len(timestamp_ms), -abs(self.laid_back_tax))
+        else:
+            mtm: np.ndarray = (
+                self.outstanding_long_position_list.exposure * price_diff
+                + self.outstanding_short_position_list.exposure * price_diff
+            )
+        self.record_mtm_history_bulk(
+            timestamp_ms=timestamp_ms, mtm=mtm, is_flat=is_flat
+        )
+
+    def record_mtm_history_bulk(
+        self,
+        timestamp_ms: np.ndarray,
+        mtm: np.ndarray,
+        fee_event_count: np.ndarray = 0,
+        is_flat: np.ndarray = False,
+    ) -> None:
+        """Append a stretch of bars to the mtm history
+
+        Args:
+            timestamp_ms (np.ndarray): timestamp of the bars in ms
+            mtm (np.ndarray): mtm of the bars
+            fee_event_count (np.ndarray, optional): number of trade actions charged with
+                fee of the bars. Defaults to 0.
+            is_flat (np.ndarray, optional): bars charged with laid back tax. Defaults to
+                False.
+        """
+        end: int = self._history_size + len(timestamp_ms)
+        if end > len(self._mtm_buffer):
+            self._grow_history_buffers(max(end, 2 * len(self._mtm_buffer)))
+        self._timestamp_ms_buffer[self._history_size : end] = timestamp_ms
+        self._mtm_buffer[self._history_size : end] = mtm
+        self._fee_event_buffer[self._history_size : end] = fee_event_count
+        self._flat_buffer[self._history_size : end] = is_flat
+        self._history_size = end
+
+    @property
+    def mtm_history_value(self) -> np.ndarray:
+        """mtm history of the run
+        It is a view on the agent buffer, copy it before the agent is reset or reused
+        """
+        return self._mtm_buffer[: self._history_size]
+
+    @property
+    def mtm_history_timestamp_ms(self) -> np.ndarray:
+        return self._timestamp_ms_buffer[: self._history_size]
+
     @property
-    def mtm_history_value(self) -> list[float]:
-        return self._mtm_history["mtm"]
+    def fee_event_history(self) -> np.ndarray:
+        """number of trade actions charged with fee at each bar of the mtm history"""
+        return self._fee_event_buffer[: self._history_size]
 
     @property
-    def mtm_history_timestamp_ms(self) -> list[int]:
-        return self._mtm_history["timestamp_ms"]
+    def flat_history(self) -> np.ndarray:
+        """bars of the mtm history charged with laid back tax"""
+        return self._flat_buffer[: self._history_size]
 
     @property
     def mtm_history_panda_df(self) -> pd.DataFrame:
@@ -78,12 +388,38 @@ class TradeBookKeeperAgent:
         df["timestamp_ms"] = pd.to_datetime(df["timestamp_ms"], unit="ms")
         return df
 
+    def memory_footprint(self) -> dict[str, int]:
+        """Estimate the bytes held by the agent
+
+        Returns:
+            dict[str, int]: bytes of "timeline", "trade_archive", "outstanding_trades"
+                and the remaining "agent" objects
+        """
+        seen: set = set()
+        footprint: dict[str, int] = {
+            "timeline": estimate_memory_bytes(self._timestamp_ms_buffer, seen)
+            + estimate_memory_bytes(self._mtm_buffer, seen)
+            + estimate_memory_bytes(self._fee_event_buffer, seen)
+            + estimate_memory_bytes(self._flat_buffer, seen),
+            "trade_archive": estimate_memory_bytes(
+                self.archive_long_positions_list, seen
+            )
+            + estimate_memory_bytes(self.archive_short_positions_list, seen),
+            "outstanding_trades": estimate_memory_bytes(
+                self.outstanding_long_position_list, seen
+            )
+            + estimate_memory_bytes(self.outstanding_short_position_list, seen),
+        }
+        footprint["agent"] = estimate_memory_bytes(self, seen)
+        return footprint
+
     def run_at_timestamp(
         self,
         dt: datetime,
         price: float,
         price_diff: float,
         buy_sell_action: Buy_Sell_Action_Enum,
+        timestamp_ms: int = None,
     ) -> None:
         """Run the book keeper at a given timestamp
 
@@ -92,21 +428,17 @@ class TradeBookKeeperAgent:
             price (float): price at the timestamp
             price_diff(float): price diff = price(t) - price(t-1
             buy_sell_action (Buy_Sell_Action_Enum): Buy/Sell/Hold
+            timestamp_ms (int, optional): time stamp in ms, converted from dt if not
+                given
         """
         accumulated_fee: float = 0
-        # 1. Calculate MTM
-        mtm_at_time_t = 0
-        for trade in (
-            self.outstanding_long_position_list + self.outstanding_short_position_list
-        ):
-            if dt <= trade.entry_datetime or (
-                trade.exit_datetime is not None and trade.exit_datetime < dt
-            ):
-                logger.debug(f"exclude {trade.entry_datetime} <= {dt}")
-                continue
-            normalized_mtm = trade.calculate_mtm_normalized(price_diff=price_diff)
-            mtm_at_time_t += normalized_mtm
-        self._mtm_history["timestamp_ms"].append(convert_datetime_to_ms(dt))
+        trade_action_count: int = self._count_trade_actions()
+        # 1. Calculate MTM from the aggregated exposure of the outstanding trades
+        mtm_at_time_t = self.outstanding_long_position_list.calculate_mtm_normalized(
+            dt=dt, price_diff=price_diff
+        ) + self.outstanding_short_position_list.calculate_mtm_normalized(
+            dt=dt, price_diff=price_diff
+        )
 
         # 2. Check if we need to close any position with ROI in each trade
         # a. Long position
@@ -159,20 +491,43 @@ class TradeBookKeeperAgent:
             )
 
         # 5. Adjust with laid back tax
+        is_flat: bool = self._is_flat()
         accumulated_fee += self._check_if_laid_back_tax()
 
         # 6. Adjust MTM with fee rate
         # Store the final mtm values
-        self._mtm_history["mtm"].append(mtm_at_time_t - accumulated_fee)
+        self._record_mtm_history(
+            timestamp_ms=(
+                timestamp_ms if timestamp_ms is not None else convert_datetime_to_ms(dt)
+            ),
+            mtm=mtm_at_time_t - accumulated_fee,
+            fee_event_count=self._count_trade_actions() - trade_action_count,
+            is_flat=is_flat,
+        )
 
         pass
 
-    def _check_if_laid_back_tax(self) -> float:
-        """Check if we need to pay laid back tax"""
-        if (
+    def _is_flat(self) -> bool:
+        return (
             len(self.outstanding_long_position_list) == 0
             and len(self.outstanding_short_position_list) == 0
-        ):
+        )
+
+    def _count_trade_actions(self) -> int:
+        """Number of trade actions charged with fee so far: each trade is opened once
+        and each archived trade is closed once"""
+        archived: int = len(self.archive_long_positions_list) + len(
+            self.archive_short_positions_list
+        )
+        return (
+            2 * archived
+            + len(self.outstanding_long_position_list)
+            + len(self.outstanding_short_position_list)
+        )
+
+    def _check_if_laid_back_tax(self) -> float:
+        """Check if we need to pay laid back tax"""
+        if self._is_flat():
             return abs(self.laid_back_tax)
         return 0
 
@@ -180,37 +535,34 @@ class TradeBookKeeperAgent:
         self,
         price: float,
         dt: datetime,
-        live_positions: list[ProxyTrade],
+        live_positions: PositionList,
         archive_positions: list[ProxyTrade],
     ) -> float:
         """Check if we can close the position with ROI
+        Every trade reaching its roi at price is closed at this bar.
 
         Args:
             price (float): price at the timestamp
             dt (datetime): time stamp
-            live_positions (list[ProxyTrade]): Live position list
+            live_positions (PositionList): Live position list
             archive_positions (list[ProxyTrade]): archive position list
 
         Returns:
             fee_rate (float): adjusted fee
         """
         accum_fee: float = 0
-        for trade in live_positions:
-            cur_pnl: float = trade.calculate_pnl_normalized(price=price)
-            if self.roi_helper.can_take_profit(
-                entry_date=trade.entry_datetime, current_date=dt, normalized_pnl=cur_pnl
-            ):
-                # Close the trade
-                self._close_trade_position_helper(
-                    trade=trade,
-                    price=price,
-                    dt=dt,
-                    archive_positions=archive_positions,
-                    live_positions=live_positions,
-                    close_reason=Proxy_Trade_Actions.ROI,
-                )
-                accum_fee += abs(trade.fee_normalized)
-                logger.debug(f"Close trade with ROI:{trade}")
+        for trade in live_positions.pop_roi_triggered(price=price, dt=dt):
+            # Close the trade
+            self._close_trade_position_helper(
+                trade=trade,
+                price=price,
+                dt=dt,
+                archive_positions=archive_positions,
+                live_positions=live_positions,
+                close_reason=Proxy_Trade_Actions.ROI,
+            )
+            accum_fee += abs(trade.fee_normalized)
+            logger.debug(f"Close trade with ROI:{trade}")
 
         return accum_fee
 
@@ -218,39 +570,38 @@ class TradeBookKeeperAgent:
         self,
         price: float,
         dt: datetime,
-        live_positions: list[ProxyTrade],
+        live_positions: PositionList,
         archive_positions: list[ProxyTrade],
     ) -> float:
         """Check if we can close the position with stop/loss
+        Every trade hitting the stop loss at price is closed at this bar.
 
         Args:
             price (float): price at the timestamp
             dt (datetime): time stamp
-            live_positions (list[ProxyTrade]): Live position list
+            live_positions (PositionList): Live position list
             archive_positions (list[ProxyTrade]): archive position list
 
         Returns:
             fee_rate (float): adjusted fee
         """
         accum_fee: float = 0
-        for trade in live_positions:
-            cur_pnl: float = trade.calculate_pnl_normalized(price=price)
-
-            if cur_pnl < -(abs(self.stop_loss)):
-                # Close the trade
-                logger.debug(
-                    f"Close trade with stop loss:{trade}  at price {price} pnl:{cur_pnl} - {self.stop_loss}"
-                )
-
-                self._close_trade_position_helper(
-                    trade=trade,
-                    price=price,
-                    dt=dt,
-                    archive_positions=archive_positions,
-                    live_positions=live_positions,
-                    close_reason=Proxy_Trade_Actions.STOP_LOSS,
-                )
-                accum_fee += abs(trade.fee_normalized)
+        for trade in live_positions.pop_stop_loss_triggered(price=price, dt=dt):
+            # Close the trade
+            logger.debug(
+                f"Close trade with stop loss:{trade}  at price {price} - "
+                f"{self.stop_loss}"
+            )
+
+            self._close_trade_position_helper(
+                trade=trade,
+                price=price,
+                dt=dt,
+                archive_positions=archive_positions,
+                live_positions=live_positions,
+                close_reason=Proxy_Trade_Actions.STOP_LOSS,
+            )
+            accum_fee += abs(trade.fee_normalized)
 
         return accum_fee
 
@@ -378,7 +729,8 @@ class TradeBookKeeperAgent:
         return abs(trade.fee_normalized)
 
     def _get_trade_to_close(self, long_short: LongShort_Enum) -> ProxyTrade:
-        """Get the trade to close
+        """Get the trade to close, the trade stays in the outstanding list
+        until it is closed by _close_trade_position_helper
         Args:
             long_short (LongShort_Enum): long or short
         Returns:
@@ -388,37 +740,34 @@ class TradeBookKeeperAgent:
             long_short == LongShort_Enum.LONG
             and len(self.outstanding_long_position_list) > 0
         ):
-            self.outstanding_long_position_list = sorted(
-                self.outstanding_long_position_list
-            )
+            self.outstanding_long_position_list.sort()
             logger.debug(
                 f"get trade to close outstanding_long_position_list:{self.outstanding_long_position_list}"
             )
-            return self.outstanding_long_position_list.pop(0)
+            return self.outstanding_long_position_list[0]
         elif (
             long_short == LongShort_Enum.SHORT
             and len(self.outstanding_short_position_list) > 0
         ):
             # heapq.heapify(self.outstanding_short_position_list)
-            self.outstanding_short_position_list = sorted(
-                self.outstanding_short_position_list
-            )
+            self.outstanding_short_position_list.sort()
             logger.debug(
                 f"get trade to close outstanding_short_position_list:{self.outstanding_short_position_list}"
             )
-            return self.outstanding_short_position_list.pop(0)
+            return self.outstanding_short_position_list[0]
         else:
             return None
 
     def calculate_pnl_from_mtm_history(self) -> float:
         """calculate pnl recorded in the mtm history
+        float32 mtm history of the compact mode is summed up with compensated summation
 
         Returns:
             float: total pnl
         """
-
-        mtm_array = np.array(self.mtm_history_value)
-        return mtm_array.sum()
+        if self._mtm_dtype != np.float64:
+            return compensated_sum(self.mtm_history_value)
+        return self.mtm_history_value.sum()
 
     def calculate_sharpe_ratio(self) -> tuple[float]:
         """Calculate sharpe ratio
@@ -428,24 +777,12 @@ class TradeBookKeeperAgent:
         Returns:
             Tuple[float, pd.Dataframe ]: sharpe ratio, Dataframe: column, pnl daily
         """
-        df: pd.DataFrame = pd.DataFrame(data=self._mtm_history)
-        df.set_index("timestamp_ms", inplace=True, drop=True)
-
-        # pnl_ts_data_daily: pd.DataFrame = df.resample("1H").sum()
-        period_seconds: int = (df.index[-1] - df.index[0]) / 1000
-        time_period_hours: int = period_seconds / 3600
-        df["mtm_slippage"] = df["mtm"] - self.PROFIT_SLIPPAGE
-        total_profit = df["mtm_slippage"]
-        expected_yearly_return = total_profit.sum() / time_period_hours
-        std_profit = np.std(total_profit)
-        sharpe_ratio: float = (
-            expected_yearly_return / std_profit * np.sqrt(365 * 24)
-            if std_profit != 0
-            else MIN_NUMERIC_VALUE  # float("-inf")
-        )
-        logger.debug(
-            f"time_period_hours:{time_period_hours}, mtm: {total_profit.sum()}, expected_yearly_return: {expected_yearly_return}, std_profit: {std_profit}, sharpe_ratio: {sharpe_ratio}"
+        sharpe_ratio: float = calculate_sharpe_ratio(
+            timestamp_ms=self.mtm_history_timestamp_ms,
+            mtm=self.mtm_history_value,
+            profit_slippage=self.PROFIT_SLIPPAGE,
         )
+        logger.debug(f"sharpe_ratio: {sharpe_ratio}")
 
         return sharpe_ratio
 
@@ -1,7 +1,159 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+import math
+import sys
+import numpy as np
+from .models import MIN_NUMERIC_VALUE
+
+EPOCH: datetime = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 def convert_datetime_to_ms(dt: datetime) -> int:
-    return int(dt.timestamp() * 1000)
+    # naive time stamps are UTC, the same as pandas Timestamp
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    # integer arithmetic, float seconds * 1000 may round to the ms before
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
 
 def convert_ms_to_datetime(ms: int) -> datetime:
-    return datetime.fromtimestamp(ms / 1000)
\ No newline at end of file
+    # naive UTC time stamp, the inverse of convert_datetime_to_ms in any local time zone
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def estimate_memory_bytes(obj, _seen: set = None) -> int:
+    """Estimate the bytes held by an object and everything it references
+    Objects referenced more than once are counted once.
+    Classes, enum members and modules are shared and not counted.
+
+    Args:
+        obj (Any): object to measure
+
+    Returns:
+        int: estimated bytes
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or isinstance(obj, (type, Enum)) or callable(obj):
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        # views do not own their data, the base array does
+        return sys.getsizeof(obj) + (
+            estimate_memory_bytes(obj.base, _seen) if obj.base is not None else 0
+        )
+    size: int = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(
+            estimate_memory_bytes(k, _seen) + estimate_memory_bytes(v, _seen)
+            for k, v in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_memory_bytes(v, _seen) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_memory_bytes(vars(obj), _seen)
+    return size
+
+
+def calculate_max_drawdown(pnl_cumulative: np.ndarray) -> float:
+    """calculate max drawdown of a cumulative pnl series
+    the running peak starts at zero pnl
+
+    Args:
+        pnl_cumulative (np.ndarray): cumulative pnl
+
+    Returns:
+        float: max drawdown
+    """
+    if len(pnl_cumulative) == 0:
+        return 0
+    running_peak: np.ndarray = np.maximum.accumulate(np.maximum(pnl_cumulative, 0))
+    return max(0, float((running_peak - pnl_cumulative).max()))
+
+
+def calculate_max_drawdowns(pnl_cumulative: np.ndarray) -> np.ndarray:
+    """vectorized calculate_max_drawdown over the rows of a matrix
+
+    Args:
+        pnl_cumulative (np.ndarray): cumulative pnl, one series per row
+
+    Returns:
+        np.ndarray: max drawdown of each row
+    """
+    if pnl_cumulative.shape[-1] == 0:
+        return np.zeros(pnl_cumulative.shape[:-1])
+    running_peak: np.ndarray = np.maximum.accumulate(
+        np.maximum(pnl_cumulative, 0), axis=-1
+    )
+    return np.maximum(0, (running_peak - pnl_cumulative).max(axis=-1))
+
+
+def calculate_sharpe_ratio(
+    timestamp_ms: np.ndarray, mtm: np.ndarray, profit_slippage: float = 0
+) -> float:
+    """calculate the annualized sharpe ratio of a mtm series
+    expected return per hour / std of mtm * sqrt(hours of a year)
+
+    Args:
+        timestamp_ms (np.ndarray): time stamp of each mtm in ms
+        mtm (np.ndarray): mtm of each bar
+        profit_slippage (float, optional): slippage deducted from each mtm. Defaults to
+            0.
+
+    Returns:
+        float: sharpe ratio, MIN_NUMERIC_VALUE if the mtm has no variation
+    """
+    time_period_hours: float = (timestamp_ms[-1] - timestamp_ms[0]) / 1000 / 3600
+    # float32 mtm of the compact mode is summed up in float64
+    total_profit: np.ndarray = np.subtract(mtm, profit_slippage, dtype=np.float64)
+    std_profit: float = np.std(total_profit)
+    if std_profit == 0:
+        return MIN_NUMERIC_VALUE
+    expected_yearly_return: float = total_profit.sum() / time_period_hours
+    return expected_yearly_return / std_profit * np.sqrt(365 * 24)
+
+
+def compensated_sum(values: np.ndarray) -> float:
+    """Sum with exact partial sums (math.fsum), the result is correctly rounded
+    whatever the number and the dtype of the values.
+    numpy sums float32 in float32, which loses about log2(n) bits of precision.
+
+    Args:
+        values (np.ndarray): values to sum
+
+    Returns:
+        float: sum of the values
+    """
+    return math.fsum(np.asarray(values, dtype=np.float64).tolist())
+
+
+def calculate_sharpe_ratio_from_moments(
+    time_period_ms: int,
+    bar_count: int,
+    mtm_mean: float,
+    mtm_m2: float,
+    profit_slippage: float = 0,
+) -> float:
+    """calculate_sharpe_ratio from the running mean and sum of squared deviations of the
+    mtm
+
+    Args:
+        time_period_ms (int): time between the first and the last mtm in ms
+        bar_count (int): number of mtm
+        mtm_mean (float): mean of the mtm
+        mtm_m2 (float): sum of squared deviations of the mtm from the mean
+        profit_slippage (float, optional): slippage deducted from each mtm. Defaults to
+            0.
+
+    Returns:
+        float: sharpe ratio, MIN_NUMERIC_VALUE if the mtm has no variation
+    """
+    std_profit: float = np.sqrt(max(mtm_m2, 0) / bar_count) if bar_count > 0 else 0
+    if std_profit == 0:
+        return MIN_NUMERIC_VALUE
+    time_period_hours: float = time_period_ms / 1000 / 3600
+    expected_yearly_return: float = (
+        bar_count * (mtm_mean - profit_slippage) / time_period_hours
+    )
+    return expected_yearly_return / std_profit * np.sqrt(365 * 24)
@@ -96,3 +96,47 @@ def get_test_pnl_calc_config() -> PnlCalcConfig:
         return pnl_calc_config
 
     return _get_config
+
+
+@pytest.fixture
+def get_test_random_walk_mkt_data() -> pd.DataFrame:
+    def _get_data(
+        dim: int = 1000, signal_ratio: float = 0.02, seed: int = 0
+    ) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        df = pd.DataFrame(
+            data={
+                "timestamp": pd.date_range(
+                    start=datetime(2023, 1, 1), periods=dim, freq=timedelta(minutes=15)
+                ),
+                "inx": np.arange(dim),
+            }
+        )
+        df.set_index("timestamp", inplace=True, drop=True)
+        df["close"] = 1000 * np.exp(np.cumsum(rng.normal(0, 0.004, dim)))
+        df["buy"] = (rng.random(dim) < signal_ratio).astype(int)
+        df["sell"] = (rng.random(dim) < signal_ratio).astype(int)
+        df["price_movement"] = df["close"].diff()
+        return df
+
+    return _get_data
+
+
+@pytest.fixture
+def get_test_trigger_pnl_calc_config() -> PnlCalcConfig:
+    def _get_config(
+        enable_short_position: bool = True,
+        max_position_per_symbol: int = 1,
+        fee_rate: float = 0.001,
+        laid_back_tax: float = 0.0001,
+    ) -> PnlCalcConfig:
+        return PnlCalcConfig(
+            roi={0: 0.03, 60: 0.015, 240: 0.005},
+            stoploss=-0.02,
+            enable_short_position=enable_short_position,
+            max_position_per_symbol=max_position_per_symbol,
+            fee_rate=fee_rate,
+            laid_back_tax=laid_back_tax,
+        )
+
+    return _get_config
@@ -0,0 +1,84 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import Mtm_Result
+from tradesignal_mtm_runner.bootstrap import (
+    ResampleDistribution,
+    block_bootstrap_mtm,
+    shuffle_trade_order,
+)
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+@pytest.fixture
+def get_finished_runner(get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config):
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=4)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    mtm_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    return runner, mtm_result
+
+
+def test_block_bootstrap_mtm(get_finished_runner) -> None:
+    runner, mtm_result = get_finished_runner
+    distribution: ResampleDistribution = runner.bootstrap_mtm(
+        symbol=test_symbol, resample_count=600, block_size=16, seed=42
+    )
+    assert len(distribution.pnl) == 600
+    assert np.all(distribution.max_drawdown >= 0)
+    lower, upper = distribution.confidence_interval("sharpe_ratio", 0.9)
+    assert lower < upper
+
+    # Seeded results do not depend on the number of processes
+    parallel_distribution: ResampleDistribution = runner.bootstrap_mtm(
+        symbol=test_symbol, resample_count=600, block_size=16, seed=42, n_jobs=2
+    )
+    assert np.array_equal(distribution.pnl, parallel_distribution.pnl)
+    assert np.array_equal(
+        distribution.sharpe_ratio, parallel_distribution.sharpe_ratio
+    )
+
+    # A single block covering the whole series is a rotation of the mtm series
+    agent = runner.trade_order_simulator_map[test_symbol]
+    rotation: ResampleDistribution = block_bootstrap_mtm(
+        timestamp_ms=agent.mtm_history_timestamp_ms,
+        mtm=agent.mtm_history_value,
+        resample_count=10,
+        block_size=len(agent.mtm_history_value),
+        seed=1,
+    )
+    assert np.all(np.abs(rotation.pnl - mtm_result.pnl) < COMPARE_ERROR)
+    assert np.all(np.abs(rotation.sharpe_ratio - mtm_result.sharpe_ratio) < COMPARE_ERROR)
+
+
+def test_shuffle_trade_order(get_finished_runner) -> None:
+    runner, mtm_result = get_finished_runner
+    permuted: ResampleDistribution = runner.shuffle_trades(
+        symbol=test_symbol, resample_count=300, seed=7
+    )
+    trade_pnl = sum(
+        t.pnl_normalized
+        for t in mtm_result.long_trades_archive + mtm_result.short_trades_archive
+    )
+    assert np.all(np.abs(permuted.pnl - trade_pnl) < COMPARE_ERROR)
+    assert np.ptp(permuted.max_drawdown) > 0
+
+    resampled: ResampleDistribution = runner.shuffle_trades(
+        symbol=test_symbol, resample_count=300, with_replacement=True, seed=7
+    )
+    assert np.ptp(resampled.pnl) > 0
+
+
+def test_resample_invalid_input(get_finished_runner) -> None:
+    runner, _ = get_finished_runner
+    with pytest.raises(ValueError):
+        runner.bootstrap_mtm(symbol=test_symbol, block_size=0)
+    with pytest.raises(ValueError):
+        shuffle_trade_order(trades=[])
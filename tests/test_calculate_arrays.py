@@ -0,0 +1,152 @@
+from tradesignal_mtm_runner.runner_mtm import (
+    Trade_Mtm_Runner,
+    HyperOptPnlCalculator_Adapter,
+)
+from tradesignal_mtm_runner.config import PnlCalcConfig
+from tradesignal_mtm_runner.models import Mtm_Result, Engine_Mode, MIN_NUMERIC_VALUE
+
+import numpy as np
+import pandas as pd
+import pytest
+
+test_symbol = "ETHUSD"
+
+
+@pytest.mark.parametrize(
+    "engine_mode", [Engine_Mode.BAR, Engine_Mode.EVENT, Engine_Mode.FIRST_PASSAGE]
+)
+def test_calculate_arrays(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config, engine_mode
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=44)
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(), engine_mode=engine_mode
+    )
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    mtm_result: Mtm_Result = runner.calculate_arrays(
+        symbol=test_symbol,
+        timestamp_ms=test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(np.int64),
+        close_price=test_mktdata["close"].to_numpy(),
+        buy_signal=test_mktdata["buy"].to_numpy(dtype=bool),
+        sell_signal=test_mktdata["sell"].to_numpy(dtype=np.int8),
+    )
+
+    assert mtm_result.pnl == expected_result.pnl
+    assert mtm_result.max_drawdown == expected_result.max_drawdown
+    assert mtm_result.sharpe_ratio == expected_result.sharpe_ratio
+    assert mtm_result.pnl_timeline == expected_result.pnl_timeline
+    assert mtm_result.trades_closed_by_reason == expected_result.trades_closed_by_reason
+    assert len(mtm_result.long_trades_archive) > 0
+    for actual, expected in [
+        (mtm_result.long_trades_archive, expected_result.long_trades_archive),
+        (mtm_result.short_trades_archive, expected_result.short_trades_archive),
+    ]:
+        assert [
+            (t.entry_datetime, t.exit_datetime, t.exit_price, t.close_reason)
+            for t in actual
+        ] == [
+            (t.entry_datetime, t.exit_datetime, t.exit_price, t.close_reason)
+            for t in expected
+        ]
+
+
+def test_adapter_calculate_arrays(get_test_flat_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_flat_mkt_data(dim=50)
+    adapter = HyperOptPnlCalculator_Adapter(
+        calculator=Trade_Mtm_Runner(pnl_config=PnlCalcConfig.get_default())
+    )
+    mtm_result: Mtm_Result = adapter.calculate_arrays(
+        symbol=test_symbol,
+        timestamp_ms=test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(np.int64),
+        close_price=test_mktdata["close"].to_numpy(),
+        buy_signal=np.zeros(50),
+        sell_signal=np.zeros(50),
+    )
+    assert mtm_result.pnl == MIN_NUMERIC_VALUE
+
+
+@pytest.mark.parametrize(
+    "engine_mode", [Engine_Mode.BAR, Engine_Mode.EVENT, Engine_Mode.FIRST_PASSAGE]
+)
+@pytest.mark.parametrize("events_by_timestamp", [False, True])
+def test_calculate_events(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    engine_mode,
+    events_by_timestamp,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=45)
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(), engine_mode=engine_mode
+    )
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    timestamp_ms: np.ndarray = test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+        np.int64
+    )
+    buy_events: np.ndarray = np.flatnonzero(test_mktdata["buy"].to_numpy() == 1)
+    sell_events: np.ndarray = np.flatnonzero(test_mktdata["sell"].to_numpy() == 1)
+    if events_by_timestamp:
+        buy_events, sell_events = timestamp_ms[buy_events], timestamp_ms[sell_events]
+    mtm_result: Mtm_Result = runner.calculate_events(
+        symbol=test_symbol,
+        timestamp_ms=timestamp_ms,
+        close_price=test_mktdata["close"].to_numpy(),
+        # unsorted events with duplicates are accepted
+        buy_events=np.concatenate([buy_events[::-1], buy_events[:3]]),
+        sell_events=sell_events,
+        events_by_timestamp=events_by_timestamp,
+    )
+
+    assert mtm_result.pnl == expected_result.pnl
+    assert mtm_result.max_drawdown == expected_result.max_drawdown
+    assert mtm_result.sharpe_ratio == expected_result.sharpe_ratio
+    assert mtm_result.pnl_timeline == expected_result.pnl_timeline
+    assert mtm_result.trades_closed_by_reason == expected_result.trades_closed_by_reason
+
+
+def test_calculate_events_not_a_bar(get_test_flat_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_flat_mkt_data(dim=50)
+    timestamp_ms: np.ndarray = test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+        np.int64
+    )
+    runner = Trade_Mtm_Runner(pnl_config=PnlCalcConfig.get_default())
+    with pytest.raises(ValueError):
+        runner.calculate_events(
+            symbol=test_symbol,
+            timestamp_ms=timestamp_ms,
+            close_price=test_mktdata["close"].to_numpy(),
+            buy_events=timestamp_ms[[3]] + 1,
+            sell_events=timestamp_ms[[10]],
+            events_by_timestamp=True,
+        )
+    with pytest.raises(ValueError):
+        runner.calculate_events(
+            symbol=test_symbol,
+            timestamp_ms=timestamp_ms,
+            close_price=test_mktdata["close"].to_numpy(),
+            buy_events=[3],
+            sell_events=[len(timestamp_ms)],
+        )
+
+
+def test_calculate_arrays_length_mismatch(get_test_flat_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_flat_mkt_data(dim=50)
+    runner = Trade_Mtm_Runner(pnl_config=PnlCalcConfig.get_default())
+    with pytest.raises(ValueError):
+        runner.calculate_arrays(
+            symbol=test_symbol,
+            timestamp_ms=test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+                np.int64
+            ),
+            close_price=test_mktdata["close"].to_numpy(),
+            buy_signal=np.zeros(len(test_mktdata) - 1),
+            sell_signal=np.zeros(len(test_mktdata)),
+        )
@@ -0,0 +1,137 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.trade_reward import TradeBookKeeperAgent
+from tradesignal_mtm_runner.models import Mtm_Result, Engine_Mode
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+CHECKPOINT_INTERVAL = 100
+test_symbol = "ETHUSD"
+
+
+def _assert_same_result(mtm_result: Mtm_Result, expected_result: Mtm_Result) -> None:
+    assert abs(mtm_result.pnl - expected_result.pnl) < COMPARE_ERROR
+    assert abs(mtm_result.max_drawdown - expected_result.max_drawdown) < COMPARE_ERROR
+    assert abs(mtm_result.sharpe_ratio - expected_result.sharpe_ratio) < COMPARE_ERROR
+    assert mtm_result.trades_opened == expected_result.trades_opened
+    assert mtm_result.trades_closed_by_reason == expected_result.trades_closed_by_reason
+    assert np.allclose(
+        mtm_result.pnl_timeline["mtm_ratio"],
+        expected_result.pnl_timeline["mtm_ratio"],
+        atol=1e-12,
+    )
+    for actual, expected in [
+        (mtm_result.long_trades_archive, expected_result.long_trades_archive),
+        (mtm_result.short_trades_archive, expected_result.short_trades_archive),
+        (mtm_result.long_trades_outstanding, expected_result.long_trades_outstanding),
+        (mtm_result.short_trades_oustanding, expected_result.short_trades_oustanding),
+    ]:
+        assert [(t.entry_datetime, t.exit_datetime, t.exit_price) for t in actual] == [
+            (t.entry_datetime, t.exit_datetime, t.exit_price) for t in expected
+        ]
+
+
+@pytest.mark.parametrize("engine_mode", [Engine_Mode.BAR, Engine_Mode.EVENT])
+@pytest.mark.parametrize("new_bar_count", [3000, 2000, 3500])
+def test_recalculate_from_divergent_bar(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    engine_mode,
+    new_bar_count,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=3500, signal_ratio=0.03, seed=42
+    )
+    pnl_config = get_test_trigger_pnl_calc_config(max_position_per_symbol=2)
+    runner = Trade_Mtm_Runner(
+        pnl_config=pnl_config,
+        engine_mode=engine_mode,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+    )
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.iloc[:3000].copy(),
+        sell_signal_dataframe=test_mktdata.iloc[:3000].copy(),
+    )
+    agent: TradeBookKeeperAgent = runner._get_retained_agent(test_symbol)
+    assert agent.run_checkpoints.checkpoints[0].bar_index == 0
+    assert np.all(
+        np.diff([c.bar_index for c in agent.run_checkpoints.checkpoints])
+        >= CHECKPOINT_INTERVAL
+    )
+
+    # Neighbour signal series, identical up to bar 1234
+    new_mktdata: pd.DataFrame = test_mktdata.iloc[:new_bar_count].copy()
+    new_mktdata.iloc[1234:, new_mktdata.columns.get_loc("buy")] = np.roll(
+        new_mktdata["buy"].to_numpy()[1234:], 7
+    )
+    expected_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=pnl_config, engine_mode=engine_mode
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=new_mktdata.copy(),
+        sell_signal_dataframe=new_mktdata.copy(),
+    )
+
+    run_bars: list[int] = []
+    run_at_timestamp = agent.run_at_timestamp
+
+    def _count_run_at_timestamp(**kwargs) -> None:
+        run_bars.append(kwargs["timestamp_ms"])
+        run_at_timestamp(**kwargs)
+
+    agent.run_at_timestamp = _count_run_at_timestamp
+    mtm_result: Mtm_Result = runner.recalculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=new_mktdata.copy(),
+        sell_signal_dataframe=new_mktdata.copy(),
+    )
+    _assert_same_result(mtm_result, expected_result)
+    assert runner._get_retained_agent(test_symbol) is agent
+    first_run_bar: int = int(
+        np.searchsorted(mtm_result.pnl_timeline["timestamp"], min(run_bars))
+    )
+    assert 1234 - 2 * CHECKPOINT_INTERVAL < first_run_bar <= 1234
+
+    # Checkpoints are refreshed by the re-simulation
+    mtm_result = runner.recalculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.iloc[:3000].copy(),
+        sell_signal_dataframe=test_mktdata.iloc[:3000].copy(),
+    )
+    _assert_same_result(
+        mtm_result,
+        Trade_Mtm_Runner(pnl_config=pnl_config, engine_mode=engine_mode).calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_mktdata.iloc[:3000].copy(),
+            sell_signal_dataframe=test_mktdata.iloc[:3000].copy(),
+        ),
+    )
+
+
+def test_recalculate_without_checkpoints(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=1000, seed=4)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    assert runner._get_retained_agent(test_symbol).run_checkpoints is None
+    mtm_result: Mtm_Result = runner.recalculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    _assert_same_result(mtm_result, expected_result)
+
+
+def test_checkpoint_interval_invalid(get_test_trigger_pnl_calc_config) -> None:
+    with pytest.raises(ValueError):
+        Trade_Mtm_Runner(
+            pnl_config=get_test_trigger_pnl_calc_config(), checkpoint_interval=0
+        )
@@ -0,0 +1,122 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.trade_reward import TradeBookKeeperAgent
+from tradesignal_mtm_runner.chunk_engine import find_chunk_bounds, run_chunked_parallel
+from tradesignal_mtm_runner.models import Mtm_Result, Engine_Mode
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+def test_find_chunk_bounds() -> None:
+    buy_signal = np.zeros(1000, dtype=int)
+    sell_signal = np.zeros(1000, dtype=int)
+    buy_signal[[100, 240, 290, 300, 480, 530]] = 1
+    sell_signal[[260, 700, 760]] = 1
+    bounds = find_chunk_bounds(buy_signal, sell_signal, chunk_count=4, min_chunk_bars=100)
+    # signal after the longest gap without signal within 62 bars of 250, 500, 750
+    assert bounds.tolist() == [0, 290, 530, 760, 1000]
+    assert find_chunk_bounds(
+        buy_signal, sell_signal, chunk_count=4, min_chunk_bars=600
+    ).tolist() == [0, 1000]
+
+
+@pytest.mark.parametrize("max_position_per_symbol", [1, 3])
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_chunked_parallel_engine(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    max_position_per_symbol,
+    n_jobs,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=4000, signal_ratio=0.03, seed=43
+    )
+    pnl_config = get_test_trigger_pnl_calc_config(
+        max_position_per_symbol=max_position_per_symbol
+    )
+    expected_result: Mtm_Result = Trade_Mtm_Runner(pnl_config=pnl_config).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+
+    trade_order_agent = TradeBookKeeperAgent(symbol=test_symbol, pnl_config=pnl_config)
+    run_chunked_parallel(
+        trade_order_agent=trade_order_agent,
+        pnl_config=pnl_config,
+        time_line=test_mktdata.index,
+        timestamp_ms=np.asarray(pd.to_numeric(test_mktdata.index), dtype=np.int64)
+        // 1_000_000,
+        close_price=test_mktdata["close"].to_numpy(dtype=float),
+        price_move=test_mktdata["price_movement"].to_numpy(dtype=float),
+        buy_signal=test_mktdata["buy"].to_numpy(dtype=int),
+        sell_signal=test_mktdata["sell"].to_numpy(dtype=int),
+        n_jobs=n_jobs,
+        chunk_count=16,
+        min_chunk_bars=100,
+    )
+
+    assert np.allclose(
+        trade_order_agent.mtm_history_value,
+        expected_result.pnl_timeline["mtm_ratio"],
+        atol=1e-12,
+    )
+    assert (
+        trade_order_agent.mtm_history_timestamp_ms.tolist()
+        == expected_result.pnl_timeline["timestamp"]
+    )
+    for actual, expected in [
+        (trade_order_agent.archive_long_positions_list, expected_result.long_trades_archive),
+        (
+            trade_order_agent.archive_short_positions_list,
+            expected_result.short_trades_archive,
+        ),
+        (
+            trade_order_agent.outstanding_long_position_list,
+            expected_result.long_trades_outstanding,
+        ),
+        (
+            trade_order_agent.outstanding_short_position_list,
+            expected_result.short_trades_oustanding,
+        ),
+    ]:
+        assert [(t.entry_datetime, t.exit_datetime, t.exit_price) for t in actual] == [
+            (t.entry_datetime, t.exit_datetime, t.exit_price) for t in expected
+        ]
+
+
+def test_runner_with_chunked_engine(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=5000, seed=44)
+    pnl_config = get_test_trigger_pnl_calc_config(max_position_per_symbol=2)
+    expected_result: Mtm_Result = Trade_Mtm_Runner(pnl_config=pnl_config).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    mtm_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=pnl_config, engine_mode=Engine_Mode.CHUNKED, n_jobs=2
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    assert abs(mtm_result.pnl - expected_result.pnl) < COMPARE_ERROR
+    assert abs(mtm_result.max_drawdown - expected_result.max_drawdown) < COMPARE_ERROR
+    assert abs(mtm_result.sharpe_ratio - expected_result.sharpe_ratio) < COMPARE_ERROR
+    assert mtm_result.trades_opened == expected_result.trades_opened
+    assert mtm_result.trades_closed_by_reason == expected_result.trades_closed_by_reason
+
+
+def test_chunked_engine_invalid_n_jobs(get_test_trigger_pnl_calc_config) -> None:
+    with pytest.raises(ValueError):
+        Trade_Mtm_Runner(
+            pnl_config=get_test_trigger_pnl_calc_config(),
+            engine_mode=Engine_Mode.CHUNKED,
+            n_jobs=0,
+        )
@@ -0,0 +1,97 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.columnar import read_column, read_timestamp_ms
+from tradesignal_mtm_runner.exceptions import UnSupportedException
+from tradesignal_mtm_runner.models import Mtm_Result
+
+import numpy as np
+import pandas as pd
+import pytest
+
+test_symbol = "ETHUSD"
+
+
+def _assert_same_result(mtm_result: Mtm_Result, expected_result: Mtm_Result) -> None:
+    assert mtm_result.pnl == expected_result.pnl
+    assert mtm_result.max_drawdown == expected_result.max_drawdown
+    assert mtm_result.sharpe_ratio == expected_result.sharpe_ratio
+    assert mtm_result.pnl_timeline == expected_result.pnl_timeline
+    assert mtm_result.trades_closed_by_reason == expected_result.trades_closed_by_reason
+
+
+def test_calculate_arrow_table(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    pa = pytest.importorskip("pyarrow")
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=44)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    table = pa.table(
+        {
+            "timestamp": pa.array(
+                test_mktdata.index.to_numpy(dtype="datetime64[ms]"), type=pa.timestamp("ms")
+            ),
+            "close": test_mktdata["close"].to_numpy(),
+            "buy": test_mktdata["buy"].to_numpy(),
+            "sell": test_mktdata["sell"].to_numpy(),
+        }
+    )
+    close_price: np.ndarray = read_column(table=table, name="close")
+    assert np.shares_memory(close_price, read_column(table=table, name="close"))
+    assert read_timestamp_ms(table=table, name="timestamp").tolist() == (
+        expected_result.pnl_timeline["timestamp"]
+    )
+
+    _assert_same_result(
+        runner.calculate_table(symbol=test_symbol, buy_signal_table=table),
+        expected_result,
+    )
+    # sell signal in a separate record batch
+    _assert_same_result(
+        runner.calculate_table(
+            symbol=test_symbol,
+            buy_signal_table=table.select(["timestamp", "close", "buy"]),
+            sell_signal_table=table.select(["timestamp", "sell"]).to_batches()[0],
+        ),
+        expected_result,
+    )
+    with pytest.raises(ValueError):
+        runner.calculate_table(
+            symbol=test_symbol,
+            buy_signal_table=table.slice(1),
+            sell_signal_table=table.slice(0, len(table) - 1),
+        )
+
+
+def test_calculate_polars_frame(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    pl = pytest.importorskip("polars")
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=44)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    frame = pl.DataFrame(
+        {
+            "timestamp": test_mktdata.index.to_numpy(dtype="datetime64[us]"),
+            "close": test_mktdata["close"].to_numpy(),
+            "buy": test_mktdata["buy"].to_numpy(),
+            "sell": test_mktdata["sell"].to_numpy(),
+        }
+    )
+    _assert_same_result(
+        runner.calculate_table(symbol=test_symbol, buy_signal_table=frame),
+        expected_result,
+    )
+
+
+def test_calculate_table_unsupported(get_test_random_walk_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=10)
+    with pytest.raises(UnSupportedException):
+        read_column(table=test_mktdata, name="close")
@@ -1,7 +1,8 @@
-from tradesignal_mtm_runner.data_struct import BTree
+from tradesignal_mtm_runner.data_struct import BTree, SortedIndex, SparseTable
 import pytest
 import logging
 import math
+import numpy as np
 logger = logging.getLogger(__name__)
 
 # @pytest.fixture()
@@ -179,3 +180,27 @@ def test_index_the_list() -> None:
     values = indexed_list.search_value_right(value=chk_value + 1)
     assert values == test_samples[pick_inx + 1 :]
     pass
+
+
+def test_sorted_index():
+    sorted_index = SortedIndex(np.array([10, 20, 30, 40], dtype=np.int64))
+    assert sorted_index.range_slice(15, 30) == slice(1, 3)
+    assert sorted_index.range_slice(10, 40) == slice(0, 4)
+    assert sorted_index.range_slice(end=5) == slice(0, 0)
+    assert sorted_index.range_slice(begin=41) == slice(4, 4)
+    assert sorted_index.range_slice(31, 39) == slice(3, 3)
+    assert sorted_index.search_left(20) == 1
+    assert sorted_index.search_right(20) == 2
+
+
+@pytest.mark.parametrize("func", [np.minimum, np.maximum])
+def test_sparse_table(func) -> None:
+    rng = np.random.default_rng(0)
+    values = rng.random(777)
+    sparse_table = SparseTable(values, func)
+    begin = rng.integers(0, len(values), 300)
+    end = np.minimum(len(values) - 1, begin + rng.integers(0, 200, 300))
+    expected = [func.reduce(values[b : e + 1]) for b, e in zip(begin, end)]
+    assert np.array_equal(sparse_table.query(begin, end), expected)
+    assert sparse_table.query(5, 5) == values[5]
+    assert sparse_table.query(0, len(values) - 1) == func.reduce(values)
@@ -0,0 +1,50 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.config import PnlCalcConfig
+from tradesignal_mtm_runner.models import Mtm_Result, Engine_Mode
+
+import pandas as pd
+import pytest
+
+test_symbol = "ETHUSD"
+DATA_DIM = 3000
+
+
+@pytest.mark.parametrize(
+    "enable_short_position, max_position_per_symbol, signal_ratio",
+    [(False, 1, 0.01), (True, 1, 0.01), (True, 3, 0.05), (True, 5, 0.002)],
+)
+def test_event_engine_same_as_bar_engine(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    enable_short_position: bool,
+    max_position_per_symbol: int,
+    signal_ratio: float,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=DATA_DIM, signal_ratio=signal_ratio
+    )
+    pnl_config: PnlCalcConfig = get_test_trigger_pnl_calc_config(
+        enable_short_position=enable_short_position,
+        max_position_per_symbol=max_position_per_symbol,
+    )
+
+    results: dict[Engine_Mode, Mtm_Result] = {}
+    for engine_mode in [Engine_Mode.BAR, Engine_Mode.EVENT]:
+        runner = Trade_Mtm_Runner(pnl_config=pnl_config, engine_mode=engine_mode)
+        results[engine_mode] = runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_mktdata.copy(),
+            sell_signal_dataframe=test_mktdata.copy(),
+        )
+
+    bar_result, event_result = results[Engine_Mode.BAR], results[Engine_Mode.EVENT]
+    assert len(bar_result.long_trades_archive) > 0
+    assert event_result.pnl_timeline == bar_result.pnl_timeline
+    assert event_result.pnl == bar_result.pnl
+    assert event_result.max_drawdown == bar_result.max_drawdown
+    assert event_result.sharpe_ratio == bar_result.sharpe_ratio
+    for archive in ["long_trades_archive", "short_trades_archive"]:
+        assert [t.dict() for t in getattr(event_result, archive)] == [
+            t.dict() for t in getattr(bar_result, archive)
+        ]
+    assert event_result.trades_closed_by_reason == bar_result.trades_closed_by_reason
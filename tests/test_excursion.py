@@ -0,0 +1,74 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import Mtm_Result, LongShort_Enum
+
+import pandas as pd
+import warnings
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+def test_trade_excursion(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=6)
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(max_position_per_symbol=3),
+        trade_excursion=True,
+    )
+    mtm_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    trades = (
+        mtm_result.long_trades_archive
+        + mtm_result.short_trades_archive
+        + mtm_result.long_trades_outstanding
+        + mtm_result.short_trades_oustanding
+    )
+    assert len(trades) > 0
+    close = test_mktdata["close"]
+    for trade in trades:
+        price = close[trade.entry_datetime : trade.exit_datetime]
+        sign = 1 if trade.direction == LongShort_Enum.LONG else -1
+        pnl = sign * (price.to_numpy() - trade.entry_price) / trade.entry_price
+        assert abs(trade.max_adverse_excursion - min(pnl.min(), 0)) < COMPARE_ERROR
+        assert abs(trade.max_favorable_excursion - max(pnl.max(), 0)) < COMPARE_ERROR
+        if trade.is_closed:
+            assert (
+                trade.max_adverse_excursion
+                <= trade.calculate_pnl_normalized(trade.exit_price) + COMPARE_ERROR
+            )
+
+
+def test_trade_excursion_tz_aware(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=500, seed=6)
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(max_position_per_symbol=3),
+        trade_excursion=True,
+    )
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    utc_mktdata: pd.DataFrame = test_mktdata.tz_localize("UTC")
+    # no deprecated parsing of tz-aware datetimes
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        mtm_result: Mtm_Result = runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=utc_mktdata,
+            sell_signal_dataframe=utc_mktdata,
+        )
+    assert len(mtm_result.long_trades_archive) > 0
+    assert [
+        (t.max_adverse_excursion, t.max_favorable_excursion)
+        for t in mtm_result.long_trades_archive
+    ] == [
+        (t.max_adverse_excursion, t.max_favorable_excursion)
+        for t in expected_result.long_trades_archive
+    ]
@@ -0,0 +1,70 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.config import PnlCalcConfig
+from tradesignal_mtm_runner.models import Mtm_Result, Engine_Mode
+from tradesignal_mtm_runner.exceptions import UnSupportedException
+
+import pandas as pd
+import pytest
+
+test_symbol = "ETHUSD"
+DATA_DIM = 3000
+
+
+@pytest.mark.parametrize(
+    "enable_short_position, signal_ratio, seed",
+    [(False, 0.01, 0), (True, 0.01, 1), (True, 0.05, 2), (True, 0.002, 3)],
+)
+def test_first_passage_engine_same_as_bar_engine(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    enable_short_position: bool,
+    signal_ratio: float,
+    seed: int,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=DATA_DIM, signal_ratio=signal_ratio, seed=seed
+    )
+    pnl_config: PnlCalcConfig = get_test_trigger_pnl_calc_config(
+        enable_short_position=enable_short_position
+    )
+
+    results: dict[Engine_Mode, Mtm_Result] = {}
+    for engine_mode in [Engine_Mode.BAR, Engine_Mode.FIRST_PASSAGE]:
+        runner = Trade_Mtm_Runner(pnl_config=pnl_config, engine_mode=engine_mode)
+        results[engine_mode] = runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_mktdata.copy(),
+            sell_signal_dataframe=test_mktdata.copy(),
+        )
+
+    bar_result = results[Engine_Mode.BAR]
+    first_passage_result = results[Engine_Mode.FIRST_PASSAGE]
+    assert len(bar_result.long_trades_archive) > 0
+    assert first_passage_result.pnl_timeline == bar_result.pnl_timeline
+    assert first_passage_result.pnl == bar_result.pnl
+    assert first_passage_result.max_drawdown == bar_result.max_drawdown
+    for archive in [
+        "long_trades_archive",
+        "short_trades_archive",
+        "long_trades_outstanding",
+        "short_trades_oustanding",
+    ]:
+        assert [t.dict() for t in getattr(first_passage_result, archive)] == [
+            t.dict() for t in getattr(bar_result, archive)
+        ]
+
+
+def test_first_passage_engine_single_position_only(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=100)
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(max_position_per_symbol=2),
+        engine_mode=Engine_Mode.FIRST_PASSAGE,
+    )
+    with pytest.raises(UnSupportedException):
+        runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_mktdata,
+            sell_signal_dataframe=test_mktdata,
+        )
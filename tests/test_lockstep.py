@@ -0,0 +1,210 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.config import PnlCalcConfig
+from tradesignal_mtm_runner.models import Mtm_Result
+from tradesignal_mtm_runner.lockstep import pack_signal_matrix, ScenarioBatchResult
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+VARIANT_COUNT = 5
+
+
+@pytest.mark.parametrize(
+    "enable_short_position, max_position_per_symbol",
+    [(False, 1), (True, 1), (True, 3)],
+)
+def test_signal_matrix_same_as_runner(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    enable_short_position: bool,
+    max_position_per_symbol: int,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=1500, seed=3)
+    rng = np.random.default_rng(21)
+    signal_ratio = np.linspace(0.005, 0.05, VARIANT_COUNT)[:, None]
+    buy_signal_matrix = (
+        rng.random((VARIANT_COUNT, len(test_mktdata))) < signal_ratio
+    ).astype(np.int8)
+    sell_signal_matrix = (
+        rng.random((VARIANT_COUNT, len(test_mktdata))) < 0.02
+    ).astype(np.int8)
+    pnl_config: PnlCalcConfig = get_test_trigger_pnl_calc_config(
+        enable_short_position=enable_short_position,
+        max_position_per_symbol=max_position_per_symbol,
+    )
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config)
+
+    results: list[Mtm_Result] = runner.calculate_signal_matrix(
+        symbol=test_symbol,
+        price_dataframe=test_mktdata,
+        buy_signal_matrix=buy_signal_matrix,
+        sell_signal_matrix=sell_signal_matrix,
+    )
+    packed_results: list[Mtm_Result] = runner.calculate_signal_matrix(
+        symbol=test_symbol,
+        price_dataframe=test_mktdata,
+        buy_signal_matrix=pack_signal_matrix(buy_signal_matrix),
+        sell_signal_matrix=pack_signal_matrix(sell_signal_matrix),
+        packed=True,
+    )
+    assert len(results) == VARIANT_COUNT
+
+    for variant, (result, packed_result) in enumerate(zip(results, packed_results)):
+        assert result == packed_result
+        test_df = test_mktdata.copy()
+        test_df["buy"] = buy_signal_matrix[variant]
+        test_df["sell"] = sell_signal_matrix[variant]
+        expected: Mtm_Result = runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_df.copy(),
+            sell_signal_dataframe=test_df.copy(),
+        )
+        assert abs(result.pnl - expected.pnl) < COMPARE_ERROR
+        assert abs(result.max_drawdown - expected.max_drawdown) < COMPARE_ERROR
+        assert abs(result.sharpe_ratio - expected.sharpe_ratio) < COMPARE_ERROR
+        assert result.trades_opened == expected.trades_opened
+        assert result.trades_closed_by_reason == expected.trades_closed_by_reason
+        assert result.bar_count == expected.bar_count
+
+
+@pytest.mark.parametrize("max_position_per_symbol", [1, 2])
+def test_price_scenarios_same_as_runner(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    max_position_per_symbol: int,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=1500, seed=8)
+    rng = np.random.default_rng(5)
+    scenario_count = 4
+    price_matrix = test_mktdata["close"].to_numpy() * np.exp(
+        np.cumsum(rng.normal(0, 0.002, (scenario_count, len(test_mktdata))), axis=1)
+    )
+    pnl_config: PnlCalcConfig = get_test_trigger_pnl_calc_config(
+        max_position_per_symbol=max_position_per_symbol
+    )
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config)
+
+    batch_result: ScenarioBatchResult = runner.calculate_price_scenarios(
+        symbol=test_symbol, signal_dataframe=test_mktdata, price_matrix=price_matrix
+    )
+    assert len(batch_result.pnl) == scenario_count
+
+    for scenario in range(scenario_count):
+        test_df = test_mktdata.copy()
+        test_df["close"] = price_matrix[scenario]
+        expected: Mtm_Result = runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_df.copy(),
+            sell_signal_dataframe=test_df.copy(),
+        )
+        assert abs(batch_result.pnl[scenario] - expected.pnl) < COMPARE_ERROR
+        assert (
+            abs(batch_result.max_drawdown[scenario] - expected.max_drawdown)
+            < COMPARE_ERROR
+        )
+        assert (
+            abs(batch_result.sharpe_ratio[scenario] - expected.sharpe_ratio)
+            < COMPARE_ERROR
+        )
+        assert batch_result.trades_opened[scenario] == expected.trades_opened
+
+
+def test_price_scenarios_signal_values(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=1500, seed=8)
+    test_mktdata["buy"] = test_mktdata["buy"].astype(float)
+    buy_bars: np.ndarray = np.flatnonzero(test_mktdata["buy"].to_numpy() == 1)
+    # nan and values other than 1 are no signal
+    test_mktdata.iloc[buy_bars[::3], test_mktdata.columns.get_loc("buy")] = np.nan
+    test_mktdata.iloc[buy_bars[1::3], test_mktdata.columns.get_loc("buy")] = 2
+    test_mktdata.iloc[:200, test_mktdata.columns.get_loc("sell")] = np.nan
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+
+    batch_result: ScenarioBatchResult = runner.calculate_price_scenarios(
+        symbol=test_symbol,
+        signal_dataframe=test_mktdata,
+        price_matrix=test_mktdata["close"].to_numpy()[None, :],
+    )
+    expected: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    assert expected.trades_opened > 0
+    assert abs(batch_result.pnl[0] - expected.pnl) < COMPARE_ERROR
+    assert batch_result.trades_opened[0] == expected.trades_opened
+
+    with pytest.raises(ValueError):
+        runner.calculate_price_scenarios(
+            symbol=test_symbol,
+            signal_dataframe=test_mktdata,
+            price_matrix=test_mktdata["close"].to_numpy()[None, :-1],
+        )
+
+
+def test_signal_matrix_signal_values(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=1000, seed=9)
+    rng = np.random.default_rng(22)
+    # float signals, nan and values other than 1 are no signal
+    buy_signal_matrix = rng.choice(
+        [0.0, 1.0, 2.0, -1.0, np.nan],
+        size=(VARIANT_COUNT, len(test_mktdata)),
+        p=[0.9, 0.02, 0.02, 0.02, 0.04],
+    )
+    sell_signal_matrix = rng.choice(
+        [0.0, 1.0, np.nan], size=(VARIANT_COUNT, len(test_mktdata)), p=[0.9, 0.02, 0.08]
+    )
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+
+    results: list[Mtm_Result] = runner.calculate_signal_matrix(
+        symbol=test_symbol,
+        price_dataframe=test_mktdata,
+        buy_signal_matrix=buy_signal_matrix,
+        sell_signal_matrix=sell_signal_matrix,
+    )
+    packed_results: list[Mtm_Result] = runner.calculate_signal_matrix(
+        symbol=test_symbol,
+        price_dataframe=test_mktdata,
+        buy_signal_matrix=pack_signal_matrix(buy_signal_matrix),
+        sell_signal_matrix=pack_signal_matrix(sell_signal_matrix),
+        packed=True,
+    )
+    for variant, (result, packed_result) in enumerate(zip(results, packed_results)):
+        assert result == packed_result
+        test_df = test_mktdata.copy()
+        test_df["buy"] = buy_signal_matrix[variant]
+        test_df["sell"] = sell_signal_matrix[variant]
+        expected: Mtm_Result = runner.calculate(
+            symbol=test_symbol, buy_signal_dataframe=test_df, sell_signal_dataframe=test_df
+        )
+        assert abs(result.pnl - expected.pnl) < COMPARE_ERROR
+        assert result.trades_opened == expected.trades_opened
+
+
+def test_signal_matrix_shape_mismatch(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=100, seed=9)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    signal_matrix = np.zeros((VARIANT_COUNT, len(test_mktdata)), dtype=np.int8)
+    with pytest.raises(ValueError):
+        runner.calculate_signal_matrix(
+            symbol=test_symbol,
+            price_dataframe=test_mktdata,
+            buy_signal_matrix=signal_matrix,
+            sell_signal_matrix=signal_matrix[:, :-1],
+        )
+    with pytest.raises(ValueError):
+        runner.calculate_signal_matrix(
+            symbol=test_symbol,
+            price_dataframe=test_mktdata,
+            buy_signal_matrix=signal_matrix,
+            sell_signal_matrix=signal_matrix,
+            packed=True,
+        )
@@ -0,0 +1,185 @@
+from tradesignal_mtm_runner.market_cache import (
+    MarketArrayCache,
+    PreparedMarket,
+    prepare_market,
+    market_data_version,
+)
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import Mtm_Result
+from tradesignal_mtm_runner.config import PnlCalcConfig
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+test_symbol = "ETHUSD"
+
+
+def _prepare(bar_count: int, step_ms: int = 60_000) -> PreparedMarket:
+    timestamp_ms: np.ndarray = np.arange(bar_count, dtype=np.int64) * step_ms
+    return prepare_market(
+        time_line=timestamp_ms.astype("datetime64[ms]"),
+        timestamp_ms=timestamp_ms,
+        close_price=np.linspace(100, 200, bar_count),
+    )
+
+
+def test_prepare_market() -> None:
+    close_price: np.ndarray = np.array([100.0, 101.0, 99.5, 99.0])
+    timestamp_ms: np.ndarray = np.array([0, 60_000, 120_000, 240_000], dtype=np.int64)
+    prepared_market: PreparedMarket = prepare_market(
+        time_line=timestamp_ms.astype("datetime64[ms]"),
+        timestamp_ms=timestamp_ms,
+        close_price=close_price,
+    )
+    assert prepared_market.close_price is close_price
+    assert np.isnan(prepared_market.price_move[0])
+    assert prepared_market.price_move[1:].tolist() == [1.0, -1.5, -0.5]
+    assert prepared_market.bar_period_ms == 60_000
+
+    # cached arrays are read only, writable inputs are copied
+    cached_market: PreparedMarket = MarketArrayCache().get_or_prepare(
+        symbol=test_symbol,
+        data_version=market_data_version(timestamp_ms, close_price),
+        prepare=lambda: prepared_market,
+    )
+    close_price[0] = 0
+    assert cached_market.close_price[0] == 100.0
+    with pytest.raises(ValueError):
+        cached_market.price_move[0] = 0
+    assert market_data_version(timestamp_ms, close_price) != market_data_version(
+        timestamp_ms, cached_market.close_price
+    )
+
+
+def test_market_array_cache_eviction() -> None:
+    entry_bytes: int = _prepare(1000).nbytes
+    market_cache = MarketArrayCache(max_bytes=entry_bytes * 2)
+    for symbol in ["A", "B", "A", "C"]:
+        market_cache.get_or_prepare(
+            symbol=symbol, data_version="v1", prepare=lambda: _prepare(1000)
+        )
+    # A used more recently than B, B is evicted by C
+    assert (market_cache.hits, market_cache.misses) == (1, 3)
+    assert len(market_cache) == 2
+    assert market_cache.current_bytes == entry_bytes * 2
+    market_cache.get_or_prepare(symbol="A", data_version="v1", prepare=lambda: _prepare(1000))
+    assert market_cache.hits == 2
+
+    # too large to cache
+    market_cache.get_or_prepare(symbol="D", data_version="v1", prepare=lambda: _prepare(5000))
+    assert len(market_cache) == 2
+    market_cache.clear()
+    assert len(market_cache) == 0 and market_cache.current_bytes == 0
+    with pytest.raises(ValueError):
+        MarketArrayCache(max_bytes=0)
+
+
+def test_runner_market_cache(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=48)
+    market_cache = MarketArrayCache()
+    pnl_config = get_test_trigger_pnl_calc_config()
+    expected_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=pnl_config, market_cache=None
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config, market_cache=market_cache)
+    timestamp_ms: np.ndarray = test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+        np.int64
+    )
+    for _ in range(3):
+        mtm_result: Mtm_Result = runner.calculate_arrays(
+            symbol=test_symbol,
+            timestamp_ms=timestamp_ms,
+            close_price=test_mktdata["close"].to_numpy(),
+            buy_signal=test_mktdata["buy"].to_numpy(),
+            sell_signal=test_mktdata["sell"].to_numpy(),
+        )
+        assert mtm_result.pnl == expected_result.pnl
+        assert mtm_result.pnl_timeline == expected_result.pnl_timeline
+    assert (market_cache.hits, market_cache.misses) == (2, 1)
+
+    # new market data is a new version
+    changed_mktdata: pd.DataFrame = test_mktdata.copy()
+    changed_mktdata.iloc[-1, changed_mktdata.columns.get_loc("close")] *= 1.01
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=changed_mktdata,
+        sell_signal_dataframe=changed_mktdata,
+    )
+    assert (market_cache.hits, market_cache.misses) == (2, 2)
+
+
+def test_runner_market_cache_time_line(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=500, seed=49)
+    utc_mktdata: pd.DataFrame = test_mktdata.tz_localize("UTC")
+    market_cache = MarketArrayCache()
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(), market_cache=market_cache
+    )
+    timestamp_ms: np.ndarray = test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+        np.int64
+    )
+    array_result: Mtm_Result = runner.calculate_arrays(
+        symbol=test_symbol,
+        timestamp_ms=timestamp_ms,
+        close_price=test_mktdata["close"].to_numpy(),
+        buy_signal=test_mktdata["buy"].to_numpy(),
+        sell_signal=test_mktdata["sell"].to_numpy(),
+    )
+    utc_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=utc_mktdata,
+        sell_signal_dataframe=utc_mktdata,
+    )
+    naive_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    # the same market data with time lines of another type or time zone is not shared
+    assert market_cache.misses == 3
+    assert type(array_result.long_trades_archive[0].entry_datetime) is datetime
+    assert isinstance(utc_result.long_trades_archive[0].entry_datetime, pd.Timestamp)
+    assert utc_result.long_trades_archive[0].entry_datetime.tzinfo is not None
+    assert naive_result.long_trades_archive[0].entry_datetime.tzinfo is None
+    assert naive_result.long_trades_archive[0].entry_datetime < datetime(2100, 1, 1)
+    assert naive_result.pnl == utc_result.pnl == array_result.pnl
+
+
+def test_runner_market_cache_owned_arrays(get_test_random_walk_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=100, seed=50)
+    runner = Trade_Mtm_Runner(
+        pnl_config=PnlCalcConfig.get_default(), compact=True, market_cache=MarketArrayCache()
+    )
+    timestamp_ms: np.ndarray = test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+        np.int64
+    )
+    # the float32 close built by the runner is cached without another copy
+    close_price: np.ndarray = test_mktdata["close"].to_numpy(dtype=np.float32)
+    prepared_market: PreparedMarket = runner._prepare_market(
+        symbol="OWNED",
+        timestamp_ms=timestamp_ms,
+        close_price=close_price,
+        timestamp_owned=True,
+        close_owned=True,
+    )
+    assert np.shares_memory(prepared_market.close_price, close_price)
+    assert np.shares_memory(prepared_market.timestamp_ms, timestamp_ms)
+    assert not close_price.flags.writeable
+
+    # the arrays still referenced by the caller are copied
+    close_price = test_mktdata["close"].to_numpy(dtype=np.float32)
+    prepared_market = runner._prepare_market(
+        symbol="REFERENCED", timestamp_ms=timestamp_ms.copy(), close_price=close_price
+    )
+    assert not np.shares_memory(prepared_market.close_price, close_price)
+    assert close_price.flags.writeable
@@ -0,0 +1,91 @@
+from tradesignal_mtm_runner.market_store import MarketDataStore, MarketSeries
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import Mtm_Result
+
+import numpy as np
+import os
+import pandas as pd
+import pytest
+
+test_symbol = "ETHUSD"
+
+
+def test_market_data_store(
+    tmp_path, get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=2000, seed=47)
+    store = MarketDataStore(root_folder=str(tmp_path))
+    store.write_dataframe(symbol=test_symbol, price_dataframe=test_mktdata)
+    assert store.symbols() == [test_symbol]
+
+    timestamp_ms: np.ndarray = test_mktdata.index.to_numpy(dtype="datetime64[ms]").astype(
+        np.int64
+    )
+    full_series: MarketSeries = store.load(test_symbol)
+    assert isinstance(full_series.timestamp_ms.base, np.memmap)
+    assert full_series.timestamp_ms.tolist() == timestamp_ms.tolist()
+
+    # bounds between bars and on bars
+    market_series: MarketSeries = store.load(
+        test_symbol, start_ms=timestamp_ms[500] - 1, end_ms=timestamp_ms[1499]
+    )
+    assert len(market_series) == 1000
+    assert np.shares_memory(market_series.close_price, full_series.close_price)
+    assert market_series.timestamp_ms[0] == timestamp_ms[500]
+    assert len(store.load(test_symbol, start_ms=timestamp_ms[-1] + 1)) == 0
+
+    sub_mktdata: pd.DataFrame = test_mktdata.iloc[500:1500]
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    expected_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=sub_mktdata,
+        sell_signal_dataframe=sub_mktdata,
+    )
+    mtm_result: Mtm_Result = runner.calculate_events(
+        symbol=test_symbol,
+        timestamp_ms=market_series.timestamp_ms,
+        close_price=market_series.close_price,
+        buy_events=timestamp_ms[500:1500][sub_mktdata["buy"].to_numpy() == 1],
+        sell_events=timestamp_ms[500:1500][sub_mktdata["sell"].to_numpy() == 1],
+        events_by_timestamp=True,
+    )
+    assert mtm_result.pnl == expected_result.pnl
+    assert mtm_result.pnl_timeline == expected_result.pnl_timeline
+
+    # rewritten data replaces the opened memory maps
+    store.write(
+        symbol=test_symbol, timestamp_ms=timestamp_ms[:10], close_price=np.ones(10)
+    )
+    assert len(store.load(test_symbol)) == 10
+    assert len(full_series) == 2000
+    # the previous version is kept for the readers opening it, older ones are removed
+    store.write(symbol=test_symbol, timestamp_ms=timestamp_ms[:5], close_price=np.ones(5))
+    symbol_folder: str = os.path.join(str(tmp_path), test_symbol)
+    assert len([f for f in os.listdir(symbol_folder) if f.startswith("v")]) == 2
+    assert len(store.load(test_symbol)) == 5
+    assert len(MarketDataStore(root_folder=str(tmp_path)).load(test_symbol)) == 5
+
+
+def test_market_data_store_invalid(tmp_path) -> None:
+    store = MarketDataStore(root_folder=str(tmp_path))
+    assert store.symbols() == []
+    with pytest.raises(FileNotFoundError):
+        store.load(test_symbol)
+    with pytest.raises(ValueError):
+        store.write(symbol=test_symbol, timestamp_ms=[3, 2, 1], close_price=[1, 2, 3])
+    with pytest.raises(ValueError):
+        store.write(symbol=test_symbol, timestamp_ms=[1, 2, 3], close_price=[1, 2])
+
+
+def test_market_data_store_symbol(tmp_path) -> None:
+    store = MarketDataStore(root_folder=str(tmp_path / "store"))
+    store.write(symbol="BTC/USDT", timestamp_ms=[1, 2, 3], close_price=[1, 2, 3])
+    store.write(symbol="..ETH", timestamp_ms=[1, 2], close_price=[1, 2])
+    assert store.symbols() == ["..ETH", "BTC/USDT"]
+    assert store.load("BTC/USDT").close_price.tolist() == [1, 2, 3]
+    assert os.listdir(str(tmp_path)) == ["store"]
+    for symbol in ("", ".", ".."):
+        with pytest.raises(ValueError):
+            store.write(symbol=symbol, timestamp_ms=[1], close_price=[1])
+        with pytest.raises(ValueError):
+            store.load(symbol)
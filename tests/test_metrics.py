@@ -0,0 +1,86 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import Mtm_Result, PROFIT_SLIPPAGE
+from tradesignal_mtm_runner.metrics import (
+    PerformanceMetrics,
+    resample_by_period,
+    DAY_MS,
+    HOUR_MS,
+    YEAR_MS,
+)
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+def test_resample_by_period() -> None:
+    timestamp_ms = np.array([0, 10, HOUR_MS, HOUR_MS + 5, 3 * HOUR_MS])
+    period_start, period_sum = resample_by_period(
+        timestamp_ms, np.array([1.0, 2.0, 3.0, 4.0, 5.0]), HOUR_MS
+    )
+    assert period_start.tolist() == [0, HOUR_MS, 3 * HOUR_MS]
+    assert period_sum.tolist() == [3.0, 7.0, 5.0]
+
+
+@pytest.mark.parametrize("period_ms", [None, DAY_MS])
+def test_performance_metrics(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config, period_ms
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=3000, seed=9)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    mtm_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    metrics: PerformanceMetrics = runner.calculate_metrics(
+        symbol=test_symbol, period_ms=period_ms
+    )
+
+    assert abs(metrics.pnl - mtm_result.pnl) < COMPARE_ERROR
+    assert abs(metrics.max_drawdown - mtm_result.max_drawdown) < COMPARE_ERROR
+    if period_ms is None:
+        assert abs(metrics.sharpe_ratio - mtm_result.sharpe_ratio) < COMPARE_ERROR
+    else:
+        daily_pnl = (
+            pd.Series(mtm_result.pnl_timeline["mtm_ratio"], index=test_mktdata.index)
+            .resample("1D")
+            .sum()
+            - PROFIT_SLIPPAGE
+        )
+        expected_sharpe = (
+            daily_pnl.mean() / daily_pnl.std(ddof=0) * np.sqrt(YEAR_MS / DAY_MS)
+        )
+        assert abs(metrics.sharpe_ratio - expected_sharpe) < COMPARE_ERROR
+    assert np.sign(metrics.sortino_ratio) == np.sign(metrics.sharpe_ratio)
+
+    # Drawdown duration by brute force
+    pnl_ratio = np.array(mtm_result.pnl_timeline["pnl_ratio"])
+    peak, peak_index, longest_bars = 0, 0, 0
+    for i, pnl in enumerate(pnl_ratio):
+        if pnl >= peak:
+            peak, peak_index = pnl, i
+        else:
+            longest_bars = max(longest_bars, i - peak_index)
+    assert metrics.max_drawdown_duration_bars == longest_bars
+    assert metrics.max_drawdown_duration_ms == longest_bars * 15 * 60 * 1000
+    assert np.all(metrics.underwater <= 0)
+
+    trades = mtm_result.long_trades_archive + mtm_result.short_trades_archive
+    trade_pnl = [t.pnl_normalized for t in trades]
+    assert metrics.trade_count == len(trades)
+    assert metrics.win_rate == sum(p > 0 for p in trade_pnl) / len(trades)
+    assert (
+        abs(
+            metrics.profit_factor
+            - sum(p for p in trade_pnl if p > 0) / -sum(p for p in trade_pnl if p < 0)
+        )
+        < COMPARE_ERROR
+    )
+    assert 0 < metrics.exposure_time < 1
+    assert metrics.average_holding_ms == np.mean(
+        [(t.exit_datetime - t.entry_datetime).total_seconds() * 1000 for t in trades]
+    )
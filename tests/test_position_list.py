@@ -0,0 +1,138 @@
+from tradesignal_mtm_runner.position_list import PositionList
+from tradesignal_mtm_runner.helper import ROI_Helper
+from tradesignal_mtm_runner.models import (
+    ProxyTrade,
+    LongShort_Enum,
+    Inventory_Mode,
+)
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+def get_trade(
+    entry_price: float, entry_datetime: datetime, direction: LongShort_Enum
+) -> ProxyTrade:
+    return ProxyTrade(
+        symbol=test_symbol,
+        entry_price=entry_price,
+        entry_datetime=entry_datetime,
+        unit=100,
+        direction=direction,
+        inventory_mode=Inventory_Mode.FIFO,
+        fee_rate=0,
+    )
+
+
+@pytest.mark.parametrize("direction", [LongShort_Enum.LONG, LongShort_Enum.SHORT])
+def test_position_list_exposure(direction: LongShort_Enum) -> None:
+    start = datetime(2023, 1, 1)
+    trades = [
+        get_trade(1000 + i * 10, start + timedelta(hours=i), direction)
+        for i in range(20)
+    ]
+    position_list: PositionList = PositionList()
+    for trade in trades:
+        position_list.append(trade)
+
+    dt = start + timedelta(hours=30)
+    expected_mtm = sum(t.calculate_mtm_normalized(price_diff=15) for t in trades)
+    assert (
+        abs(position_list.calculate_mtm_normalized(dt=dt, price_diff=15) - expected_mtm)
+        < COMPARE_ERROR
+    )
+
+    # Exposure follows removal of trades
+    position_list.remove(trades[3])
+    position_list.pop(0)
+    expected_mtm = sum(
+        t.calculate_mtm_normalized(price_diff=15) for t in trades[1:3] + trades[4:]
+    )
+    assert (
+        abs(position_list.calculate_mtm_normalized(dt=dt, price_diff=15) - expected_mtm)
+        < COMPARE_ERROR
+    )
+    assert position_list.latest_entry_datetime == trades[-1].entry_datetime
+
+    # removing the latest entered trades moves the latest entry datetime back
+    del position_list[-2:]
+    assert position_list.latest_entry_datetime == trades[-3].entry_datetime
+    assert position_list.pop() is trades[-3]
+    assert position_list.latest_entry_datetime == trades[-4].entry_datetime
+    expected_exposure: float = sum(
+        PositionList._trade_exposure(t) for t in trades[1:3] + trades[4:-3]
+    )
+    assert abs(position_list.exposure - expected_exposure) < COMPARE_ERROR
+    assert position_list._trade_ids == {id(t) for t in position_list}
+
+    position_list.clear()
+    assert position_list.calculate_mtm_normalized(dt=dt, price_diff=15) == 0
+    assert position_list.exposure == 0
+
+
+def test_position_list_exclude_trade_entered_at_timestamp() -> None:
+    start = datetime(2023, 1, 1)
+    old_trade = get_trade(1000, start, LongShort_Enum.LONG)
+    new_trade = get_trade(2000, start + timedelta(hours=1), LongShort_Enum.LONG)
+    position_list: PositionList = PositionList([old_trade])
+    position_list.append(new_trade)
+
+    assert position_list.calculate_mtm_normalized(
+        dt=start + timedelta(hours=1), price_diff=100
+    ) == old_trade.calculate_mtm_normalized(price_diff=100)
+    assert (
+        abs(
+            position_list.calculate_mtm_normalized(
+                dt=start + timedelta(hours=2), price_diff=100
+            )
+            - (100 / 1000 + 100 / 2000)
+        )
+        < COMPARE_ERROR
+    )
+
+
+@pytest.mark.parametrize("direction", [LongShort_Enum.LONG, LongShort_Enum.SHORT])
+def test_position_list_trigger_index(direction: LongShort_Enum) -> None:
+    rng = np.random.default_rng(7)
+    stop_loss = -0.03
+    roi_helper = ROI_Helper(roi_dict={0: 0.05, 60: 0.02, 180: 0.0})
+    position_list: PositionList = PositionList()
+    position_list.enable_trigger_index(stop_loss=stop_loss, roi_helper=roi_helper)
+
+    start = datetime(2023, 1, 1)
+    price = 1000.0
+    closed_count = 0
+    for i in range(500):
+        dt = start + timedelta(minutes=15 * i)
+        price = price * (1 + rng.normal(0, 0.005))
+        expected_roi = [
+            t
+            for t in position_list
+            if roi_helper.can_take_profit(
+                entry_date=t.entry_datetime,
+                current_date=dt,
+                normalized_pnl=t.calculate_pnl_normalized(price=price),
+            )
+        ]
+        fired = position_list.pop_roi_triggered(price=price, dt=dt)
+        assert {id(t) for t in fired} == {id(t) for t in expected_roi}
+        for t in fired:
+            position_list.remove(t)
+
+        expected_stop_loss = [
+            t
+            for t in position_list
+            if t.calculate_pnl_normalized(price=price) < stop_loss
+        ]
+        fired = position_list.pop_stop_loss_triggered(price=price, dt=dt)
+        assert {id(t) for t in fired} == {id(t) for t in expected_stop_loss}
+        for t in fired:
+            position_list.remove(t)
+            closed_count += 1
+
+        if rng.random() < 0.3:
+            position_list.append(get_trade(price, dt, direction))
+    assert closed_count > 0
@@ -0,0 +1,65 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import (
+    Mtm_Result,
+    PROFIT_SLIPPAGE,
+    MIN_NUMERIC_VALUE,
+)
+from tradesignal_mtm_runner.range_index import MtmRangeIndex
+from tradesignal_mtm_runner.utility import calculate_max_drawdown, calculate_sharpe_ratio
+
+import numpy as np
+import pandas as pd
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+def test_mtm_range_index(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=1000, seed=2)
+    mtm_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config()
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    range_index: MtmRangeIndex = MtmRangeIndex.from_pnl_timeline(
+        mtm_result.pnl_timeline
+    )
+    timestamp_ms = np.asarray(mtm_result.pnl_timeline["timestamp"])
+    mtm = np.asarray(mtm_result.pnl_timeline["mtm_ratio"])
+
+    # Whole run
+    assert abs(range_index.pnl(0, 999) - mtm_result.pnl) < COMPARE_ERROR
+    assert abs(range_index.max_drawdown(0, 999) - mtm_result.max_drawdown) < COMPARE_ERROR
+    assert abs(range_index.sharpe_ratio(0, 999) - mtm_result.sharpe_ratio) < COMPARE_ERROR
+
+    rng = np.random.default_rng(1)
+    start = rng.integers(0, 1000, 200)
+    end = np.minimum(999, start + rng.integers(1, 400, 200))
+    pnl = range_index.pnl(start, end)
+    max_drawdown = range_index.max_drawdown(start, end)
+    sharpe_ratio = range_index.sharpe_ratio(start, end)
+    for i, (s, e) in enumerate(zip(start, end)):
+        assert abs(pnl[i] - mtm[s : e + 1].sum()) < COMPARE_ERROR
+        assert (
+            abs(max_drawdown[i] - calculate_max_drawdown(np.cumsum(mtm[s : e + 1])))
+            < COMPARE_ERROR
+        )
+        if np.ptp(mtm[s : e + 1]) == 0:
+            # no variation, e.g. laid back tax only
+            assert sharpe_ratio[i] == MIN_NUMERIC_VALUE
+            continue
+        expected_sharpe = calculate_sharpe_ratio(
+            timestamp_ms[s : e + 1], mtm[s : e + 1], PROFIT_SLIPPAGE
+        )
+        assert abs(sharpe_ratio[i] - expected_sharpe) < 1e-6 * max(
+            1, abs(expected_sharpe)
+        )
+
+    # Query by time stamp
+    assert range_index.index_of(timestamp_ms[10]) == 10
+    assert range_index.index_of(timestamp_ms[10] + 1) == 10
+    assert range_index.index_of(timestamp_ms[0] - 1) == -1
@@ -0,0 +1,214 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.models import Mtm_Result, Agent_Snapshot, Engine_Mode
+from tradesignal_mtm_runner.exceptions import UnSupportedException
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+
+def _trade_keys(trades) -> list[tuple]:
+    return [
+        (t.entry_datetime, t.entry_price, t.exit_datetime, t.exit_price, t.close_reason)
+        for t in trades
+    ]
+
+
+@pytest.mark.parametrize("engine_mode", [Engine_Mode.BAR, Engine_Mode.EVENT])
+@pytest.mark.parametrize("max_position_per_symbol", [1, 3])
+def test_resume_from_snapshot(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    engine_mode,
+    max_position_per_symbol,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=3000, signal_ratio=0.03, seed=41
+    )
+    pnl_config = get_test_trigger_pnl_calc_config(
+        max_position_per_symbol=max_position_per_symbol
+    )
+    full_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=pnl_config, engine_mode=engine_mode
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+
+    # Run the history, then append the new bars in two batches
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config, engine_mode=engine_mode)
+    history: pd.DataFrame = test_mktdata.iloc[:1700].copy()
+    mtm_result: Mtm_Result = runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=history,
+        sell_signal_dataframe=history,
+    )
+    for start, end in [(1700, 2500), (2500, 3000)]:
+        snapshot_json: str = runner.take_snapshot(test_symbol).json()
+        new_bars: pd.DataFrame = test_mktdata.iloc[start:end].copy()
+        runner = Trade_Mtm_Runner(pnl_config=pnl_config, engine_mode=engine_mode)
+        mtm_result = runner.resume(
+            snapshot=Agent_Snapshot.parse_raw(snapshot_json),
+            buy_signal_dataframe=new_bars,
+            sell_signal_dataframe=new_bars,
+            previous_result=mtm_result,
+        )
+
+    assert abs(mtm_result.pnl - full_result.pnl) < COMPARE_ERROR
+    assert abs(mtm_result.max_drawdown - full_result.max_drawdown) < COMPARE_ERROR
+    assert abs(mtm_result.sharpe_ratio - full_result.sharpe_ratio) < 1e-6 * max(
+        1, abs(full_result.sharpe_ratio)
+    )
+    assert mtm_result.bar_count == full_result.bar_count == len(test_mktdata)
+    assert mtm_result.mkt_start_epoch == full_result.mkt_start_epoch
+    assert mtm_result.trades_opened == full_result.trades_opened
+    assert mtm_result.trades_closed_by_reason == full_result.trades_closed_by_reason
+
+    for key in ["timestamp", "buy_signal", "sell_signal", "close_price"]:
+        assert mtm_result.pnl_timeline[key] == full_result.pnl_timeline[key]
+    for key in ["mtm_ratio", "pnl_ratio"]:
+        assert np.allclose(
+            mtm_result.pnl_timeline[key], full_result.pnl_timeline[key], atol=1e-12
+        )
+    assert _trade_keys(mtm_result.long_trades_archive) == _trade_keys(
+        full_result.long_trades_archive
+    )
+    assert _trade_keys(mtm_result.short_trades_archive) == _trade_keys(
+        full_result.short_trades_archive
+    )
+    assert _trade_keys(mtm_result.long_trades_outstanding) == _trade_keys(
+        full_result.long_trades_outstanding
+    )
+    assert _trade_keys(mtm_result.short_trades_oustanding) == _trade_keys(
+        full_result.short_trades_oustanding
+    )
+
+
+def test_resume_first_passage_with_outstanding_trades(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=500, seed=3)
+    test_mktdata["buy"] = 0
+    test_mktdata["sell"] = 0
+    test_mktdata.iloc[299, test_mktdata.columns.get_loc("buy")] = 1
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.iloc[:300].copy(),
+        sell_signal_dataframe=test_mktdata.iloc[:300].copy(),
+    )
+    snapshot: Agent_Snapshot = runner.take_snapshot(test_symbol)
+    assert len(snapshot.long_trades_outstanding) == 1
+    assert snapshot.last_close_price == test_mktdata["close"].iloc[299]
+    assert snapshot.bar_count == 300
+
+    with pytest.raises(UnSupportedException):
+        Trade_Mtm_Runner(
+            pnl_config=get_test_trigger_pnl_calc_config(),
+            engine_mode=Engine_Mode.FIRST_PASSAGE,
+        ).resume(
+            snapshot=snapshot,
+            buy_signal_dataframe=test_mktdata.iloc[300:].copy(),
+            sell_signal_dataframe=test_mktdata.iloc[300:].copy(),
+        )
+
+
+@pytest.mark.parametrize("history_excursion", [True, False])
+def test_resume_trade_excursion(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config, history_excursion
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=1000, signal_ratio=0.03, seed=43
+    )
+    pnl_config = get_test_trigger_pnl_calc_config(max_position_per_symbol=3)
+    full_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=pnl_config, trade_excursion=True
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    # split the bars while a trade is outstanding
+    split: int = next(
+        test_mktdata.index.get_loc(t.entry_datetime) + 2
+        for t in full_result.long_trades_archive
+        if test_mktdata.index.get_loc(t.exit_datetime)
+        > test_mktdata.index.get_loc(t.entry_datetime) + 4
+    )
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config, trade_excursion=history_excursion)
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.iloc[:split],
+        sell_signal_dataframe=test_mktdata.iloc[:split],
+    )
+    snapshot: Agent_Snapshot = runner.take_snapshot(test_symbol)
+    carried_entries = {t.entry_datetime for t in snapshot.long_trades_outstanding}
+    assert len(carried_entries) > 0
+
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config, trade_excursion=True)
+    mtm_result: Mtm_Result = runner.resume(
+        snapshot=snapshot,
+        buy_signal_dataframe=test_mktdata.iloc[split:],
+        sell_signal_dataframe=test_mktdata.iloc[split:],
+    )
+    expected_excursions = {
+        t.entry_datetime: (t.max_adverse_excursion, t.max_favorable_excursion)
+        for t in full_result.long_trades_archive + full_result.long_trades_outstanding
+    }
+    for trade in mtm_result.long_trades_archive + mtm_result.long_trades_outstanding:
+        excursions = (trade.max_adverse_excursion, trade.max_favorable_excursion)
+        if trade.entry_datetime not in carried_entries:
+            assert excursions == expected_excursions[trade.entry_datetime]
+        elif history_excursion:
+            # the carried trades extend the excursions of the history
+            assert excursions == pytest.approx(expected_excursions[trade.entry_datetime])
+        else:
+            assert excursions == (None, None)
+
+
+def test_resumed_agent_analysis(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=500, seed=44)
+    runner = Trade_Mtm_Runner(pnl_config=get_test_trigger_pnl_calc_config())
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.iloc[:300],
+        sell_signal_dataframe=test_mktdata.iloc[:300],
+    )
+    runner.calculate_metrics(test_symbol)
+    runner.resume(
+        snapshot=runner.take_snapshot(test_symbol),
+        buy_signal_dataframe=test_mktdata.iloc[300:],
+        sell_signal_dataframe=test_mktdata.iloc[300:],
+    )
+    # the retained agent holds the new bars only
+    for analyze in [
+        lambda: runner.sweep_fee_and_tax(test_symbol, [0.001], [0]),
+        lambda: runner.calculate_metrics(test_symbol),
+        lambda: runner.bootstrap_mtm(test_symbol, resample_count=2),
+        lambda: runner.shuffle_trades(test_symbol, resample_count=2),
+    ]:
+        with pytest.raises(UnSupportedException):
+            analyze()
+    # chained resume still works
+    assert runner.take_snapshot(test_symbol).bar_count == 500
+    with pytest.raises(ValueError):
+        runner.resume(
+            snapshot=runner.take_snapshot(test_symbol),
+            buy_signal_dataframe=test_mktdata.iloc[400:],
+            sell_signal_dataframe=test_mktdata.iloc[400:],
+        )
+    # the resumed run is still retained
+    assert runner.take_snapshot(test_symbol).bar_count == 500
+
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    runner.calculate_metrics(test_symbol)
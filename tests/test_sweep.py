@@ -0,0 +1,143 @@
+from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
+from tradesignal_mtm_runner.config import PnlCalcConfig
+from tradesignal_mtm_runner.models import (
+    Mtm_Result,
+    Sweep_Result,
+    Fee_Sweep_Result,
+    Engine_Mode,
+    Agent_Retention_Policy,
+)
+from tradesignal_mtm_runner.sweep import sweep_stop_loss_and_roi
+from tradesignal_mtm_runner.exceptions import UnSupportedException
+
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPARE_ERROR = 0.0000001
+test_symbol = "ETHUSD"
+
+STOP_LOSS_GRID = [-0.05, -0.01, -0.02, -0.005]
+ROI_TABLES = [
+    {0: 0.03, 60: 0.015, 240: 0.005},
+    {0: 0.01},
+    {0: 0.05, 120: 0.0},
+]
+
+
+@pytest.mark.parametrize("enable_short_position", [False, True])
+def test_sweep_same_as_runner(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    enable_short_position: bool,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=2000, signal_ratio=0.01, seed=11
+    )
+    pnl_config: PnlCalcConfig = get_test_trigger_pnl_calc_config(
+        enable_short_position=enable_short_position
+    )
+
+    results: list[Sweep_Result] = sweep_stop_loss_and_roi(
+        pnl_config=pnl_config,
+        stop_loss_grid=STOP_LOSS_GRID,
+        roi_tables=ROI_TABLES,
+        timestamp_ms=np.asarray(pd.to_numeric(test_mktdata.index), dtype=np.int64)
+        // 1_000_000,
+        close_price=test_mktdata["close"].to_numpy(dtype=float),
+        buy_index=np.flatnonzero(test_mktdata["buy"] == 1),
+        sell_index=np.flatnonzero(test_mktdata["sell"] == 1),
+    )
+    assert len(results) == len(STOP_LOSS_GRID) * len(ROI_TABLES)
+
+    for result in results:
+        runner = Trade_Mtm_Runner(
+            pnl_config=pnl_config.copy(
+                update={"stoploss": result.stoploss, "roi": result.roi}
+            )
+        )
+        expected: Mtm_Result = runner.calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_mktdata.copy(),
+            sell_signal_dataframe=test_mktdata.copy(),
+        )
+        assert abs(result.pnl - expected.pnl) < COMPARE_ERROR
+        assert abs(result.max_drawdown - expected.max_drawdown) < COMPARE_ERROR
+        assert abs(result.sharpe_ratio - expected.sharpe_ratio) < COMPARE_ERROR
+        assert result.trades_opened == expected.trades_opened
+
+
+def test_sweep_single_position_only(get_test_trigger_pnl_calc_config) -> None:
+    with pytest.raises(UnSupportedException):
+        sweep_stop_loss_and_roi(
+            pnl_config=get_test_trigger_pnl_calc_config(max_position_per_symbol=2),
+            stop_loss_grid=STOP_LOSS_GRID,
+            roi_tables=ROI_TABLES,
+            timestamp_ms=np.arange(10, dtype=np.int64) * 60_000,
+            close_price=np.ones(10),
+            buy_index=np.array([1]),
+            sell_index=np.array([5]),
+        )
+
+
+@pytest.mark.parametrize(
+    "engine_mode, max_position_per_symbol",
+    [
+        (Engine_Mode.BAR, 3),
+        (Engine_Mode.EVENT, 3),
+        (Engine_Mode.FIRST_PASSAGE, 1),
+    ],
+)
+def test_fee_sweep_same_as_runner(
+    get_test_random_walk_mkt_data,
+    get_test_trigger_pnl_calc_config,
+    engine_mode: Engine_Mode,
+    max_position_per_symbol: int,
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(
+        dim=2000, signal_ratio=0.02, seed=5
+    )
+    pnl_config: PnlCalcConfig = get_test_trigger_pnl_calc_config(
+        max_position_per_symbol=max_position_per_symbol
+    )
+    runner = Trade_Mtm_Runner(pnl_config=pnl_config, engine_mode=engine_mode)
+    runner.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata.copy(),
+        sell_signal_dataframe=test_mktdata.copy(),
+    )
+    fee_rates = [0.0, 0.001, 0.005]
+    laid_back_taxes = [0.0, 0.0001, 0.001]
+    results: list[Fee_Sweep_Result] = runner.sweep_fee_and_tax(
+        symbol=test_symbol, fee_rates=fee_rates, laid_back_taxes=laid_back_taxes
+    )
+    assert len(results) == len(fee_rates) * len(laid_back_taxes)
+
+    for result in results:
+        expected: Mtm_Result = Trade_Mtm_Runner(
+            pnl_config=pnl_config.copy(
+                update={
+                    "fee_rate": result.fee_rate,
+                    "laid_back_tax": result.laid_back_tax,
+                }
+            ),
+            engine_mode=engine_mode,
+        ).calculate(
+            symbol=test_symbol,
+            buy_signal_dataframe=test_mktdata.copy(),
+            sell_signal_dataframe=test_mktdata.copy(),
+        )
+        assert abs(result.pnl - expected.pnl) < COMPARE_ERROR
+        assert abs(result.max_drawdown - expected.max_drawdown) < COMPARE_ERROR
+        assert abs(result.sharpe_ratio - expected.sharpe_ratio) < COMPARE_ERROR
+
+
+def test_fee_sweep_without_retained_agent(get_test_trigger_pnl_calc_config) -> None:
+    runner = Trade_Mtm_Runner(
+        pnl_config=get_test_trigger_pnl_calc_config(),
+        retention_policy=Agent_Retention_Policy.KEEP_NONE,
+    )
+    with pytest.raises(UnSupportedException):
+        runner.sweep_fee_and_tax(
+            symbol=test_symbol, fee_rates=[0.001], laid_back_taxes=[0.0001]
+        )
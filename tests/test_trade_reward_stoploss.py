@@ -130,3 +130,51 @@ def test_stop_loss_short(get_test_ascending_mkt_data, get_pnl_config_stoploss) -
     logger.debug(trade_book_keeper_agent.calculate_pnl_from_mtm_history())
     logger.debug(trade_book_keeper_agent.mtm_history_value)
     logger.debug(expected_loss)
+
+
+def _run_book_keeper(
+    pnl_config: PnlCalcConfig, close_price: list[float], buy_bars: list[int]
+) -> TradeBookKeeperAgent:
+    time_line = pd.date_range(start="2023-01-01", periods=len(close_price), freq="1min")
+    trade_book_keeper_agent: TradeBookKeeperAgent = TradeBookKeeperAgent(
+        pnl_config=pnl_config, symbol=test_symbol
+    )
+    for i in range(1, len(close_price)):
+        trade_book_keeper_agent.run_at_timestamp(
+            dt=time_line[i],
+            price=close_price[i],
+            price_diff=close_price[i] - close_price[i - 1],
+            buy_sell_action=(
+                Buy_Sell_Action_Enum.BUY if i in buy_bars else Buy_Sell_Action_Enum.HOLD
+            ),
+        )
+    return trade_book_keeper_agent
+
+
+def test_stop_loss_close_all_fired_trades(get_pnl_config_stoploss) -> None:
+    pnl_config: PnlCalcConfig = get_pnl_config_stoploss(expected_stoploss=-0.1)
+    pnl_config.max_position_per_symbol = 3
+    close_price: list[float] = [1000.0] * 10 + [800.0] * 3
+    trade_book_keeper_agent = _run_book_keeper(
+        pnl_config=pnl_config, close_price=close_price, buy_bars=[2, 3, 4]
+    )
+    # every trade hitting stop loss on a bar is closed on that bar,
+    # none is left open until the next bar
+    archive: list[ProxyTrade] = trade_book_keeper_agent.archive_long_positions_list
+    assert len(trade_book_keeper_agent.outstanding_long_position_list) == 0
+    assert len(archive) == 3
+    assert [t.exit_price for t in archive] == [800.0] * 3
+    assert len({t.exit_datetime for t in archive}) == 1
+    assert all(t.close_reason == Proxy_Trade_Actions.STOP_LOSS for t in archive)
+
+
+def test_stop_loss_archive_in_entry_order(get_pnl_config_stoploss) -> None:
+    pnl_config: PnlCalcConfig = get_pnl_config_stoploss(expected_stoploss=-0.1)
+    pnl_config.max_position_per_symbol = 3
+    # the last trade entered at the highest price has the first stop loss trigger price
+    close_price: list[float] = [1000.0, 1000.0, 990.0, 1000.0, 1010.0] + [800.0] * 3
+    trade_book_keeper_agent = _run_book_keeper(
+        pnl_config=pnl_config, close_price=close_price, buy_bars=[2, 3, 4]
+    )
+    archive: list[ProxyTrade] = trade_book_keeper_agent.archive_long_positions_list
+    assert [t.entry_price for t in archive] == [990.0, 1000.0, 1010.0]
@@ -1,12 +1,24 @@
 from tradesignal_mtm_runner.runner_mtm import Trade_Mtm_Runner
 from tradesignal_mtm_runner.config import PnlCalcConfig
 from tradesignal_mtm_runner.interfaces import ITradeSignalRunner
-from tradesignal_mtm_runner.models import Mtm_Result
+from tradesignal_mtm_runner.models import (
+    Mtm_Result,
+    Agent_Retention_Policy,
+    Memory_Report,
+    Engine_Mode,
+)
+from tradesignal_mtm_runner.utility import (
+    compensated_sum,
+    convert_datetime_to_ms,
+    convert_ms_to_datetime,
+)
 
 import pytest
 import pandas as pd
 import numpy as np
 from functools import reduce
+from datetime import datetime
+import time
 
 test_exchange = "kraken"
 test_symbol = "ETHUSD"
@@ -82,6 +94,210 @@ def test_trade_pnl_runner_with_ascending_data(get_test_ascending_mkt_data,get_pn
     mtm_reward_sum = reduce(lambda x, y: x + y, mtm_reward_history)
     assert abs(mtm_reward_sum - mtm_result.pnl) < COMPARE_ERROR
 
-    
+
+def test_trade_pnl_runner_run_diagnostics(get_test_ascending_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_ascending_mkt_data(dim=DATA_DIM, step=DATA_MOVEMENT)
+    trade_signal = test_mktdata.copy()
+    trade_signal["buy"] = np.where(test_mktdata["inx"].isin([2, 100]), 1, 0)
+    trade_signal["sell"] = np.where(test_mktdata["inx"] == 80, 1, 0)
+
+    pnl_calculator: Trade_Mtm_Runner = Trade_Mtm_Runner(
+        pnl_config=PnlCalcConfig.get_default(), trace_memory=True
+    )
+    mtm_result: Mtm_Result = pnl_calculator.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=trade_signal,
+        sell_signal_dataframe=trade_signal,
+    )
+
+    assert mtm_result.bar_count == DATA_DIM
+    assert mtm_result.mkt_start_epoch == mtm_result.pnl_timeline["timestamp"][0]
+    assert mtm_result.mkt_end_epoch == mtm_result.pnl_timeline["timestamp"][-1]
+    assert mtm_result.run_start_epoch > 0
+    assert mtm_result.run_end_epoch >= mtm_result.run_start_epoch
+    assert mtm_result.bars_per_second > 0
+    assert mtm_result.trades_opened == 2
+    assert mtm_result.trades_closed_by_reason["SIGNAL"] == 1
+    assert mtm_result.trades_closed_by_reason["ROI"] == 0
+    assert mtm_result.peak_memory_bytes > 0
+
+    query_dict = mtm_result.to_query_dict()
+    assert query_dict["bar_count"] == DATA_DIM
+    assert query_dict["trades_closed_signal"] == 1
+    assert query_dict["trades_closed_stop_loss"] == 0
+
+
+@pytest.mark.parametrize(
+    "retention_policy, expected_agent_count",
+    [
+        (Agent_Retention_Policy.KEEP_ALL, 3),
+        (Agent_Retention_Policy.KEEP_NONE, 0),
+        (Agent_Retention_Policy.KEEP_LAST_N, 2),
+        (Agent_Retention_Policy.WEAK_REFERENCE, 0),
+    ],
+)
+def test_trade_pnl_runner_retention_policy(
+    get_test_ascending_mkt_data, retention_policy, expected_agent_count
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_ascending_mkt_data(dim=DATA_DIM, step=DATA_MOVEMENT)
+    trade_signal = test_mktdata.copy()
+    trade_signal["buy"] = np.where(test_mktdata["inx"] == 2, 1, 0)
+    trade_signal["sell"] = np.where(test_mktdata["inx"] == 80, 1, 0)
+
+    pnl_calculator: Trade_Mtm_Runner = Trade_Mtm_Runner(
+        pnl_config=PnlCalcConfig.get_default(),
+        retention_policy=retention_policy,
+        max_retained_agents=2,
+    )
+    for symbol in ["ETHUSD", "BTCUSD", "XRPUSD"]:
+        pnl_calculator.calculate(
+            symbol=symbol,
+            buy_signal_dataframe=trade_signal,
+            sell_signal_dataframe=trade_signal,
+        )
+
+    assert len(pnl_calculator.trade_order_simulator_map) == expected_agent_count
+    memory_report: Memory_Report = pnl_calculator.memory_report()
+    assert memory_report.agent_count == expected_agent_count
+    if expected_agent_count > 0:
+        assert "XRPUSD" in memory_report.symbol_bytes
+        assert memory_report.timeline_bytes > 0
+        assert memory_report.trade_archive_bytes > 0
+        assert memory_report.outstanding_trade_bytes > 0
+        assert memory_report.total_bytes == sum(memory_report.symbol_bytes.values())
+    else:
+        assert memory_report.total_bytes == 0
+    with pytest.raises(ValueError):
+        Trade_Mtm_Runner(
+            pnl_config=PnlCalcConfig.get_default(),
+            retention_policy=retention_policy,
+            max_retained_agents=0,
+        )
+
+
+def test_trade_pnl_runner_reuse_agent_buffers(get_test_ascending_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_ascending_mkt_data(dim=DATA_DIM, step=DATA_MOVEMENT)
+    trade_signal = test_mktdata.copy()
+    trade_signal["buy"] = np.where(test_mktdata["inx"] == 2, 1, 0)
+    trade_signal["sell"] = np.where(test_mktdata["inx"] == 80, 1, 0)
+
+    pnl_calculator: Trade_Mtm_Runner = Trade_Mtm_Runner(pnl_config=PnlCalcConfig.get_default())
+    first_result: Mtm_Result = pnl_calculator.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=trade_signal,
+        sell_signal_dataframe=trade_signal,
+    )
+    agent = pnl_calculator.trade_order_simulator_map[test_symbol]
+    mtm_buffer = agent._mtm_buffer
+    assert len(mtm_buffer) == DATA_DIM
+
+    second_result: Mtm_Result = pnl_calculator.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=trade_signal,
+        sell_signal_dataframe=trade_signal,
+    )
+    assert pnl_calculator.trade_order_simulator_map[test_symbol] is agent
+    assert agent._mtm_buffer is mtm_buffer
+    assert second_result.pnl == first_result.pnl
+    assert second_result.max_drawdown == first_result.max_drawdown
+    assert second_result.pnl_timeline == first_result.pnl_timeline
+    assert len(second_result.long_trades_archive) == 1
+    assert len(agent.mtm_history_value) == DATA_DIM
+
+
+def test_trade_pnl_runner_input_not_modified(get_test_ascending_mkt_data) -> None:
+    test_mktdata: pd.DataFrame = get_test_ascending_mkt_data(dim=DATA_DIM, step=DATA_MOVEMENT)
+    buy_signal = test_mktdata[["close"]].astype(float)
+    buy_signal["buy"] = np.where(test_mktdata["inx"] == 2, 1, np.nan)
+    # sell signal with the rows in reverse order is aligned to the buy signal index
+    sell_signal = pd.DataFrame(
+        {"sell": np.where(test_mktdata["inx"] == 80, 1, 0)}, index=test_mktdata.index
+    ).iloc[::-1]
+    buy_signal_copy = buy_signal.copy()
+    sell_signal_copy = sell_signal.copy()
+
+    pnl_calculator: Trade_Mtm_Runner = Trade_Mtm_Runner(pnl_config=PnlCalcConfig.get_default())
+    prepared_bars = pnl_calculator._prepare_df_for_analysis(
+        buy_signal_dataframe=buy_signal, sell_signal_dataframe=sell_signal
+    )
+    assert np.shares_memory(prepared_bars["close"], buy_signal["close"].to_numpy())
+    assert prepared_bars["sell_index"].tolist() == [80]
+
+    mtm_result: Mtm_Result = pnl_calculator.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=buy_signal,
+        sell_signal_dataframe=sell_signal,
+    )
+    pd.testing.assert_frame_equal(buy_signal, buy_signal_copy)
+    pd.testing.assert_frame_equal(sell_signal, sell_signal_copy)
+    assert mtm_result.pnl_timeline["sell_signal"][80] == 1
+    assert len(mtm_result.long_trades_archive) == 1
+    assert mtm_result.long_trades_archive[0].exit_datetime == test_mktdata.index[80]
+
+
+@pytest.mark.parametrize("engine_mode", [Engine_Mode.BAR, Engine_Mode.EVENT])
+def test_trade_pnl_runner_compact_mode(
+    get_test_random_walk_mkt_data, get_test_trigger_pnl_calc_config, engine_mode
+) -> None:
+    test_mktdata: pd.DataFrame = get_test_random_walk_mkt_data(dim=3000, seed=46)
+    pnl_config = get_test_trigger_pnl_calc_config(max_position_per_symbol=2)
+    expected_result: Mtm_Result = Trade_Mtm_Runner(
+        pnl_config=pnl_config, engine_mode=engine_mode
+    ).calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    pnl_calculator: Trade_Mtm_Runner = Trade_Mtm_Runner(
+        pnl_config=pnl_config,
+        engine_mode=engine_mode,
+        compact=True,
+        compact_timeline=True,
+    )
+    mtm_result: Mtm_Result = pnl_calculator.calculate(
+        symbol=test_symbol,
+        buy_signal_dataframe=test_mktdata,
+        sell_signal_dataframe=test_mktdata,
+    )
+    assert pnl_calculator.trade_order_simulator_map[test_symbol].mtm_history_value.dtype == np.float32
+
+    # within the documented precision bounds
+    mtm_abs_sum: float = np.abs(expected_result.pnl_timeline["mtm_ratio"]).sum()
+    trade_count: int = expected_result.trades_opened
+    assert abs(mtm_result.pnl - expected_result.pnl) < 1.2e-7 * trade_count + 6e-8 * mtm_abs_sum
+    assert abs(mtm_result.max_drawdown - expected_result.max_drawdown) < 1e-5
+    assert abs(mtm_result.sharpe_ratio - expected_result.sharpe_ratio) < 1e-3
+    assert mtm_result.trades_closed_by_reason == expected_result.trades_closed_by_reason
+
+    pnl_timeline = mtm_result.pnl_timeline
+    assert pnl_timeline["mtm_ratio"].dtype == np.float32
+    assert pnl_timeline["pnl_ratio"].dtype == np.float32
+    assert pnl_timeline["close_price"].dtype == np.float32
+    assert pnl_timeline["buy_signal"].dtype == np.int8
+    assert pnl_timeline["timestamp"].tolist() == expected_result.pnl_timeline["timestamp"]
+    assert pnl_timeline["buy_signal"].tolist() == expected_result.pnl_timeline["buy_signal"]
+    assert '"mtm_ratio": [' in mtm_result.to_json_str()
+
+    with pytest.raises(ValueError):
+        Trade_Mtm_Runner(pnl_config=pnl_config, compact_timeline=True)
+
+
+def test_compensated_sum() -> None:
+    mtm = np.full(1_000_000, 0.1, dtype=np.float32)
+    assert compensated_sum(mtm) == pytest.approx(float(mtm[0]) * len(mtm), rel=1e-15)
+    assert compensated_sum(np.array([1e16, 1.0, -1e16])) == 1.0
 
 
+def test_convert_ms_to_datetime_utc(monkeypatch) -> None:
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        ms: int = convert_datetime_to_ms(datetime(2022, 7, 1, 12, 30))
+        assert ms == int(pd.Timestamp("2022-07-01 12:30").value // 1_000_000)
+        assert convert_ms_to_datetime(ms) == datetime(2022, 7, 1, 12, 30)
+        assert convert_datetime_to_ms(convert_ms_to_datetime(ms)) == ms
+        # exact ms, float seconds * 1000 rounds some ms down
+        assert convert_datetime_to_ms(convert_ms_to_datetime(1078625331860)) == 1078625331860
+    finally:
+        monkeypatch.undo()
+        time.tzset()